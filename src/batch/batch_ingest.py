@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from src.batch.batch_jobs import BatchJobStore, wait_for_batch
+from src.services.vision_service import get_vision_service, Receipt
+from src.utils.config import get_batch_api_settings, get_batch_workers, get_debug_mode, pin_config
+from src.utils.datastore import RECEIPTS_CSV, RECEIPT_FIELDS, append_rows, build_row
+from src.utils.duplicate_index import get_duplicate_index, record_headless_commit
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+class BatchIngestor:
+    """Analyzes a folder of receipt images headlessly and appends them to the receipts CSV."""
+
+    def __init__(self, workers: Optional[int] = None, overrides: Optional[Dict[str, str]] = None,
+                 csv_file: str = RECEIPTS_CSV, offline: bool = False):
+        """
+        Args:
+            workers: Maximum receipts in flight (defaults to batch_workers in config.json);
+                     the vendor's rate_limits apply on top of this
+            overrides: Field values applied to every row, as with the GUI override entries
+            csv_file: CSV file to append results to
+            offline: Submit all images to the vendor's batch API and wait for the results,
+                     instead of calling the API once per image
+        """
+        self.workers = workers or get_batch_workers()
+        self.offline = offline
+        self.overrides = overrides or {}
+        self.csv_file = csv_file
+
+        unknown = set(self.overrides) - set(RECEIPT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown override field(s): {', '.join(sorted(unknown))}")
+
+        self.vision_service = get_vision_service()
+        self.duplicate_index = get_duplicate_index()
+
+    def get_images(self, image_dir: str) -> List[str]:
+        """Get image files in the directory, sorted by name so output order is deterministic."""
+        return sorted(
+            os.path.join(image_dir, file)
+            for file in os.listdir(image_dir)
+            if os.path.splitext(file)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+    async def _analyze(self, image_path: str, slots: asyncio.Semaphore) -> Tuple[Optional[Receipt], Optional[str], float, Optional[int]]:
+        """Analyze one image, returning (receipt, error, seconds, perceptual hash)."""
+        async with slots:
+            started = time.perf_counter()
+            try:
+                image_bytes = await asyncio.to_thread(_read_bytes, image_path)
+                encoded = await asyncio.to_thread(self.vision_service.encode_image, image_bytes)
+                phash = await asyncio.to_thread(self.vision_service.image_hash, encoded) if self.duplicate_index else None
+                receipt = await self.vision_service.analyze_receipt_async(encoded)
+                return receipt, None, time.perf_counter() - started, phash
+            except Exception as e:
+                return None, str(e), time.perf_counter() - started, None
+
+    async def _run_async(self, images: List[str]) -> Tuple[List[float], List[Tuple[str, str]]]:
+        """Keep up to `workers` receipts in flight and append results in filename order."""
+        # Blocking work (file reads, encoding, the HTTP call) runs in the default
+        # executor, so size it to the number of receipts we want in flight
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+        )
+        slots = asyncio.Semaphore(self.workers)
+        tasks = [asyncio.create_task(self._analyze(image_path, slots)) for image_path in images]
+        
+        latencies = []
+        failed = []
+        for index, (image_path, task) in enumerate(zip(images, tasks), 1):
+            receipt, error, seconds, phash = await task
+            name = os.path.basename(image_path)
+            latencies.append(seconds)
+            if error:
+                failed.append((name, error))
+                print(f"[{index}/{len(images)}] {name}: FAILED ({error})")
+                continue
+
+            row = build_row(receipt, self.overrides)
+            append_rows([row], self.csv_file)
+            record_headless_commit(self.duplicate_index, phash, row, name)
+            print(f"[{index}/{len(images)}] {name}: {receipt.vendor}, {receipt.total_amount} ({seconds:.1f}s)")
+        return latencies, failed
+
+    def _run_offline(self, images: List[str]) -> Tuple[List[float], List[Tuple[str, str]]]:
+        """Submit every image as one vendor batch job, wait for it and append results in filename order."""
+        settings = get_batch_api_settings()
+        job = self.vision_service.submit_batch(
+            {f"{index:05d}": _read_bytes(image_path) for index, image_path in enumerate(images)},
+            max_batch_bytes=settings['max_batch_bytes']
+        )
+        job.update({
+            'kind': 'ingest',
+            'vendor': self.vision_service.adapter.vendor,
+            'images': {f"{index:05d}": image_path for index, image_path in enumerate(images)},
+            'overrides': self.overrides,
+            'csv_file': self.csv_file,
+        })
+        store = BatchJobStore()
+        job_id = store.add(job)
+        print(f"Submitted batch job {job_id}: {len(job['batch_ids'])} vendor batch(es), "
+              f"{len(job['cached'])} cached result(s)")
+
+        wait_for_batch(self.vision_service, job, settings['poll_seconds'])
+        failed = commit_batch_results(job, self.vision_service.collect_batch(job), self.vision_service,
+                                      self.duplicate_index)
+        store.mark_collected(job_id)
+        # Batch results carry no per-receipt latency
+        return [], failed
+
+    def run(self, image_dir: str) -> dict:
+        """Process every image in the directory and print a progress and throughput summary."""
+        images = self.get_images(image_dir)
+        if not images:
+            print(f"No images found in {image_dir}")
+            return {'processed': 0, 'failed': 0}
+
+        if self.offline:
+            print(f"Submitting {len(images)} images from {image_dir} to the {self.vision_service.adapter.vendor} batch API...")
+        else:
+            print(f"Processing {len(images)} images from {image_dir} with up to {self.workers} in flight...")
+        started = time.perf_counter()
+        # Settings stay as they were at the start, even if config.json is edited mid-run
+        with pin_config():
+            if self.offline:
+                latencies, failed = self._run_offline(images)
+            else:
+                latencies, failed = asyncio.run(self._run_async(images))
+
+        elapsed = time.perf_counter() - started
+        processed = len(images) - len(failed)
+        summary = {
+            'processed': processed,
+            'failed': len(failed),
+            'elapsed_seconds': elapsed,
+            'receipts_per_hour': processed / elapsed * 3600 if elapsed else 0.0,
+            'mean_latency_seconds': sum(latencies) / len(latencies) if latencies else None,
+        }
+
+        print("\n=== Batch Summary ===")
+        print(f"Processed: {processed}  Failed: {len(failed)}  Elapsed: {elapsed:.1f}s")
+        if latencies:
+            print(f"Throughput: {summary['receipts_per_hour']:.0f} receipts/hour  "
+                  f"Mean latency: {summary['mean_latency_seconds']:.1f}s")
+        print(f"Tokens: {self.vision_service.adapter.usage_summary()}")
+        if get_debug_mode():
+            print(f"Prompt sizes:\n{self.vision_service.prompt_size_histogram()}")
+        print(f"Results appended to: {self.csv_file}")
+        for name, error in failed:
+            print(f"  Failed: {name}: {error}")
+
+        return summary
+
+def commit_batch_results(job: dict, results: Dict[str, object], vision_service,
+                         duplicate_index) -> List[Tuple[str, str]]:
+    """Append a collected ingest job's receipts to its CSV in filename order, returning (name, error) failures."""
+    failed = []
+    images = job['images']
+    for index, custom_id in enumerate(sorted(images), 1):
+        name = os.path.basename(images[custom_id])
+        result = results.get(custom_id, Exception("No result returned by the batch API"))
+        if isinstance(result, Exception):
+            failed.append((name, str(result)))
+            print(f"[{index}/{len(images)}] {name}: FAILED ({result})")
+            continue
+
+        row = build_row(result, job['overrides'])
+        append_rows([row], job['csv_file'])
+        if duplicate_index:
+            try:
+                phash = vision_service.image_hash(vision_service.encode_image(_read_bytes(images[custom_id])))
+            except (OSError, ValueError):
+                phash = None
+            record_headless_commit(duplicate_index, phash, row, name)
+        print(f"[{index}/{len(images)}] {name}: {result.vendor}, {result.total_amount}")
+    return failed
+
+def resume_batch_jobs():
+    """Collect every batch job submitted by an earlier run that exited before its results came back."""
+    store = BatchJobStore()
+    pending = store.pending()
+    if not pending:
+        print("No pending batch jobs")
+        return
+
+    poll_seconds = get_batch_api_settings()['poll_seconds']
+    for job_id, job in sorted(pending.items()):
+        print(f"\nResuming {job['kind']} batch job {job_id} ({job['vendor']})...")
+        vision_service = get_vision_service(job['vendor'])
+        wait_for_batch(vision_service, job, poll_seconds)
+        results = vision_service.collect_batch(job)
+        if job['kind'] == 'ingest':
+            failed = commit_batch_results(job, results, vision_service, get_duplicate_index())
+            print(f"Appended {len(job['images']) - len(failed)} receipts to {job['csv_file']}")
+        else:
+            # Results are now in the result cache; rerunning the evaluation reads them from there
+            print(f"Collected {len(results)} results; rerun with --eval --offline to report them")
+        store.mark_collected(job_id)
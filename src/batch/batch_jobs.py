@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BATCH_JOBS_FILE = './output/batch_jobs.json'
+
+class BatchJobStore:
+    """
+    Persists submitted vendor batch jobs, so results can be collected after
+    a restart (main.py --resume-batch-jobs) instead of paying to resubmit.
+
+    Each job is the dict returned by VisionAPIService.submit_batch plus the
+    vendor, a kind ('ingest' or 'eval'), a status ('submitted' or 'collected')
+    and whatever the caller needs to map results back (e.g. image paths).
+    """
+
+    def __init__(self, path: str = BATCH_JOBS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def _save(self, jobs: Dict[str, dict]):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(jobs, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def add(self, job: dict) -> str:
+        """Record a newly submitted job, returning its local job ID"""
+        job_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        with self._lock:
+            jobs = self._load()
+            jobs[job_id] = {**job, 'status': 'submitted', 'submitted_at': datetime.now().isoformat()}
+            self._save(jobs)
+        return job_id
+
+    def mark_collected(self, job_id: str):
+        with self._lock:
+            jobs = self._load()
+            jobs[job_id]['status'] = 'collected'
+            jobs[job_id]['collected_at'] = datetime.now().isoformat()
+            self._save(jobs)
+
+    def pending(self) -> Dict[str, dict]:
+        """Jobs submitted but not yet collected"""
+        with self._lock:
+            return {job_id: job for job_id, job in self._load().items() if job['status'] == 'submitted'}
+
+def wait_for_batch(service, job: dict, poll_seconds: float, timeout_seconds: Optional[float] = None) -> bool:
+    """Poll a job's vendor batches until they finish; returns False if timeout_seconds passes first"""
+    started = time.monotonic()
+    last_statuses: List[str] = []
+    while True:
+        statuses, done = service.batch_status(job)
+        if done:
+            return True
+        if statuses != last_statuses:
+            print(f"Batch status: {', '.join(statuses)}")
+            last_statuses = statuses
+        if timeout_seconds is not None and time.monotonic() - started > timeout_seconds:
+            return False
+        time.sleep(poll_seconds)
@@ -0,0 +1,281 @@
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import shutil
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from src.services.vision_service import get_vision_service
+from src.utils.config import get_batch_workers, get_watch_settings
+from src.utils.datastore import RECEIPTS_CSV, RECEIPT_FIELDS, append_rows, build_row
+from src.utils.duplicate_index import get_duplicate_index, record_headless_commit
+from .batch_ingest import IMAGE_EXTENSIONS
+
+LEDGER_FILE = '.receipt_watch_ledger.jsonl'
+
+class InotifyWatcher:
+    """Minimal inotify wrapper (Linux only) reporting files closed after writing or moved in."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+
+    def read(self, timeout: float) -> List[str]:
+        """Wait up to timeout seconds and return the names of completed files"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class WatchFolderDaemon:
+    """
+    Watches a directory for new receipt images, analyzes them on a worker pool,
+    appends them to the receipts CSV and moves them to processed/ or failed/.
+
+    A ledger of content hashes in the watched directory records every image
+    that was committed, so a restart (even one between the CSV write and the
+    move) never analyzes or commits the same file twice. Images that failed
+    and could not be moved to failed/ are remembered by hash, so they aren't
+    analyzed again on every rescan.
+    """
+
+    def __init__(self, watch_dir: str, workers: Optional[int] = None,
+                 overrides: Optional[Dict[str, str]] = None, csv_file: str = RECEIPTS_CSV):
+        self.watch_dir = watch_dir
+        self.processed_dir = os.path.join(watch_dir, 'processed')
+        self.failed_dir = os.path.join(watch_dir, 'failed')
+        self.ledger_path = os.path.join(watch_dir, LEDGER_FILE)
+        self.workers = workers or get_batch_workers()
+        self.overrides = overrides or {}
+        self.csv_file = csv_file
+
+        unknown = set(self.overrides) - set(RECEIPT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown override field(s): {', '.join(sorted(unknown))}")
+
+        settings = get_watch_settings()
+        self.poll_seconds = settings['poll_seconds']
+        self.settle_seconds = settings['settle_seconds']
+        self.rescan_seconds = settings['rescan_seconds']
+
+        os.makedirs(self.processed_dir, exist_ok=True)
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+        self.vision_service = get_vision_service()
+        self.duplicate_index = get_duplicate_index()
+        self.lock = threading.Lock()
+        self.committed_hashes = self._load_ledger()
+        self.stuck_hashes = set()  # Failed images still in the watched directory
+        self.candidates = {}  # name -> (size, mtime, first time seen unchanged)
+        self.in_flight = set()
+        self.stats = {'processed': 0, 'failed': 0, 'skipped': 0}
+
+    def _load_ledger(self) -> set:
+        """Load the content hashes of images already committed"""
+        hashes = set()
+        if os.path.exists(self.ledger_path):
+            with open(self.ledger_path, 'r') as f:
+                for line in f:
+                    try:
+                        hashes.add(json.loads(line)['sha256'])
+                    except (ValueError, KeyError):
+                        continue  # Ignore a torn final line from a crash
+        return hashes
+
+    def _record_committed(self, name: str, digest: str):
+        """Append an image to the ledger (caller holds the lock)"""
+        with open(self.ledger_path, 'a') as f:
+            f.write(json.dumps({'sha256': digest, 'file': name,
+                                'committed_at': datetime.now().isoformat()}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.committed_hashes.add(digest)
+
+    def _move(self, name: str, destination_dir: str) -> str:
+        """Move a file out of the watched directory without overwriting anything"""
+        destination = os.path.join(destination_dir, name)
+        if os.path.exists(destination):
+            stem, extension = os.path.splitext(name)
+            destination = os.path.join(destination_dir, f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{extension}")
+        shutil.move(os.path.join(self.watch_dir, name), destination)
+        return destination
+
+    def _skip_committed(self, name: str):
+        """Move an already committed image to processed/ without committing it again (caller holds the lock)"""
+        self._move(name, self.processed_dir)
+        self.stats['skipped'] += 1
+        print(f"{name}: already committed, moved to processed/")
+
+    def _is_image(self, name: str) -> bool:
+        return (os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+                and os.path.isfile(os.path.join(self.watch_dir, name)))
+
+    def _process(self, name: str):
+        """Worker function: analyze one image, commit it and move it out of the way"""
+        path = os.path.join(self.watch_dir, name)
+        digest = None
+        try:
+            with open(path, 'rb') as f:
+                image_bytes = f.read()
+            digest = hashlib.sha256(image_bytes).hexdigest()
+
+            if digest in self.stuck_hashes:
+                return
+            if digest in self.committed_hashes:
+                with self.lock:
+                    self._skip_committed(name)
+                return
+
+            encoded = self.vision_service.encode_image(image_bytes)
+            receipt = self.vision_service.analyze_receipt(encoded)
+            phash = self.vision_service.image_hash(encoded) if self.duplicate_index else None
+
+            with self.lock:
+                # A copy of the same image may have been committed while this one was analyzed
+                if digest in self.committed_hashes:
+                    self._skip_committed(name)
+                    return
+                row = build_row(receipt, self.overrides)
+                append_rows([row], self.csv_file)
+                record_headless_commit(self.duplicate_index, phash, row, name)
+                self._record_committed(name, digest)
+                self._move(name, self.processed_dir)
+                self.stats['processed'] += 1
+            print(f"{name}: {receipt.vendor}, {receipt.total_amount}")
+
+        except Exception as e:
+            print(f"{name}: FAILED ({e})")
+            try:
+                with self.lock:
+                    moved_to = self._move(name, self.failed_dir)
+                    with open(moved_to + '.error.txt', 'w') as f:
+                        f.write(str(e) + '\n')
+                    self.stats['failed'] += 1
+            except Exception as move_error:
+                print(f"{name}: could not move to failed/: {move_error}; not retrying it until it changes")
+                if digest is not None:
+                    with self.lock:
+                        self.stuck_hashes.add(digest)
+        finally:
+            with self.lock:
+                self.in_flight.discard(name)
+
+    def _scan(self):
+        """Poll the directory, tracking files until their size and mtime stop changing"""
+        now = time.monotonic()
+        seen = set()
+        for entry in os.scandir(self.watch_dir):
+            if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            seen.add(entry.name)
+            stat = entry.stat()
+            previous = self.candidates.get(entry.name)
+            if previous is None or previous[:2] != (stat.st_size, stat.st_mtime):
+                self.candidates[entry.name] = (stat.st_size, stat.st_mtime, now)
+        for name in list(self.candidates):
+            if name not in seen:
+                del self.candidates[name]
+
+    def _settled(self) -> List[str]:
+        """
+        Candidates unchanged for settle_seconds. Each is stat'ed again first,
+        since with inotify the last scan may be up to rescan_seconds old.
+        """
+        now = time.monotonic()
+        ready = []
+        for name, (size, mtime, since) in list(self.candidates.items()):
+            if now - since < self.settle_seconds:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.watch_dir, name))
+            except OSError:
+                del self.candidates[name]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                self.candidates[name] = (stat.st_size, stat.st_mtime, now)
+            else:
+                ready.append(name)
+        return ready
+
+    def _dispatch(self, executor: ThreadPoolExecutor, ready: List[str]):
+        """Submit ready files that are not already being processed"""
+        for name in sorted(ready):
+            self.candidates.pop(name, None)
+            with self.lock:
+                if name in self.in_flight or not os.path.exists(os.path.join(self.watch_dir, name)):
+                    continue
+                self.in_flight.add(name)
+            executor.submit(self._process, name)
+
+    def run(self):
+        """Watch until interrupted with Ctrl-C"""
+        watcher = None
+        if sys.platform.startswith('linux'):
+            try:
+                watcher = InotifyWatcher(self.watch_dir)
+            except OSError as e:
+                print(f"inotify unavailable ({e}), falling back to polling")
+
+        print(f"Watching {self.watch_dir} ({'inotify' if watcher else 'polling'}) "
+              f"with {self.workers} workers. Press Ctrl-C to stop.")
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="watch")
+        last_scan = 0.0
+        try:
+            while True:
+                ready = []
+                if watcher:
+                    # Close-write and moved-in events mean the file is complete
+                    ready += [name for name in watcher.read(self.poll_seconds) if self._is_image(name)]
+                else:
+                    time.sleep(self.poll_seconds)
+
+                # Poll as well: catches files present at startup, missed events
+                # and writers on network shares that inotify cannot see
+                if not watcher or time.monotonic() - last_scan >= self.rescan_seconds:
+                    self._scan()
+                    last_scan = time.monotonic()
+                ready += self._settled()
+
+                self._dispatch(executor, ready)
+        except KeyboardInterrupt:
+            print("\nStopping; waiting for in-flight receipts...")
+        finally:
+            executor.shutdown(wait=True)
+            if watcher:
+                watcher.close()
+            print(f"Processed: {self.stats['processed']}  Failed: {self.stats['failed']}  "
+                  f"Skipped (already committed): {self.stats['skipped']}")
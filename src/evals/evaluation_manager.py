@@ -4,17 +4,25 @@ from datetime import datetime
 from typing import List
 from .evaluation_runner import EvaluationRunner
 from .evaluation_reporter import EvaluationReporter
-from src.utils.config import load_config
+from src.utils.config import get_debug_mode, load_config, pin_config
 
 class EvaluationManager:
     """Manages the evaluation process for receipt analysis."""
     
-    def __init__(self):
-        """Initialize the evaluation manager with configuration."""
+    def __init__(self, offline: bool = False):
+        """
+        Initialize the evaluation manager with configuration.
+        
+        Args:
+            offline: Send each vendor's requests as one asynchronous batch-API job
+                     (cheaper, but results can take up to a day)
+        """
         self.config = load_config()
+        self.offline = offline
         self.eval_dir = self.config.get('eval_images_dir', 'test/eval_images/')
         self.vendors = self.config.get('eval_vendors', ['openai', 'anthropic'])
         self.prompt_methods = self.config.get('eval_prompt_methods', ['single_prompt'])
+        self.encodings = self.config.get('eval_encodings', [{'name': 'default'}])
         
         # Create evaluation directory if it doesn't exist
         os.makedirs(self.eval_dir, exist_ok=True)
@@ -41,6 +49,64 @@ class EvaluationManager:
 
     def run_evaluations(self):
         """Run evaluations for all images with all vendor/prompt combinations."""
+        # Keep every run in this evaluation on the same settings, even if config.json is edited
+        with pin_config():
+            self._run_evaluations()
+
+    def _run_offline(self, images: List[str]) -> List[pd.Series]:
+        """Evaluate every image/encoding combination through one batch-API job per vendor."""
+        from src.batch.batch_jobs import BatchJobStore, wait_for_batch
+        from src.services.vision_service import get_vision_service
+        from src.utils.config import get_batch_api_settings
+        
+        store = BatchJobStore()
+        batch_api_settings = get_batch_api_settings()
+        results_list = []
+        for vendor in self.vendors:
+            vision_service = get_vision_service(vendor)
+            
+            # One request per image/encoding; prompt methods all share the one prompt
+            requests = {}
+            for image_index, image_path in enumerate(images):
+                with open(image_path, 'rb') as f:
+                    image_bytes = f.read()
+                for encoding_index, encoding in enumerate(self.encodings):
+                    encoding_settings = {k: v for k, v in encoding.items() if k != 'name'}
+                    requests[f"{image_index}-{encoding_index}"] = (
+                        image_path, encoding, vision_service.encode_image(image_bytes, overrides=encoding_settings)
+                    )
+            
+            job = vision_service.submit_batch(
+                {request_id: encoded for request_id, (_, _, encoded) in requests.items()},
+                max_batch_bytes=batch_api_settings['max_batch_bytes']
+            )
+            job_id = store.add({**job, 'vendor': vendor, 'kind': 'eval'})
+            print(f"{vendor}: submitted batch job {job_id} ({len(requests) - len(job['cached'])} requests, "
+                  f"{len(job['cached'])} cached); waiting for results...")
+            wait_for_batch(vision_service, job, batch_api_settings['poll_seconds'])
+            results = vision_service.collect_batch(job)
+            store.mark_collected(job_id)
+            
+            for request_id, (image_path, encoding, encoded) in requests.items():
+                metadata = {
+                    'image_file': os.path.basename(image_path),
+                    'vendor': vendor,
+                    'encoding': encoding.get('name', 'default'),
+                    'timestamp': datetime.now().isoformat()
+                }
+                receipt = results.get(request_id, Exception("No result in batch output"))
+                for prompt_method in self.prompt_methods:
+                    row = pd.Series({**metadata, 'prompt_method': prompt_method})
+                    if isinstance(receipt, Exception):
+                        results_list.append(pd.concat([row, pd.Series({'error': str(receipt)})]))
+                    else:
+                        cache_hit = request_id in job['cached']
+                        results_list.append(pd.concat([row, self.runner.result_row(
+                            receipt, encoded, None, cache_hit, model=vision_service.adapter.model
+                        )]))
+        return results_list
+
+    def _run_evaluations(self):
         images = self.get_eval_images()
         if not images:
             print("No evaluation images found.")
@@ -49,45 +115,70 @@ class EvaluationManager:
         results_list = []
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
-        for image_path in images:
-            print(f"Processing image: {image_path}")
-            for vendor in self.vendors:
-                for prompt_method in self.prompt_methods:
-                    try:
-                        # Run evaluation
-                        result = self.runner.evaluate_image(
-                            image_path=image_path,
-                            vendor=vendor,
-                            prompt_method=prompt_method
-                        )
-                        
-                        # Add metadata
-                        metadata = pd.Series({
-                            'image_file': os.path.basename(image_path),
-                            'vendor': vendor,
-                            'prompt_method': prompt_method,
-                            'timestamp': datetime.now().isoformat()
-                        })
-                        
-                        # Combine metadata and results
-                        combined_result = pd.concat([metadata, result])
-                        results_list.append(combined_result)
-                        
-                    except Exception as e:
-                        print(f"Error processing {image_path} with {vendor}/{prompt_method}: {e}")
-                        # Add error result
-                        error_result = pd.Series({
-                            'image_file': os.path.basename(image_path),
-                            'vendor': vendor,
-                            'prompt_method': prompt_method,
-                            'timestamp': datetime.now().isoformat(),
-                            'error': str(e)
-                        })
-                        results_list.append(error_result)
+        if self.offline:
+            results_list = self._run_offline(images)
+        else:
+            for image_path in images:
+                print(f"Processing image: {image_path}")
+                for vendor in self.vendors:
+                    for prompt_method in self.prompt_methods:
+                        for encoding in self.encodings:
+                            encoding_name = encoding.get('name', 'default')
+                            try:
+                                # Run evaluation
+                                result = self.runner.evaluate_image(
+                                    image_path=image_path,
+                                    vendor=vendor,
+                                    prompt_method=prompt_method,
+                                    encoding=encoding
+                                )
+                            
+                                # Add metadata
+                                metadata = pd.Series({
+                                    'image_file': os.path.basename(image_path),
+                                    'vendor': vendor,
+                                    'prompt_method': prompt_method,
+                                    'encoding': encoding_name,
+                                    'timestamp': datetime.now().isoformat()
+                                })
+                            
+                                # Combine metadata and results
+                                combined_result = pd.concat([metadata, result])
+                                results_list.append(combined_result)
+                            
+                            except Exception as e:
+                                print(f"Error processing {image_path} with {vendor}/{prompt_method}/{encoding_name}: {e}")
+                                # Add error result
+                                error_result = pd.Series({
+                                    'image_file': os.path.basename(image_path),
+                                    'vendor': vendor,
+                                    'prompt_method': prompt_method,
+                                    'encoding': encoding_name,
+                                    'timestamp': datetime.now().isoformat(),
+                                    'error': str(e)
+                                })
+                                results_list.append(error_result)
         
         # Convert results list to DataFrame
         if results_list:
             self.results_df = pd.DataFrame(results_list)
             output_file = f'output/evals_results_{timestamp}.csv'
             self.reporter.save_results(self.results_df, output_file)
-            print(f"Evaluation results saved to: {output_file}") 
\ No newline at end of file
+            print(f"Evaluation results saved to: {output_file}")
+        
+        from src.utils.result_cache import get_result_cache
+        cache = get_result_cache()
+        if cache:
+            print(f"Result cache: {cache.summary()}")
+        
+        from src.services.vision_service import get_vision_service
+        for vendor in self.vendors:
+            vision_service = get_vision_service(vendor)
+            print(f"{vendor} usage: {vision_service.adapter.usage_summary()}")
+            if get_debug_mode():
+                print(f"{vendor} prompt sizes:\n{vision_service.prompt_size_histogram()}")
+            if vision_service.cascade_adapter:
+                stats = vision_service.cascade_stats
+                print(f"{vendor} cascade ({vision_service.cascade_adapter.model}): "
+                      f"{vision_service.cascade_adapter.usage_summary()}; "
+                      f"{stats['escalated']} of {stats['accepted'] + stats['escalated']} escalated") 
\ No newline at end of file
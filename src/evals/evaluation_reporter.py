@@ -12,10 +12,19 @@ class EvaluationReporter:
         
         # Define column order
         self.column_order = [
-            'image_file', 'vendor', 'prompt_method', 'timestamp',
+            'image_file', 'vendor', 'prompt_method', 'encoding', 'timestamp',
             'vendor_name', 'invoice_number', 'bill_date', 'paid_date',
             'payment_method', 'total_amount', 'item_type', 'item',
-            'project', 'expense_type', 'upper_right', 'error'
+            'project', 'expense_type', 'upper_right',
+            'image_bytes', 'image_size', 'image_tokens', 'latency_seconds', 'cache_hit',
+            'model', 'escalated', 'cost_usd', 'error'
+        ]
+        
+        # Extracted fields compared across encodings
+        self.result_fields = [
+            'vendor_name', 'invoice_number', 'bill_date', 'paid_date',
+            'payment_method', 'total_amount', 'item_type', 'item',
+            'project', 'expense_type'
         ]
     
     def save_results(self, results_df: pd.DataFrame, output_file: str):
@@ -45,6 +54,8 @@ class EvaluationReporter:
         """Generate summary statistics for the evaluation results."""
         try:
             summary_file = output_file.replace('.csv', '_summary.txt')
+            if 'error' not in df.columns:
+                df = df.assign(error=None)  # Column only exists when something failed
             
             with open(summary_file, 'w') as f:
                 f.write("=== Evaluation Summary ===\n\n")
@@ -62,11 +73,79 @@ class EvaluationReporter:
                 
                 # Vendor performance
                 f.write("=== Vendor Performance ===\n")
-                vendor_stats = df.groupby('vendor')['error'].notna().agg(['count', 'sum'])
+                vendor_stats = df['error'].notna().groupby(df['vendor']).agg(['count', 'sum'])
                 vendor_stats['success_rate'] = (1 - vendor_stats['sum'] / vendor_stats['count']) * 100
                 f.write(vendor_stats.to_string())
+                f.write("\n\n")
+                
+                # Encoding sweep
+                if 'encoding' in df.columns and df['encoding'].nunique() > 1:
+                    f.write("=== Encoding Sweep ===\n")
+                    f.write(self._encoding_summary(df).to_string())
+                    f.write("\n")
+                
+                # Model cascade
+                if 'escalated' in df.columns and df['escalated'].notna().any():
+                    f.write("\n=== Model Cascade ===\n")
+                    f.write(self._cascade_summary(df).to_string())
+                    f.write("\n")
                 
             print(f"Summary statistics saved to: {summary_file}")
             
         except Exception as e:
-            print(f"Error generating summary statistics: {e}") 
\ No newline at end of file
+            print(f"Error generating summary statistics: {e}")
+
+    def _encoding_summary(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Summarize size, tokens and latency per encoding, with the share of fields
+        that agree with the first (reference) encoding for the same image/vendor/prompt.
+        """
+        if 'error' in df.columns:
+            ok = df[df['error'].isna()]
+        else:
+            ok = df
+        fields = [col for col in self.result_fields if col in ok.columns]
+        keys = ['image_file', 'vendor', 'prompt_method']
+        reference_name = df['encoding'].iloc[0]
+        reference = ok[ok['encoding'] == reference_name].set_index(keys)[fields]
+        
+        rows = {}
+        for encoding, group in ok.groupby('encoding', sort=False):
+            candidate = group.set_index(keys)[fields]
+            common = candidate.index.intersection(reference.index)
+            if len(common) and fields:
+                matches = (candidate.loc[common].astype(str) == reference.loc[common].astype(str)).to_numpy()
+                agreement = matches.mean() * 100
+            else:
+                agreement = float('nan')
+            # Cache hits didn't touch the API, so leave them out of latency
+            api_calls = group[group['cache_hit'] != True] if 'cache_hit' in group else group
+            rows[encoding] = {
+                'runs': len(group),
+                'mean_bytes': group['image_bytes'].mean(),
+                'mean_image_tokens': group['image_tokens'].mean(),
+                'mean_latency_s': api_calls['latency_seconds'].mean(),
+                f'field_agreement_vs_{reference_name}_%': agreement
+            }
+        return pd.DataFrame.from_dict(rows, orient='index').round(2)
+
+    def _cascade_summary(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Per vendor: how often the fast model's result was escalated to the main
+        model, and the blended latency and cost per receipt across both.
+        """
+        ok = df[df['error'].isna() & df['escalated'].notna()]
+        rows = {}
+        for vendor, group in ok.groupby('vendor', sort=False):
+            # Cache hits didn't touch the API, so leave them out of latency and cost
+            api_calls = group[group['cache_hit'] != True] if 'cache_hit' in group else group
+            costs = api_calls['cost_usd'].dropna() if 'cost_usd' in api_calls else pd.Series(dtype=float)
+            rows[vendor] = {
+                'runs': len(group),
+                'escalated': int(group['escalated'].astype(bool).sum()),
+                'escalation_rate_%': group['escalated'].astype(bool).mean() * 100,
+                'mean_latency_s': api_calls['latency_seconds'].mean(),
+                'mean_cost_usd': costs.mean() if len(costs) else float('nan'),
+                'total_cost_usd': costs.sum() if len(costs) else float('nan'),
+            }
+        return pd.DataFrame.from_dict(rows, orient='index').round(4)
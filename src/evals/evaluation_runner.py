@@ -1,13 +1,14 @@
 import os
+import time
 import pandas as pd
-from typing import Dict
-from src.services.vision_service import VisionAPIService
-from src.utils.config import get_api_key
+from typing import Dict, List, Optional
+from src.services.vision_service import get_vision_service
 
 class EvaluationRunner:
     """Handles individual image evaluations with specific configurations."""
     
-    def evaluate_image(self, image_path: str, vendor: str, prompt_method: str) -> pd.Series:
+    def evaluate_image(self, image_path: str, vendor: str, prompt_method: str,
+                       encoding: Optional[Dict] = None) -> pd.Series:
         """
         Evaluate a single image with specified vendor and prompt method.
         
@@ -15,6 +16,7 @@ class EvaluationRunner:
             image_path: Path to the image file
             vendor: Vendor to use for evaluation (e.g., 'openai', 'anthropic')
             prompt_method: Prompt method to use (e.g., 'single_prompt')
+            encoding: Image encoding overrides (e.g., {'max_long_edge': 1024, 'quality': 70})
             
         Returns:
             pd.Series containing the evaluation results
@@ -24,29 +26,79 @@ class EvaluationRunner:
             with open(image_path, 'rb') as f:
                 image_bytes = f.read()
             
-            # Initialize vision service with specified vendor
-            api_key = get_api_key(vendor)
-            vision_service = VisionAPIService(api_key=api_key, vendor=vendor)
+            # Reuse the shared vision service (and its connection pool) for this vendor
+            vision_service = get_vision_service(vendor)
             
-            # Process image
-            receipt = vision_service.analyze_receipt(image_bytes)
+            # Encode with the requested settings, then process image
+            encoding_settings = {k: v for k, v in (encoding or {}).items() if k != 'name'}
+            encoded = vision_service.encode_image(image_bytes, overrides=encoding_settings)
+            cache = vision_service.result_cache
+            hits_before = cache.stats['hits'] if cache else 0
+            adapters = [adapter for adapter in (vision_service.cascade_adapter, vision_service.adapter,
+                                                vision_service.hedge_adapter) if adapter]
+            usage_before = [dict(adapter.usage) for adapter in adapters]
+            cascade_before = dict(vision_service.cascade_stats)
+            hedge_wins_before = vision_service.hedge_stats['won']
+            started = time.perf_counter()
+            receipt = vision_service.analyze_receipt(encoded)
+            latency = time.perf_counter() - started
+            cache_hit = bool(cache) and cache.stats['hits'] > hits_before
             
-            # Convert receipt object to pandas Series
-            result = pd.Series({
-                'vendor_name': receipt.vendor,
-                'invoice_number': receipt.invoice,
-                'bill_date': receipt.bill_date,
-                'paid_date': receipt.paid_date,
-                'payment_method': receipt.payment_method,
-                'total_amount': receipt.total_amount,
-                'item_type': receipt.item_type,
-                'item': receipt.item,
-                'project': receipt.project,
-                'expense_type': receipt.expense_type,
-                'upper_right': receipt.upper_right
-            })
+            # Label the model that produced this receipt: the fast model if the cascade accepted
+            # its first pass (fresh or cached), the hedge model if it won, else the main model
+            escalated = None
+            model = vision_service.adapter.model
+            if vision_service.cascade_adapter:
+                escalated = vision_service.cascade_stats['escalated'] > cascade_before['escalated']
+                if vision_service.cascade_stats['accepted'] > cascade_before['accepted']:
+                    model = vision_service.cascade_adapter.model
+            if vision_service.hedge_stats['won'] > hedge_wins_before:
+                model = vision_service.hedge_adapter.model
             
+            result = self.result_row(receipt, encoded, latency, cache_hit, model=model, escalated=escalated,
+                                     cost=self.request_cost(adapters, usage_before))
             return result
             
         except Exception as e:
-            raise Exception(f"Evaluation failed: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Evaluation failed: {str(e)}")
+
+    @staticmethod
+    def request_cost(adapters: List, usage_before: List[dict]) -> Optional[float]:
+        """USD cost of the tokens the adapters used since usage_before, or None if a model has no price"""
+        cost = 0.0
+        for adapter, before in zip(adapters, usage_before):
+            used = {key: adapter.usage[key] - before[key] for key in before}
+            if not used['requests']:
+                continue
+            adapter_cost = adapter.usage_cost(used)
+            if adapter_cost is None:
+                return None
+            cost += adapter_cost
+        return cost
+
+    @staticmethod
+    def result_row(receipt, encoded, latency: Optional[float], cache_hit: bool, model: Optional[str] = None,
+                   escalated: Optional[bool] = None, cost: Optional[float] = None) -> pd.Series:
+        """Evaluation result for one receipt; latency is None for batch-API results"""
+        # Convert receipt object to pandas Series
+        return pd.Series({
+            'vendor_name': receipt.vendor,
+            'invoice_number': receipt.invoice,
+            'bill_date': receipt.bill_date,
+            'paid_date': receipt.paid_date,
+            'payment_method': receipt.payment_method,
+            'total_amount': receipt.total_amount,
+            'item_type': receipt.item_type,
+            'item': receipt.item,
+            'project': receipt.project,
+            'expense_type': receipt.expense_type,
+            'upper_right': receipt.upper_right,
+            'image_bytes': len(encoded.data),
+            'image_size': f"{encoded.width}x{encoded.height}",
+            'image_tokens': encoded.estimated_tokens,
+            'latency_seconds': round(latency, 3) if latency is not None else None,
+            'cache_hit': cache_hit,
+            'model': model,
+            'escalated': escalated,
+            'cost_usd': round(cost, 6) if cost is not None else None
+        }) 
\ No newline at end of file
@@ -0,0 +1,964 @@
+import customtkinter as ctk
+import cv2
+from PIL import Image, ImageTk
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field as dataclass_field
+from typing import Optional, Tuple
+from src.services.vision_service import VisionAPIService, Receipt
+from src.utils.config import (get_debug_mode, get_analysis_workers, get_preview_fps,
+                              get_auto_capture_settings, get_preprocess_settings,
+                              get_quality_gate_settings, get_stream_responses)
+import tkinter
+import tkinter.messagebox
+from src.utils.correction_formatter import CorrectionFormatter, CorrectionRule
+from src.utils.auto_capture import AutoCaptureDetector
+from src.utils.frame_buffer import FrameBuffer
+from src.utils.frame_stats import FrameStats
+from src.utils.image_quality import assess_capture
+from src.utils.receipt_detector import preprocess_receipt, find_receipt_quad, draw_quad
+from src.utils.datastore import RECEIPT_FIELDS, append_rows, build_row
+from src.utils.duplicate_index import get_duplicate_index
+
+def rotate_frame(frame, rotation_angle: int):
+    """Rotate a frame counterclockwise by a multiple of 90 degrees"""
+    if rotation_angle == 90:
+        return cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    elif rotation_angle == 180:
+        return cv2.rotate(frame, cv2.ROTATE_180)
+    elif rotation_angle == 270:
+        return cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+    return frame
+
+@dataclass
+class CaptureSlot:
+    """A single capture and the state of its background analysis"""
+    capture_id: int
+    status: str = "pending"  # pending, done, failed or committed
+    receipt: Optional[Receipt] = None
+    error: Optional[str] = None
+    quality_issues: list = dataclass_field(default_factory=list)
+    overrides: dict = dataclass_field(default_factory=dict)
+    phash: Optional[int] = None  # Perceptual hash of the cropped receipt, for duplicate checks
+    partial: dict = dataclass_field(default_factory=dict)  # Fields streamed in before the receipt is complete
+
+class ReceiptProcessor(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+        
+        # Add rotation state
+        self.rotation_angle = 90  # Start with 90 degree rotation (counterclockwise)
+        
+        # Add receipt data storage
+        self.current_receipt = None
+        self.fields_to_display = list(RECEIPT_FIELDS)
+        
+        # Configure main window
+        self.title("Receipt Processor")
+        self.geometry("1600x900")  # Landscape window
+        
+        # Configure grid layout (two columns)
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=0)  # Left panel fixed width
+        self.grid_columnconfigure(1, weight=1)  # Right panel expands
+        
+        # Create left frame for camera preview (fixed width)
+        self.camera_frame = ctk.CTkFrame(self, width=500)  # Slightly narrower
+        self.camera_frame.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+        self.camera_frame.grid_propagate(False)  # Prevent frame from shrinking
+        
+        # Configure camera frame grid
+        self.camera_frame.grid_rowconfigure(0, weight=1)  # Preview expands vertically
+        self.camera_frame.grid_columnconfigure(0, weight=1)
+        
+        # Create right frame for controls and data
+        self.right_frame = ctk.CTkFrame(self)
+        self.right_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
+        self.right_frame.grid_columnconfigure(0, weight=1)
+        
+        # Create label for camera preview with fixed portrait dimensions
+        self.camera_label = ctk.CTkLabel(
+            self.camera_frame,
+            text="",
+            width=500,  # Fixed width
+            height=700  # Reduced height for portrait orientation
+        )
+        self.camera_label.grid(row=0, column=0, padx=10, pady=10, sticky="n")  # Stick to top
+        
+        # Create control panel frame at bottom of camera frame
+        self.control_panel = ctk.CTkFrame(self.camera_frame)
+        self.control_panel.grid(row=1, column=0, padx=10, pady=(0, 5), sticky="ew")
+        
+        # Create buttons in control panel
+        self.rotate_button = ctk.CTkButton(
+            self.control_panel,
+            text="Rotate (R)",
+            command=self.rotate_view
+        )
+        self.rotate_button.pack(side="left", padx=5, pady=5)
+        
+        self.save_button = ctk.CTkButton(
+            self.control_panel,
+            text="Save (Return)",
+            command=self.save_image
+        )
+        self.save_button.pack(side="left", padx=5, pady=5)
+        
+        self.capture_button = ctk.CTkButton(
+            self.control_panel,
+            text="Capture (Spacebar)",
+            command=self.capture_image
+        )
+        self.capture_button.pack(side="left", padx=5, pady=5)
+        
+        # Auto-capture toggle: capture automatically once the receipt is steady and sharp
+        auto_capture_settings = get_auto_capture_settings()
+        self.auto_capture_detector = AutoCaptureDetector(
+            stable_frames=auto_capture_settings['stable_frames'],
+            motion_threshold=auto_capture_settings['motion_threshold'],
+            sharpness_threshold=auto_capture_settings['sharpness_threshold'],
+            change_threshold=auto_capture_settings['change_threshold']
+        )
+        self.auto_capture_enabled = auto_capture_settings['enabled']
+        self.auto_capture_trigger = threading.Event()
+        
+        self.auto_capture_checkbox = ctk.CTkCheckBox(
+            self.control_panel,
+            text="Auto (A)",
+            width=20,
+            border_width=1,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            border_color=["#3B8ED0", "#1F6AA5"],
+            command=self.toggle_auto_capture
+        )
+        self.auto_capture_checkbox.pack(side="left", padx=5, pady=5)
+        if self.auto_capture_enabled:
+            self.auto_capture_checkbox.select()
+        
+        # Add status label below control panel
+        self.status_label = ctk.CTkLabel(self.camera_frame, text="")
+        self.status_label.grid(row=2, column=0, pady=(0, 10), sticky="ew")
+        
+        # Add preview performance counters in debug mode
+        self.debug_mode = get_debug_mode()
+        if self.debug_mode:
+            self.preview_stats_label = ctk.CTkLabel(self.camera_frame, text="")
+            self.preview_stats_label.grid(row=3, column=0, pady=(0, 10), sticky="ew")
+        
+        # Replace placeholder right panel content with scrollable frame
+        self.right_scroll = ctk.CTkScrollableFrame(self.right_frame)
+        self.right_scroll.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+        self.right_frame.grid_rowconfigure(0, weight=1)
+        
+        # Create dictionary to store label widgets, entry fields, and correction buttons
+        self.field_labels = {}
+        self.field_values = {}
+        self.field_overrides = {}
+        self.field_corrections = {}  # New dictionary for correction buttons
+        self.field_locks = {}  # New dictionary for lock checkboxes
+        
+        # Create labels for each field
+        for idx, field in enumerate(self.fields_to_display):
+            # Add column headers if this is the first field
+            if idx == 0:
+                value_label = ctk.CTkLabel(self.right_scroll, text="Value")
+                value_label.grid(row=0, column=1, padx=5, pady=5)
+                
+                override_label = ctk.CTkLabel(self.right_scroll, text="Override")
+                override_label.grid(row=0, column=2, padx=5, pady=5)
+                
+                self.lock_all_checkbox = ctk.CTkCheckBox(
+                    self.right_scroll,
+                    text="Lock",
+                    width=20,
+                    border_width=1,
+                    fg_color=["#3B8ED0", "#1F6AA5"],
+                    border_color=["#3B8ED0", "#1F6AA5"],
+                    command=self.toggle_all_locks
+                )
+                self.lock_all_checkbox.grid(row=0, column=3, padx=5, pady=5)
+            
+            label = ctk.CTkLabel(self.right_scroll, text=f"{field.replace('_', ' ').title()}:")
+            label.grid(row=idx+1, column=0, padx=5, pady=5, sticky="e")  # Shift down by 1
+            
+            # Replace Label with TextBox for selectable text
+            value_textbox = ctk.CTkTextbox(self.right_scroll, width=200, height=30)
+            value_textbox.grid(row=idx+1, column=1, padx=5, pady=(4, 5), sticky="w")  # Shift down by 1
+            
+            # Add override entry field with trace
+            override_entry = ctk.CTkEntry(self.right_scroll, width=200)
+            override_entry.grid(row=idx+1, column=2, padx=5, pady=5, sticky="w")  # Shift down by 1
+            
+            # Bind the override entry to enable/disable correction button
+            override_entry.bind('<KeyRelease>', 
+                lambda event, f=field: self.on_override_change(f))
+            
+            # Add lock checkbox with custom styling
+            lock_checkbox = ctk.CTkCheckBox(
+                self.right_scroll,
+                text="",
+                width=20,
+                border_width=1,  # Thinner border
+                fg_color=["#3B8ED0", "#1F6AA5"],  # Match default button color
+                border_color=["#3B8ED0", "#1F6AA5"]  # Match border to fg_color
+            )
+            lock_checkbox.grid(row=idx+1, column=3, padx=5, pady=5)
+            
+            # Add correction button
+            correction_button = ctk.CTkButton(
+                self.right_scroll,
+                text="Correction",
+                width=100,
+                state="disabled",
+                command=lambda f=field: self.formulate_correction(f)
+            )
+            correction_button.grid(row=idx+1, column=4, padx=5, pady=5)  # Shift down by 1
+            
+            self.field_labels[field] = label
+            self.field_values[field] = value_textbox
+            self.field_overrides[field] = override_entry
+            self.field_corrections[field] = correction_button
+            self.field_locks[field] = lock_checkbox  # Store checkbox reference
+        
+        # Add correction label and entry field with spacing above
+        correction_label = ctk.CTkLabel(self.right_scroll, text="Correction:")
+        correction_label.grid(row=len(self.fields_to_display)+2, column=0, padx=5, pady=5, sticky="e")
+
+        # Add a separator line above the correction section
+        separator = ctk.CTkFrame(self.right_scroll, height=2)
+        separator.grid(row=len(self.fields_to_display)+1, column=0, columnspan=5, sticky="ew", pady=10)
+
+        self.correction_entry = ctk.CTkEntry(self.right_scroll, width=400)
+        self.correction_entry.grid(row=len(self.fields_to_display)+2, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
+
+        # Add and Reload buttons to the right of correction entry
+        self.add_correction_button = ctk.CTkButton(
+            self.right_scroll,
+            text="Add",
+            width=100,
+            command=self.add_correction,
+            state="disabled"
+        )
+        self.add_correction_button.grid(row=len(self.fields_to_display)+2, column=3, padx=5, pady=5)
+
+        self.reload_correction_button = ctk.CTkButton(
+            self.right_scroll,
+            text="Reload",
+            width=100,
+            command=self.reload_corrections
+        )
+        self.reload_correction_button.grid(row=len(self.fields_to_display)+2, column=4, padx=5, pady=5)
+
+        self.compact_correction_button = ctk.CTkButton(
+            self.right_scroll,
+            text="Compact",
+            width=100,
+            command=self.compact_corrections
+        )
+        self.compact_correction_button.grid(row=len(self.fields_to_display)+3, column=4, padx=5, pady=5)
+
+        # Create frame to hold the two buttons and center them together
+        button_frame = ctk.CTkFrame(self.right_scroll)
+        button_frame.grid(row=len(self.fields_to_display)+3, column=1, 
+                         columnspan=2, pady=20)
+
+        # Clear form button in button frame
+        self.clear_button = ctk.CTkButton(
+            button_frame,
+            text="Clear form",
+            command=self.clear_form
+        )
+        self.clear_button.pack(side="left", padx=5)
+        
+        # Commit button in button frame
+        self.commit_button = ctk.CTkButton(
+            button_frame,
+            text="Commit to datastore",
+            command=self.commit_to_datastore,
+            state="disabled"
+        )
+        self.commit_button.pack(side="left", padx=5)
+
+        # Create capture navigation bar below the scrollable form
+        self.capture_nav = ctk.CTkFrame(self.right_frame)
+        self.capture_nav.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+        self.prev_capture_button = ctk.CTkButton(
+            self.capture_nav,
+            text="< Prev",
+            width=100,
+            command=self.show_previous_capture,
+            state="disabled"
+        )
+        self.prev_capture_button.pack(side="left", padx=5, pady=5)
+
+        self.capture_nav_label = ctk.CTkLabel(self.capture_nav, text="No captures")
+        self.capture_nav_label.pack(side="left", expand=True, padx=5, pady=5)
+
+        self.next_capture_button = ctk.CTkButton(
+            self.capture_nav,
+            text="Next >",
+            width=100,
+            command=self.show_next_capture,
+            state="disabled"
+        )
+        self.next_capture_button.pack(side="right", padx=5, pady=5)
+
+        # Bind keyboard shortcuts to main window
+        self.bind('<space>', self.handle_space)
+        self.bind('<Return>', self.handle_return)
+        self.bind('r', self.handle_r)
+        self.bind('a', self.handle_a)
+        self.bind('<Left>', self.handle_left)
+        self.bind('<Right>', self.handle_right)
+
+        # Initialize the Vision API Service
+        self.vision_service = VisionAPIService()  # Will use vendor from config.json
+
+        # Background analysis: captures are analyzed on a worker pool and the
+        # results are drained on the Tk thread, so the preview never blocks
+        self.captures = []
+        self.current_capture_index = None
+        self.analysis_results = queue.Queue()
+        self.field_updates = queue.Queue()  # (capture_id, field, value) as responses stream in
+        self.stream_responses = get_stream_responses()
+        self.analysis_executor = ThreadPoolExecutor(
+            max_workers=get_analysis_workers(),
+            thread_name_prefix="analysis"
+        )
+        self.poll_analysis_results()
+
+        # Add debug print to verify key
+        # print(f"Vision service initialized with key: {self.vision_service.api_key[:8]}...") # Only show first 8 chars for security
+        
+        # Initialize camera variables
+        self.camera = None
+        self.camera_running = False
+        self.frame_buffer = FrameBuffer()
+        self.last_preview_sequence = 0
+        
+        # Receipt crop/binarize settings and quality gate for the capture path
+        self.preprocess_settings = get_preprocess_settings()
+        self.quality_gate = get_quality_gate_settings()
+        
+        # Index of committed receipts, checked before each commit (None if disabled)
+        self.duplicate_index = get_duplicate_index()
+        
+        # Preview rendering state
+        self.preview_image = None
+        self.preview_interval_ms = 1000 / get_preview_fps()
+        self.preview_stats = FrameStats()
+        self.camera_stats = FrameStats()
+        
+        # Start camera
+        self.start_camera()
+        
+    def start_camera(self):
+        """Initialize and start the camera feed"""
+        try:
+            self.camera = cv2.VideoCapture(0)
+            if not self.camera.isOpened():
+                raise Exception("Could not open camera")
+            
+            # Set camera resolution to a more suitable size
+            # Using 1080p resolution in landscape (will be rotated)
+            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
+            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
+            
+            self.camera_running = True
+            
+            # Start camera thread
+            self.camera_thread = threading.Thread(target=self.update_camera)
+            self.camera_thread.daemon = True
+            self.camera_thread.start()
+            
+            # Start frame update
+            self.update_frame()
+            
+        except Exception as e:
+            print(f"Error starting camera: {e}")
+            self.status_label.configure(text=f"Error: {e}")
+    
+    def update_camera(self):
+        """Camera capture thread function"""
+        while self.camera_running:
+            ret, frame = self.camera.read()
+            if ret:
+                self.camera_stats.begin_frame()
+                
+                # Rotate here so neither the preview nor the capture path has to.
+                # The frame stays BGR; consumers convert only what they need.
+                frame = rotate_frame(frame, self.rotation_angle)
+                self.frame_buffer.put(frame)
+                
+                # Tk is not thread-safe, so only flag the capture here;
+                # update_frame performs it on the UI thread
+                if self.auto_capture_enabled and self.auto_capture_detector.update(frame):
+                    self.auto_capture_trigger.set()
+                self.camera_stats.end_frame()
+    
+    def update_frame(self):
+        """Update the UI with the latest frame, capped at the configured preview FPS"""
+        started = time.perf_counter()
+        try:
+            # Only re-render when the camera thread has delivered a new frame
+            if self.frame_buffer.sequence != self.last_preview_sequence:
+                self.preview_stats.begin_frame()
+                
+                # Get the actual dimensions of the camera label
+                preview_width = self.camera_label.winfo_width()
+                preview_height = self.camera_label.winfo_height()
+                
+                def fill_preview(frame_width: int, frame_height: int) -> Tuple[int, int]:
+                    """Scale to cover the label while maintaining aspect ratio"""
+                    img_ratio = frame_width / frame_height
+                    if img_ratio > preview_width / preview_height:
+                        return int(preview_height * img_ratio), preview_height
+                    return preview_width, int(preview_width / img_ratio)
+                
+                # The buffer downscales the raw frame before converting colour, so
+                # neither the conversion nor PIL ever handles more than a label-sized image
+                sequence, frame = self.frame_buffer.get_converted(cv2.COLOR_BGR2RGB, fill_preview)
+                self.last_preview_sequence = sequence
+                
+                # Center horizontally but align to top vertically
+                x_offset = (frame.shape[1] - preview_width) // 2
+                frame = frame[:preview_height, x_offset:x_offset + preview_width]
+                
+                # DEBUG: Outline the receipt the capture path would crop to (edge
+                # detection on the RGB preview finds the same outline as on BGR)
+                if self.debug_mode and self.preprocess_settings['crop']:
+                    quad = find_receipt_quad(frame, analysis_width=min(480, preview_width))
+                    if quad is not None:
+                        frame = frame.copy()
+                        draw_quad(frame, quad)
+                
+                image = Image.fromarray(frame)
+                
+                # Reuse a single CTkImage rather than building one per frame
+                if self.preview_image is None:
+                    self.preview_image = ctk.CTkImage(light_image=image,
+                                                      dark_image=image,
+                                                      size=(preview_width, preview_height))
+                    self.camera_label.configure(image=self.preview_image)
+                else:
+                    self.preview_image.configure(light_image=image,
+                                                 dark_image=image,
+                                                 size=(preview_width, preview_height))
+                self.preview_stats.end_frame()
+                
+                if self.debug_mode:
+                    stats_text = f"Preview: {self.preview_stats.summary()} | Camera: {self.camera_stats.summary()}"
+                    if self.auto_capture_enabled:
+                        stats_text += (f"\nMotion: {self.auto_capture_detector.motion:.1f}"
+                                       f" | Sharpness: {self.auto_capture_detector.sharpness:.0f}")
+                    self.preview_stats_label.configure(text=stats_text)
+            
+            # Fire a capture requested by the auto-capture detector
+            if self.auto_capture_trigger.is_set():
+                self.auto_capture_trigger.clear()
+                if self.auto_capture_enabled:
+                    self.capture_image()
+            
+            # Schedule next update, leaving the rest of the frame budget to the UI
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.after(max(1, int(self.preview_interval_ms - elapsed_ms)), self.update_frame)
+            
+        except Exception as e:
+            print(f"Error updating frame: {e}")
+            self.status_label.configure(text=f"Error: {e}")
+    
+    def capture_image(self):
+        """Capture the current frame and queue it for background analysis"""
+        try:
+            _, frame_bgr = self.frame_buffer.get()
+            if frame_bgr is not None:
+                # Pre-flight quality check so a bad capture doesn't cost an API call
+                quality_issues = []
+                if self.quality_gate['mode'] != 'off':
+                    quality = assess_capture(frame_bgr, self.quality_gate['thresholds'])
+                    quality_issues = quality.issues
+                    if not quality.ok and self.quality_gate['mode'] == 'block':
+                        self.status_label.configure(text=f"Capture blocked: {quality.summary()}")
+                        self.after(3000, lambda: self.status_label.configure(text=""))
+                        return
+                
+                # Create a slot for this capture and switch the form to it
+                slot = CaptureSlot(capture_id=len(self.captures) + 1, quality_issues=quality_issues)
+                self.captures.append(slot)
+                self.show_capture(len(self.captures) - 1)
+                
+                # Analyze the receipt on a worker thread; the result is picked up
+                # by poll_analysis_results so the operator can keep capturing
+                self.analysis_executor.submit(self._analyze_capture, slot.capture_id, frame_bgr, self.locked_values())
+                status = f"Capture #{slot.capture_id} queued for analysis..."
+                if quality_issues:
+                    status += f" (low quality: {', '.join(quality_issues)})"
+                self.status_label.configure(text=status)
+            else:
+                self.status_label.configure(text="Error: No frame available")
+        except Exception as e:
+            print(f"Error capturing image: {e}")
+            self.status_label.configure(text=f"Error capturing image: {e}")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+
+    def locked_values(self) -> dict:
+        """Values of the locked fields that have one; these are not requested again"""
+        locked = {}
+        for field in self.fields_to_display:
+            if self.field_locks[field].get():
+                value = self.field_values[field].get("1.0", "end").strip()
+                if value:
+                    locked[field] = value
+        return locked
+
+    def _analyze_capture(self, capture_id: int, frame_bgr, locked: dict):
+        """Worker thread function: prepare and analyze a capture, then post the result for the UI thread"""
+        try:
+            # Crop to the receipt (falls back to the full frame if none is found)
+            image, quad = preprocess_receipt(
+                frame_bgr,
+                crop=self.preprocess_settings['crop'],
+                binarize_output=self.preprocess_settings['binarize']
+            )
+            
+            # Encode within the vendor's size/token budget, and hash what is uploaded
+            # (as the batch and watch-folder paths do) for the duplicate check
+            encoded = self.vision_service.encode_image(image)
+            phash = self.vision_service.image_hash(encoded)
+            
+            # DEBUG: Save the exact image being sent to vision service if debug mode is enabled
+            if get_debug_mode():
+                from datetime import datetime
+                import os
+                os.makedirs('./output/saved_images', exist_ok=True)
+                debug_timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                extension = encoded.media_type.split('/')[-1].replace('jpeg', 'jpg')
+                with open(f'./output/saved_images/debug_sent_{debug_timestamp}_{capture_id}.{extension}', 'wb') as f:
+                    f.write(encoded.data)
+                print(f"Capture #{capture_id}: receipt {'found' if quad is not None else 'not found'}, "
+                      f"sending {encoded.summary()}")
+            
+            if self.stream_responses:
+                # Fields are posted as they stream in, so the form fills while the rest arrives
+                receipt = self.vision_service.analyze_receipt_streaming(
+                    encoded,
+                    on_field=lambda field, value: self.field_updates.put((capture_id, field, value)),
+                    locked=locked
+                )
+            else:
+                receipt = self.vision_service.analyze_receipt(encoded, locked=locked)
+            self.analysis_results.put((capture_id, receipt, None, phash))
+        except Exception as e:
+            self.analysis_results.put((capture_id, None, str(e), None))
+
+    def poll_analysis_results(self):
+        """Drain finished analyses from the worker queue into their capture slots"""
+        self.apply_field_updates()
+        try:
+            while True:
+                capture_id, receipt, error, phash = self.analysis_results.get_nowait()
+                slot = self.captures[capture_id - 1]
+                slot.phash = phash
+                
+                if error:
+                    slot.status = "failed"
+                    slot.error = error
+                    print(f"Error analyzing capture #{capture_id}: {error}")
+                    self.status_label.configure(text=f"Capture #{capture_id} failed: {error}")
+                else:
+                    slot.status = "done"
+                    slot.receipt = receipt
+                    print(f"Receipt analyzed (capture #{capture_id}):", receipt)
+                    self.status_label.configure(
+                        text=f"Capture #{capture_id}: Vendor: {receipt.vendor}, Total: {receipt.total_amount}"
+                    )
+                
+                # Fill the form if the operator is looking at this capture
+                if self.current_capture_index == capture_id - 1 and receipt:
+                    self.current_receipt = receipt
+                    self.update_receipt_display()
+                
+                self.update_capture_nav()
+        except queue.Empty:
+            pass
+        except Exception as e:
+            print(f"Error handling analysis result: {e}")
+        
+        self.after(100, self.poll_analysis_results)
+
+    def apply_field_updates(self):
+        """Show streamed fields for captures still being analyzed"""
+        try:
+            while True:
+                capture_id, field, value = self.field_updates.get_nowait()
+                slot = self.captures[capture_id - 1]
+                if slot.receipt is not None:
+                    continue
+                slot.partial[field] = value
+                if self.current_capture_index == capture_id - 1:
+                    self.show_field_value(field, value)
+        except queue.Empty:
+            pass
+
+    def show_field_value(self, field: str, value):
+        """Put a value in a field's textbox unless the field is locked"""
+        if field not in self.field_values or self.field_locks[field].get():
+            return
+        textbox = self.field_values[field]
+        textbox.configure(state="normal")
+        textbox.delete("1.0", "end")
+        textbox.insert("1.0", str(value))
+        textbox.configure(state="disabled")
+
+    def show_capture(self, index: int):
+        """Switch the form to the given capture slot, keeping each slot's overrides"""
+        # Stash the overrides entered for the slot we are leaving
+        if self.current_capture_index is not None:
+            leaving = self.captures[self.current_capture_index]
+            leaving.overrides = {field: self.field_overrides[field].get() for field in self.fields_to_display}
+        
+        self.current_capture_index = index
+        slot = self.captures[index]
+        self.current_receipt = slot.receipt
+        
+        # Clear unlocked fields and restore this slot's overrides
+        for field in self.fields_to_display:
+            if not self.field_locks[field].get():
+                self.field_values[field].configure(state="normal")
+                self.field_values[field].delete("1.0", "end")
+                self.field_values[field].configure(state="disabled")
+                self.field_overrides[field].delete(0, 'end')
+                self.field_overrides[field].insert(0, slot.overrides.get(field, ''))
+            self.on_override_change(field)
+        
+        # Clear correction entry
+        self.correction_entry.delete(0, 'end')
+        
+        self.commit_button.configure(state="disabled")
+        self.add_correction_button.configure(state="disabled")
+        
+        if slot.receipt:
+            self.update_receipt_display()
+            if slot.status == "committed":
+                for field in self.fields_to_display:
+                    self.field_values[field].configure(text_color="grey")
+                self.commit_button.configure(state="disabled")
+        elif slot.status == "failed":
+            self.status_label.configure(text=f"Capture #{slot.capture_id} failed: {slot.error}")
+        else:
+            for field, value in slot.partial.items():
+                self.show_field_value(field, value)
+        
+        self.update_capture_nav()
+
+    def update_capture_nav(self):
+        """Refresh the capture navigation label and buttons"""
+        if self.current_capture_index is None:
+            self.capture_nav_label.configure(text="No captures")
+            return
+        
+        slot = self.captures[self.current_capture_index]
+        in_flight = sum(1 for s in self.captures if s.status == "pending")
+        text = f"Capture {slot.capture_id}/{len(self.captures)} ({slot.status})"
+        if slot.quality_issues:
+            text += f" - low quality: {', '.join(slot.quality_issues)}"
+        if in_flight:
+            text += f" - {in_flight} in flight"
+        self.capture_nav_label.configure(text=text)
+        
+        self.prev_capture_button.configure(
+            state="normal" if self.current_capture_index > 0 else "disabled"
+        )
+        self.next_capture_button.configure(
+            state="normal" if self.current_capture_index < len(self.captures) - 1 else "disabled"
+        )
+
+    def show_previous_capture(self):
+        """Step back to the previous capture slot"""
+        if self.current_capture_index:
+            self.show_capture(self.current_capture_index - 1)
+
+    def show_next_capture(self):
+        """Step forward to the next capture slot"""
+        if self.current_capture_index is not None and self.current_capture_index < len(self.captures) - 1:
+            self.show_capture(self.current_capture_index + 1)
+    
+    def save_image(self):
+        """Save the current frame to the output/saved_images folder"""
+        try:
+            import os
+            from datetime import datetime
+            
+            # Create output/saved_images directory if it doesn't exist
+            os.makedirs('./output/saved_images', exist_ok=True)
+            
+            _, frame = self.frame_buffer.get()
+            if frame is not None:
+                # Generate filename with timestamp
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                filename = f'./output/saved_images/receipt_{timestamp}.jpg'
+                
+                # Save the image
+                cv2.imwrite(filename, frame)
+                
+                self.status_label.configure(text=f"Image saved: {filename}")
+                self.after(2000, lambda: self.status_label.configure(text=""))
+            else:
+                self.status_label.configure(text="Error: No frame available")
+        except Exception as e:
+            print(f"Error saving image: {e}")
+            self.status_label.configure(text=f"Error saving image: {e}")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+    
+    def toggle_auto_capture(self):
+        """Switch auto-capture on or off to match the checkbox"""
+        self.auto_capture_enabled = bool(self.auto_capture_checkbox.get())
+        self.auto_capture_detector.reset()
+        self.auto_capture_trigger.clear()
+        self.status_label.configure(text=f"Auto-capture {'on' if self.auto_capture_enabled else 'off'}")
+        self.after(2000, lambda: self.status_label.configure(text=""))
+    
+    def rotate_view(self):
+        """Rotate the preview by 90 degrees clockwise"""
+        self.rotation_angle = (self.rotation_angle + 90) % 360
+        self.status_label.configure(text=f"Rotation: {self.rotation_angle}°")
+        self.after(2000, lambda: self.status_label.configure(text=""))
+    
+    def on_closing(self):
+        """Clean up resources on window close"""
+        self.camera_running = False
+        if self.camera is not None:
+            self.camera.release()
+        self.analysis_executor.shutdown(wait=False, cancel_futures=True)
+        if get_debug_mode():
+            print(f"\n=== Prompt sizes ===\n{self.vision_service.prompt_size_histogram()}")
+        self.quit()
+
+    def update_receipt_display(self):
+        """Update the right panel with receipt data"""
+        if self.current_receipt:
+            for field in self.fields_to_display:
+                # Only update if the field is not locked
+                if not self.field_locks[field].get():
+                    value = getattr(self.current_receipt, field)
+                    # Enable textbox for editing, update text, then disable again
+                    textbox = self.field_values[field]
+                    textbox.configure(state="normal")
+                    textbox.delete("1.0", "end")
+                    textbox.insert("1.0", str(value))
+                    textbox.configure(state="disabled")
+                    # Reset text color to default
+                    textbox.configure(text_color=("black", "white"))  # (light mode, dark mode)
+            self.commit_button.configure(state="normal")
+            self.add_correction_button.configure(state="normal")
+
+    def commit_to_datastore(self):
+        """Save the current receipt data to CSV file"""
+        try:
+            # Write receipt data, using overrides where present
+            overrides = {field: self.field_overrides[field].get() for field in self.fields_to_display}
+            row = build_row(self.current_receipt, overrides, self.fields_to_display)
+            
+            # Warn before writing a receipt that looks already committed
+            slot = self.captures[self.current_capture_index] if self.current_capture_index is not None else None
+            phash = slot.phash if slot else None
+            if self.duplicate_index and not self.confirm_not_duplicate(phash, row):
+                self.status_label.configure(text="Commit cancelled: possible duplicate")
+                self.after(2000, lambda: self.status_label.configure(text=""))
+                return
+            
+            append_rows([row], fields=self.fields_to_display)
+            if self.duplicate_index:
+                self.duplicate_index.add(phash, row.get('vendor'), row.get('total_amount'), row.get('paid_date'))
+            
+            # Update the greying out of values
+            for field in self.fields_to_display:
+                self.field_values[field].configure(text_color="grey")
+                self.field_overrides[field].delete(0, 'end')  # Clear override entries
+            
+            # Clear correction field
+            self.correction_entry.delete(0, 'end')
+            
+            # Mark the capture slot as committed
+            if self.current_capture_index is not None:
+                self.captures[self.current_capture_index].status = "committed"
+                self.update_capture_nav()
+            
+            # Disable buttons and show success message
+            self.commit_button.configure(state="disabled")
+            self.add_correction_button.configure(state="disabled")
+            self.status_label.configure(text="Receipt committed to CSV")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+            
+        except Exception as e:
+            print(f"Error saving to CSV: {e}")
+            self.status_label.configure(text=f"Error saving to CSV: {e}")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+
+    def confirm_not_duplicate(self, phash, row: dict) -> bool:
+        """Ask the operator whether to commit a receipt matching one already in the index"""
+        matches = self.duplicate_index.find(phash, row.get('vendor'), row.get('total_amount'), row.get('paid_date'))
+        if not matches:
+            return True
+        details = "\n".join(f"- {match.summary()}" for match in matches[:5])
+        return tkinter.messagebox.askyesno(
+            "Possible duplicate",
+            f"This receipt looks like one already committed:\n\n{details}\n\nCommit anyway?",
+            icon='warning'
+        )
+
+    def is_override_focused(self):
+        """Check if any override entry has focus"""
+        focused = self.focus_get()
+        return isinstance(focused, (ctk.CTkEntry, tkinter.Entry))  # Check for both types
+
+    def handle_space(self, event):
+        """Handle spacebar press only if not in override fields"""
+        focused = self.is_override_focused()
+        if not focused:
+            self.capture_image()
+
+    def handle_return(self, event):
+        """Handle return press only if not in override fields"""
+        focused = self.is_override_focused()
+        if not focused:
+            self.save_image()
+
+    def handle_r(self, event):
+        """Handle R press only if not in override fields"""
+        focused = self.is_override_focused()
+        if not focused:
+            self.rotate_view()
+
+    def handle_a(self, event):
+        """Handle A press only if not in override fields"""
+        focused = self.is_override_focused()
+        if not focused:
+            self.auto_capture_checkbox.toggle()
+
+    def handle_left(self, event):
+        """Handle Left arrow press only if not in override fields"""
+        focused = self.is_override_focused()
+        if not focused:
+            self.show_previous_capture()
+
+    def handle_right(self, event):
+        """Handle Right arrow press only if not in override fields"""
+        focused = self.is_override_focused()
+        if not focused:
+            self.show_next_capture()
+
+    def add_correction(self):
+        """Save the correction to disk and update in-memory corrections"""
+        try:
+            correction = self.correction_entry.get().strip()
+            if correction:
+                # Save to disk; the service's prompt picks it up from there
+                saved = self.vision_service.save_correction(correction)
+                
+                # Clear the correction entry and show feedback
+                self.correction_entry.delete(0, 'end')
+                self.status_label.configure(text="Correction saved" if saved else "Correction already saved")
+                self.after(2000, lambda: self.status_label.configure(text=""))
+                
+        except Exception as e:
+            print(f"Error saving correction: {e}")
+            self.status_label.configure(text=f"Error saving correction: {e}")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+
+    def on_override_change(self, field):
+        """Enable/disable correction button based on override field content"""
+        override_value = self.field_overrides[field].get().strip()
+        self.field_corrections[field].configure(
+            state="normal" if override_value else "disabled"
+        )
+
+    def formulate_correction(self, field):
+        """Create correction text based on field and override value"""
+        rule = CorrectionRule(
+            field=field,
+            original_value=self.field_values[field].get("1.0", "end-1c"),  # Get text from textbox
+            corrected_value=self.field_overrides[field].get().strip(),
+            vendor_context=self.field_values['vendor'].get("1.0", "end-1c") if field != 'vendor' else None
+        )
+        
+        correction_text = CorrectionFormatter.format_rule(rule)
+        
+        # Set the correction text in the main correction entry
+        self.correction_entry.delete(0, 'end')
+        self.correction_entry.insert(0, correction_text)
+
+    def reload_corrections(self):
+        """Reload corrections from disk"""
+        try:
+            self.vision_service.reload_corrections()
+            self.status_label.configure(text="Corrections reloaded")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+            
+        except Exception as e:
+            print(f"Error reloading corrections: {e}")
+            self.status_label.configure(text=f"Error reloading corrections: {e}")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+
+    def compact_corrections(self):
+        """Deduplicate and sort corrections.txt, warning about conflicting rules"""
+        try:
+            report = self.vision_service.compact_corrections()
+            print(f"Compacted corrections: {report.summary()}")
+            self.status_label.configure(
+                text=f"Corrections compacted: {report.lines_before} -> {report.lines_after}")
+            self.after(3000, lambda: self.status_label.configure(text=""))
+            if report.conflicts:
+                details = "\n".join(f"- {conflict}" for conflict in report.conflicts[:10])
+                tkinter.messagebox.showwarning(
+                    "Conflicting corrections",
+                    f"{len(report.conflicts)} conflicting corrections were found:\n\n{details}\n\n"
+                    "All of them are kept in corrections.txt and noted at the top; delete the ones you don't want."
+                )
+
+        except Exception as e:
+            print(f"Error compacting corrections: {e}")
+            self.status_label.configure(text=f"Error compacting corrections: {e}")
+            self.after(2000, lambda: self.status_label.configure(text=""))
+
+    def toggle_all_locks(self):
+        """Set all row lock checkboxes to match the header checkbox state"""
+        if self.lock_all_checkbox.get():
+            for field in self.fields_to_display:
+                self.field_locks[field].select()
+        else:
+            for field in self.fields_to_display:
+                self.field_locks[field].deselect()
+
+    def clear_form(self):
+        """Clear all form fields, overrides, checkboxes, and entries"""
+        # Clear all field values and override entries
+        for field in self.fields_to_display:
+            # Clear textbox
+            self.field_values[field].configure(state="normal")
+            self.field_values[field].delete("1.0", "end")
+            self.field_values[field].configure(state="disabled")
+            
+            # Clear override entry
+            self.field_overrides[field].delete(0, 'end')
+            
+            # Uncheck lock checkbox
+            self.field_locks[field].deselect()
+
+            # Disable correction button
+            self.field_corrections[field].configure(state="disabled")
+
+        self.lock_all_checkbox.deselect()
+        
+        # Clear correction entry
+        self.correction_entry.delete(0, 'end')
+        
+        # Disable commit and add correction buttons
+        self.commit_button.configure(state="disabled")
+        self.add_correction_button.configure(state="disabled")
+        
+        # Clear current receipt
+        self.current_receipt = None
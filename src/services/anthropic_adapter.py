@@ -1,73 +1,217 @@
 import base64
-import requests
-from .vision_adapter import VisionAdapter
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+from .vision_adapter import VisionAdapter, api_error, iter_sse_events, receipt_json_schema
+
+# Tool the model is forced to call in structured output mode; its input is the receipt
+RECEIPT_TOOL = "record_receipt"
 
 class AnthropicVisionAdapter(VisionAdapter):
-    def __init__(self, api_key: str):
+    vendor = "anthropic"
+
+    def __init__(self, api_key: str, model: Optional[str] = None):
         super().__init__(api_key)
-        self.api_url = "https://api.anthropic.com/v1/messages"
-        from src.utils.config import get_model
-        self.model = get_model('anthropic')
+        from src.utils.config import get_model, get_api_base
+        self.api_base = get_api_base('anthropic')
+        self.api_url = f"{self.api_base}/v1/messages"
+        self.model = model or get_model('anthropic')
         self.headers = {
             "x-api-key": api_key,
             "anthropic-version": "2023-06-01",
             "content-type": "application/json"
         }
-        
+
         # Add debug print
         from src.utils.config import get_debug_mode
         if get_debug_mode():
             print(f"\n=== Using Anthropic Model: {self.model} ===\n")
 
-    def analyze_receipt(self, image_bytes: bytes, prompt: str) -> str:
-        try:
-            # Convert image to base64
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            
-            # Construct API payload
-            payload = {
-                "model": self.model,
-                "messages": [{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": base64_image
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
+    def _build_payload(self, image_bytes: bytes, prompt: str, media_type: str,
+                       fields: Optional[List[str]], max_tokens: int) -> dict:
+        # Convert image to base64
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+
+        # Construct API payload
+        payload = {
+            "model": self.model,
+            # The prompt is identical for every receipt, so it goes before the image and
+            # ends in a cache breakpoint: the system text and prompt are then read from cache
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt,
+                        "cache_control": {"type": "ephemeral"}
+                    },
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": base64_image
                         }
-                    ]
-                }],
-                "system": "You are a helpful assistant that extracts structured data from images of receipts.",
-                "max_tokens": 1024
-            }
+                    }
+                ]
+            }],
+            "system": "You are a helpful assistant that extracts structured data from images of receipts.",
+            "max_tokens": max_tokens
+        }
+        if self.structured_output:
+            # Forcing a tool call makes the model emit arguments matching the schema
+            payload["tools"] = [{
+                "name": RECEIPT_TOOL,
+                "description": "Record the fields extracted from the receipt image.",
+                "input_schema": receipt_json_schema(fields)
+            }]
+            payload["tool_choice"] = {"type": "tool", "name": RECEIPT_TOOL}
+        return payload
+
+    def _record_response_usage(self, usage: dict, output_tokens: int = None):
+        usage = usage or {}
+        cache_read = usage.get('cache_read_input_tokens') or 0
+        cache_write = usage.get('cache_creation_input_tokens') or 0
+        self.record_usage(
+            input_tokens=usage.get('input_tokens', 0) + cache_read + cache_write,
+            cached_input_tokens=cache_read,
+            cache_write_tokens=cache_write,
+            output_tokens=usage.get('output_tokens', 0) if output_tokens is None else output_tokens
+        )
+
+    def _extract_text(self, response_data: dict) -> Tuple[str, bool]:
+        """Text (or tool input as JSON) of a Messages API result, and whether it was truncated"""
+        self._record_response_usage(response_data.get('usage'))
+        truncated = response_data.get('stop_reason') == 'max_tokens'
+        for block in response_data['content']:
+            if block['type'] == 'tool_use':
+                return json.dumps(block['input']), truncated
+        return response_data['content'][0]['text'], truncated
+
+    def _send(self, image_bytes: bytes, prompt: str, media_type: str,
+              fields: Optional[List[str]], max_tokens: int) -> Tuple[str, bool]:
+        response = None
+        try:
+            payload = self._build_payload(image_bytes, prompt, media_type, fields, max_tokens)
 
             # Make API request
-            response = requests.post(
+            response = self.session.post(
                 self.api_url,
                 headers=self.headers,
-                json=payload
+                json=payload,
+                timeout=self.timeout
             )
-            
+
             # Print response for debugging
             from src.utils.config import get_debug_mode
             if get_debug_mode():
                 print(f"\nAPI Response Status: {response.status_code}")
                 print(f"API Response: {response.text}\n")
-                
+
             response.raise_for_status()
-            
+
             # Updated response parsing
-            response_data = response.json()
-            return response_data['content'][0]['text']
-                
+            return self._extract_text(response.json())
+
         except Exception as e:
-            if 'response' in locals() and hasattr(response, 'text'):
+            raise api_error("Anthropic", e, response) from e
+
+    def _send_stream(self, image_bytes: bytes, prompt: str, media_type: str, fields: Optional[List[str]],
+                     max_tokens: int, on_text: Callable[[str], None]) -> Tuple[str, bool]:
+        response = None
+        try:
+            payload = self._build_payload(image_bytes, prompt, media_type, fields, max_tokens)
+            payload["stream"] = True
+
+            response = self.session.post(
+                self.api_url,
+                headers=self.headers,
+                json=payload,
+                timeout=self.timeout,
+                stream=True
+            )
+            from src.utils.config import get_debug_mode
+            if not response.ok and get_debug_mode():
                 print(f"API Response: {response.text}")
-            raise Exception(f"Anthropic API request failed: {str(e)}") 
\ No newline at end of file
+            response.raise_for_status()
+
+            chunks = []
+            input_usage = {}
+            output_tokens = 0
+            truncated = False
+            with response:
+                for event, data in iter_sse_events(response):
+                    event_type = data.get('type', event)
+                    if event_type == 'message_start':
+                        input_usage = data['message'].get('usage') or {}
+                    elif event_type == 'content_block_delta':
+                        # Text, or in structured output mode the tool call's JSON arguments
+                        delta = data['delta']
+                        text = delta.get('text') if delta.get('type') == 'text_delta' else delta.get('partial_json')
+                        if text:
+                            chunks.append(text)
+                            on_text(text)
+                    elif event_type == 'message_delta':
+                        output_tokens = (data.get('usage') or {}).get('output_tokens', output_tokens)
+                        truncated = (data.get('delta') or {}).get('stop_reason') == 'max_tokens'
+                    elif event_type == 'error':
+                        raise ValueError(f"Stream failed: {data.get('error')}")
+            self._record_response_usage(input_usage, output_tokens)
+            return ''.join(chunks), truncated
+
+        except Exception as e:
+            raise api_error("Anthropic", e, response) from e
+
+    # Message Batches API: requests run asynchronously within 24 hours at a discount
+
+    def build_batch_request(self, custom_id: str, image_bytes: bytes, prompt: str,
+                            media_type: str = "image/jpeg") -> dict:
+        return {
+            "custom_id": custom_id,
+            "params": self._build_payload(image_bytes, prompt, media_type, None, self.max_tokens)
+        }
+
+    def submit_batch(self, requests: List[dict]) -> str:
+        response = None
+        try:
+            response = self.session.post(f"{self.api_url}/batches", headers=self.headers,
+                                         json={"requests": requests}, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()['id']
+
+        except Exception as e:
+            raise api_error("Anthropic", e, response) from e
+
+    def get_batch_status(self, batch_id: str) -> Tuple[str, bool]:
+        response = None
+        try:
+            response = self.session.get(f"{self.api_url}/batches/{batch_id}",
+                                        headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            status = response.json()['processing_status']
+            return status, status == 'ended'
+
+        except Exception as e:
+            raise api_error("Anthropic", e, response) from e
+
+    def _batch_entry_result(self, entry: dict) -> Tuple[Optional[str], Optional[str]]:
+        result = entry['result']
+        if result['type'] == 'succeeded':
+            return self._extract_text(result['message'])[0], None
+        return None, str(result.get('error') or result['type'])
+
+    def get_batch_results(self, batch_id: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        response = None
+        try:
+            response = self.session.get(f"{self.api_url}/batches/{batch_id}",
+                                        headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            results_url = response.json().get('results_url')
+            if not results_url:
+                return {}
+
+            response = self.session.get(results_url, headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            return self._parse_batch_lines(response.text, self._batch_entry_result)
+
+        except Exception as e:
+            raise api_error("Anthropic", e, response) from e
@@ -1,13 +1,17 @@
 import base64
-import requests
-from .vision_adapter import VisionAdapter
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+from .vision_adapter import VisionAdapter, api_error, iter_sse_events, receipt_json_schema
 
 class OpenAIVisionAdapter(VisionAdapter):
-    def __init__(self, api_key: str):
+    vendor = "openai"
+
+    def __init__(self, api_key: str, model: Optional[str] = None):
         super().__init__(api_key)
-        self.api_url = "https://api.openai.com/v1/responses"
-        from src.utils.config import get_model
-        self.model = get_model('openai')
+        from src.utils.config import get_model, get_api_base
+        self.api_base = get_api_base('openai')
+        self.api_url = f"{self.api_base}/v1/responses"
+        self.model = model or get_model('openai')
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
@@ -17,38 +21,186 @@ class OpenAIVisionAdapter(VisionAdapter):
         if get_debug_mode():
             print(f"\n=== Using OpenAI Model: {self.model} ===\n")
 
-    def analyze_receipt(self, image_bytes: bytes, prompt: str) -> str:
-        try:
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-
-            payload = {
-                "model": self.model,
-                "instructions": "You are a helpful assistant that extracts structured data from images of receipts.",
-                "input": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "input_text", "text": prompt},
-                            {
-                                "type": "input_image",
-                                "image_url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        ]
-                    }
-                ],
-                "max_output_tokens": 1024
+    def _build_payload(self, image_bytes: bytes, prompt: str, media_type: str,
+                       fields: Optional[List[str]], max_tokens: int) -> dict:
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+
+        payload = {
+            "model": self.model,
+            "instructions": "You are a helpful assistant that extracts structured data from images of receipts.",
+            "input": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": prompt},
+                        {
+                            "type": "input_image",
+                            "image_url": f"data:{media_type};base64,{base64_image}"
+                        }
+                    ]
+                }
+            ],
+            "max_output_tokens": max_tokens,
+            # The instructions and prompt text come before the image, so they form a
+            # prefix shared by every receipt; the key keeps those requests on one cache
+            "prompt_cache_key": self.prompt_cache_key(prompt)
+        }
+        if self.structured_output:
+            payload["text"] = {
+                "format": {
+                    "type": "json_schema",
+                    "name": "receipt",
+                    "schema": receipt_json_schema(fields),
+                    "strict": True
+                }
             }
+        return payload
+
+    def _record_response_usage(self, usage: dict):
+        usage = usage or {}
+        self.record_usage(
+            input_tokens=usage.get('input_tokens', 0),
+            cached_input_tokens=(usage.get('input_tokens_details') or {}).get('cached_tokens', 0),
+            output_tokens=usage.get('output_tokens', 0)
+        )
+
+    @staticmethod
+    def _is_truncated(response_data: dict) -> bool:
+        return (response_data.get('status') == 'incomplete'
+                and (response_data.get('incomplete_details') or {}).get('reason') == 'max_output_tokens')
+
+    def _extract_text(self, response_data: dict) -> Tuple[str, bool]:
+        """Output text of a Responses API result, and whether it was truncated"""
+        self._record_response_usage(response_data.get('usage'))
+        output = response_data['output']
+        message = next(item for item in output if item['type'] == 'message')
+        return message['content'][0]['text'], self._is_truncated(response_data)
+
+    def _send(self, image_bytes: bytes, prompt: str, media_type: str,
+              fields: Optional[List[str]], max_tokens: int) -> Tuple[str, bool]:
+        response = None
+        try:
+            payload = self._build_payload(image_bytes, prompt, media_type, fields, max_tokens)
+
+            response = self.session.post(
+                self.api_url,
+                headers=self.headers,
+                json=payload,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+
+            return self._extract_text(response.json())
+
+        except Exception as e:
+            raise api_error("OpenAI", e, response) from e
 
-            response = requests.post(
+    def _send_stream(self, image_bytes: bytes, prompt: str, media_type: str, fields: Optional[List[str]],
+                     max_tokens: int, on_text: Callable[[str], None]) -> Tuple[str, bool]:
+        response = None
+        try:
+            payload = self._build_payload(image_bytes, prompt, media_type, fields, max_tokens)
+            payload["stream"] = True
+
+            response = self.session.post(
                 self.api_url,
                 headers=self.headers,
-                json=payload
+                json=payload,
+                timeout=self.timeout,
+                stream=True
+            )
+            response.raise_for_status()
+
+            chunks = []
+            truncated = False
+            with response:
+                for event, data in iter_sse_events(response):
+                    event_type = data.get('type', event)
+                    if event_type == 'response.output_text.delta':
+                        chunks.append(data['delta'])
+                        on_text(data['delta'])
+                    elif event_type in ('response.completed', 'response.incomplete'):
+                        self._record_response_usage(data['response'].get('usage'))
+                        truncated = self._is_truncated(data['response'])
+                    elif event_type in ('response.failed', 'error'):
+                        raise ValueError(f"Stream failed: {data}")
+            return ''.join(chunks), truncated
+
+        except Exception as e:
+            raise api_error("OpenAI", e, response) from e
+
+    # Batch API: requests are uploaded as a JSONL file and run within 24 hours at a discount
+
+    def build_batch_request(self, custom_id: str, image_bytes: bytes, prompt: str,
+                            media_type: str = "image/jpeg") -> dict:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/responses",
+            "body": self._build_payload(image_bytes, prompt, media_type, None, self.max_tokens)
+        }
+
+    def submit_batch(self, requests: List[dict]) -> str:
+        response = None
+        try:
+            jsonl = "\n".join(json.dumps(request) for request in requests) + "\n"
+            response = self.session.post(
+                f"{self.api_base}/v1/files",
+                headers={"Authorization": self.headers["Authorization"]},
+                data={"purpose": "batch"},
+                files={"file": ("receipts.jsonl", jsonl.encode('utf-8'), "application/jsonl")},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            input_file_id = response.json()['id']
+
+            response = self.session.post(
+                f"{self.api_base}/v1/batches",
+                headers=self.headers,
+                json={"input_file_id": input_file_id, "endpoint": "/v1/responses", "completion_window": "24h"},
+                timeout=self.timeout
             )
             response.raise_for_status()
+            return response.json()['id']
+
+        except Exception as e:
+            raise api_error("OpenAI", e, response) from e
+
+    def get_batch_status(self, batch_id: str) -> Tuple[str, bool]:
+        response = None
+        try:
+            response = self.session.get(f"{self.api_base}/v1/batches/{batch_id}",
+                                        headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            status = response.json()['status']
+            return status, status in ('completed', 'failed', 'expired', 'cancelled')
+
+        except Exception as e:
+            raise api_error("OpenAI", e, response) from e
+
+    def _batch_entry_result(self, entry: dict) -> Tuple[Optional[str], Optional[str]]:
+        body = (entry.get('response') or {}).get('body') or {}
+        if entry.get('error') or (entry.get('response') or {}).get('status_code') != 200:
+            return None, str(entry.get('error') or body.get('error'))
+        return self._extract_text(body)[0], None
+
+    def get_batch_results(self, batch_id: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        response = None
+        try:
+            response = self.session.get(f"{self.api_base}/v1/batches/{batch_id}",
+                                        headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+            batch = response.json()
 
-            output = response.json()['output']
-            message = next(item for item in output if item['type'] == 'message')
-            return message['content'][0]['text']
+            results = {}
+            for file_id in (batch.get('output_file_id'), batch.get('error_file_id')):
+                if not file_id:
+                    continue
+                response = self.session.get(f"{self.api_base}/v1/files/{file_id}/content",
+                                            headers=self.headers, timeout=self.timeout)
+                response.raise_for_status()
+                results.update(self._parse_batch_lines(response.text, self._batch_entry_result))
+            return results
 
         except Exception as e:
-            raise Exception(f"OpenAI API request failed: {str(e)}") 
\ No newline at end of file
+            raise api_error("OpenAI", e, response) from e
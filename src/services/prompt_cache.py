@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from src.utils.correction_store import (CompactionReport, CorrectionStore, compact_corrections,
+                                        has_correction, normalize_value, scoped_corrections, split_corrections)
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'prompts')
+TEMPLATE_PATH = os.path.join(PROMPTS_DIR, 'receipt_analysis.txt')
+CORRECTIONS_PATH = os.path.join(PROMPTS_DIR, 'corrections.txt')
+
+CORRECTION_PREAMBLE = '''
+            \n\nAfter determining the values for the fields, please apply the following corrections.  These are very important, and should be applied to all receipts exactly as written:
+            \n'''
+
+PARTIAL_INSTRUCTIONS = (
+    'Analyze this receipt image and extract only the fields listed below in JSON format, '
+    'using "not found" for any field you cannot extract. Return JSON only, no additional text '
+    'or markdown.'
+)
+
+FIELD_LINE = re.compile(r'^- (\w+):')
+FORMAT_LINE = re.compile(r'^\s*"(\w+)":\s*(.*?),?\s*$')
+
+class TemplateSections(NamedTuple):
+    """receipt_analysis.txt split up so a prompt can be built for a subset of fields"""
+    field_blocks: Dict[str, str]  # Field name -> its "- field: ..." description, in template order
+    format_values: Dict[str, str]  # Field name -> example value from the "Required format" object
+
+def split_template(template: str) -> TemplateSections:
+    """
+    Find the per-field description blocks and the required-format example in
+    the template. A block starts at a "- field:" line and runs until the next
+    one or a line that is neither indented nor blank.
+    """
+    field_blocks = {}
+    format_values = {}
+    current = None
+    in_format = False
+    for line in template.splitlines():
+        match = FIELD_LINE.match(line)
+        if match:
+            current = match.group(1)
+            field_blocks[current] = line
+            continue
+        if current and line[:1].isspace():
+            field_blocks[current] += '\n' + line
+            continue
+        current = None
+        if line.startswith('Required format'):
+            in_format = True
+        elif in_format:
+            match = FORMAT_LINE.match(line)
+            if match:
+                format_values[match.group(1)] = match.group(2)
+            elif line.strip() == '}':
+                in_format = False
+    return TemplateSections(field_blocks, format_values)
+
+class CompiledPrompt(str):
+    """
+    A fully built prompt. It is a str, so adapters send it as-is, and it
+    carries a stable SHA-256 of its text for provider cache keys, plus the
+    correction rules to apply locally to the parsed Receipt. Those rules are
+    not part of the text, so editing them doesn't invalidate cached responses.
+    A partial prompt also carries the locked values it was built around,
+    which are merged into the Receipt before the rules run.
+
+    A vendor-scoped prompt also records the hash and length of the same prompt
+    with every free-text correction. Results are cached on that hash, so a
+    response is found again whether or not the vendor was guessed.
+    """
+
+    def __new__(cls, text: str, rules: Optional[CorrectionStore] = None, known: Optional[Dict[str, str]] = None,
+                unscoped: Optional[str] = None):
+        prompt = super().__new__(cls, text)
+        prompt.hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        prompt.rules = rules if rules is not None else CorrectionStore()
+        prompt.known = dict(known or {})
+        if unscoped is None or unscoped == text:
+            prompt.unscoped_hash, prompt.unscoped_length = prompt.hash, len(text)
+        else:
+            prompt.unscoped_hash = hashlib.sha256(unscoped.encode('utf-8')).hexdigest()
+            prompt.unscoped_length = len(unscoped)
+        return prompt
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+def read_prompt_file(path: str) -> str:
+    """Contents of a prompt file, or "" if it doesn't exist"""
+    if not os.path.exists(path):
+        return ""
+    with open(path, 'r') as f:
+        return f.read()
+
+class PromptCache:
+    """
+    Builds the analysis prompt once and reuses it across calls and threads.
+
+    The compiled prompt is rebuilt only when receipt_analysis.txt or
+    corrections.txt change on disk (by mtime and size) or when corrections are
+    changed in memory. An edited corrections file replaces any in-memory
+    corrections, as reloading it by hand would.
+    """
+
+    def __init__(self, template_path: str = TEMPLATE_PATH, corrections_path: str = CORRECTIONS_PATH):
+        self.template_path = template_path
+        self.corrections_path = corrections_path
+        self._lock = threading.Lock()
+        self._template = None
+        self._template_stamp = None
+        self._corrections = ""
+        self._corrections_stamp = None
+        self._compiled: Optional[CompiledPrompt] = None
+        self._sections: Optional[TemplateSections] = None
+        self._adhoc: Optional[Tuple[str, CompiledPrompt]] = None  # Last prompt built for explicit corrections
+        self._scoped: "OrderedDict[Tuple[str, str], CompiledPrompt]" = OrderedDict()  # Recent vendor-scoped prompts
+        self._partial: "OrderedDict[tuple, CompiledPrompt]" = OrderedDict()  # Recent partial prompts
+
+    @staticmethod
+    def compile(template: str, corrections: str, vendor: Optional[str] = None,
+                known: Optional[Dict[str, str]] = None) -> CompiledPrompt:
+        """
+        Build the prompt from the template and corrections. Corrections in the
+        standard rule form are applied locally instead of being sent, so only
+        the free-text ones are appended to the prompt; with a vendor, only
+        those that could apply to it under any name vendor rules give it.
+        """
+        rules, free_text = split_corrections(corrections or "")
+        prompt_corrections = free_text
+        if vendor:
+            prompt_corrections = scoped_corrections(free_text).select(*rules.vendor_aliases(vendor))
+        prompt = template + (CORRECTION_PREAMBLE + prompt_corrections if prompt_corrections else '')
+        unscoped = template + (CORRECTION_PREAMBLE + free_text if free_text else '')
+        return CompiledPrompt(prompt, rules, known, unscoped)
+
+    def _refresh(self):
+        """Re-read whichever source file changed; caller holds the lock"""
+        template_stamp = _file_stamp(self.template_path)
+        if self._template is None or template_stamp != self._template_stamp:
+            self._template = read_prompt_file(self.template_path)
+            self._template_stamp = template_stamp
+            self._compiled = None
+            self._adhoc = None
+            self._sections = None
+            self._scoped.clear()
+            self._partial.clear()
+        corrections_stamp = _file_stamp(self.corrections_path)
+        if corrections_stamp != self._corrections_stamp:
+            self._corrections = read_prompt_file(self.corrections_path)
+            self._corrections_stamp = corrections_stamp
+            self._compiled = None
+
+    @property
+    def corrections(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._corrections
+
+    def reload(self) -> str:
+        """Re-read corrections.txt even if it hasn't changed, dropping in-memory corrections"""
+        with self._lock:
+            self._refresh()
+            self._corrections = read_prompt_file(self.corrections_path)
+            self._corrections_stamp = _file_stamp(self.corrections_path)
+            self._compiled = None
+            return self._corrections
+
+    def set_corrections(self, corrections: str):
+        """Replace the in-memory corrections"""
+        with self._lock:
+            self._refresh()
+            self._corrections = corrections
+            self._compiled = None
+
+    def add_correction(self, correction: str) -> bool:
+        """Append a correction in memory unless it is already there; returns whether it was added"""
+        with self._lock:
+            self._refresh()
+            if has_correction(self._corrections, correction):
+                return False
+            self._corrections += "\n" + correction
+            self._compiled = None
+            return True
+
+    def save_correction(self, correction: str) -> bool:
+        """
+        Append a correction to corrections.txt unless the file already has it;
+        the next prompt picks it up. Returns whether it was added.
+        """
+        with self._lock:
+            if has_correction(read_prompt_file(self.corrections_path), correction):
+                return False
+            os.makedirs(os.path.dirname(self.corrections_path), exist_ok=True)
+            with open(self.corrections_path, 'a') as f:
+                f.write(correction + '\n')
+            self._refresh()
+            return True
+
+    def compact(self) -> CompactionReport:
+        """
+        Rewrite corrections.txt with duplicates removed, chains merged and
+        conflicts noted (see compact_corrections). The new file replaces the
+        old one atomically; the old one is kept as corrections.txt.bak.
+        """
+        with self._lock:
+            corrections = read_prompt_file(self.corrections_path)
+            compacted, report = compact_corrections(corrections)
+            if compacted != corrections:
+                os.makedirs(os.path.dirname(self.corrections_path), exist_ok=True)
+                temp_path = self.corrections_path + '.tmp'
+                with open(temp_path, 'w') as f:
+                    f.write(compacted)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if os.path.exists(self.corrections_path):
+                    shutil.copyfile(self.corrections_path, self.corrections_path + '.bak')
+                os.replace(temp_path, self.corrections_path)
+            self._refresh()
+            return report
+
+    def vendor_scoped(self, corrections: Optional[str] = None) -> bool:
+        """Whether any free-text correction is conditioned on a vendor, so a vendor guess would shrink the prompt"""
+        if corrections is None:
+            corrections = self.corrections
+        return scoped_corrections(split_corrections(corrections)[1]).scoped
+
+    def get(self, corrections: Optional[str] = None, vendor: Optional[str] = None) -> CompiledPrompt:
+        """
+        The compiled prompt, using the current corrections unless others are
+        given. With a vendor, free-text corrections conditioned on other vendors
+        are left out; when that removes nothing the unscoped prompt (and so its
+        cache keys) is reused.
+        """
+        with self._lock:
+            self._refresh()
+            if corrections is None or corrections == self._corrections:
+                if self._compiled is None:
+                    self._compiled = self.compile(self._template, self._corrections)
+                corrections, prompt = self._corrections, self._compiled
+            else:
+                if self._adhoc is None or self._adhoc[0] != corrections:
+                    self._adhoc = (corrections, self.compile(self._template, corrections))
+                prompt = self._adhoc[1]
+            if not vendor or not scoped_corrections(split_corrections(corrections)[1]).scoped:
+                return prompt
+
+            key = (corrections, normalize_value(vendor))
+            scoped = self._scoped.get(key)
+            if scoped is None:
+                scoped = self.compile(self._template, corrections, vendor)
+                if scoped == prompt:
+                    scoped = prompt
+                self._scoped[key] = scoped
+                if len(self._scoped) > 64:
+                    self._scoped.popitem(last=False)
+            else:
+                self._scoped.move_to_end(key)
+            return scoped
+
+    @property
+    def fields(self) -> List[str]:
+        """Fields the template describes, in template order"""
+        with self._lock:
+            self._refresh()
+            return list(self._template_sections().field_blocks)
+
+    def _template_sections(self) -> TemplateSections:
+        """Parsed template, cached until it changes on disk; caller holds the lock"""
+        if self._sections is None:
+            self._sections = split_template(self._template)
+        return self._sections
+
+    def get_partial(self, fields: List[str], known: Dict[str, str],
+                    corrections: Optional[str] = None, vendor: Optional[str] = None) -> CompiledPrompt:
+        """
+        A prompt asking for only the given fields. The known (locked) values are
+        included as context but not requested, and only the requested fields'
+        descriptions and format example are kept from the template. Corrections
+        are scoped to the vendor given or known. Built once per fields, known
+        values, corrections and vendor.
+        """
+        vendor = vendor or known.get('vendor')
+        with self._lock:
+            self._refresh()
+            sections = self._template_sections()
+            corrections = self._corrections if corrections is None else corrections
+            key = (tuple(fields), tuple(known.items()), corrections, normalize_value(vendor) if vendor else None)
+            prompt = self._partial.get(key)
+            if prompt is not None:
+                self._partial.move_to_end(key)
+                return prompt
+
+        parts = [PARTIAL_INSTRUCTIONS]
+        if known:
+            parts.append(
+                "These fields have already been confirmed for this receipt. Use them as context, "
+                "but do not include them in your answer:\n"
+                + "\n".join(f"- {field}: {json.dumps(value)}" for field, value in known.items())
+            )
+        parts.append("Fields to identify:\n" + "\n".join(
+            sections.field_blocks.get(field, f"- {field}") for field in fields
+        ))
+        example = ",\n".join(
+            f'    "{field}": {sections.format_values.get(field, json.dumps("not found"))}' for field in fields
+        )
+        parts.append(f"Required format:\n{{\n{example}\n}}")
+        prompt = self.compile("\n\n".join(parts), corrections, vendor, known)
+        with self._lock:
+            self._partial[key] = prompt
+            if len(self._partial) > 64:
+                self._partial.popitem(last=False)
+        return prompt
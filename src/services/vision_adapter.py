@@ -1,7 +1,15 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Optional
+import asyncio
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import hashlib
 import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from src.utils.json_stream import IncrementalJSONFieldParser, extract_json_object
 
 @dataclass
 class Receipt:
@@ -17,36 +25,312 @@ class Receipt:
     expense_type: Optional[str] = None
     upper_right: Optional[str] = None
 
+# Fields the model is asked for: those receipt_analysis.txt describes. upper_right stays
+# on Receipt for the eval output, but no prompt asks for it
+RECEIPT_SCHEMA_FIELDS = [f.name for f in dataclass_fields(Receipt) if f.name != 'upper_right']
+
+def receipt_json_schema(fields: Optional[List[str]] = None) -> dict:
+    """JSON schema for a Receipt (or just the given fields), every value a string"""
+    fields = fields or RECEIPT_SCHEMA_FIELDS
+    return {
+        "type": "object",
+        "properties": {field: {"type": "string"} for field in fields},
+        "required": list(fields),
+        "additionalProperties": False
+    }
+
+class VisionAPIError(Exception):
+    """A failed vision API request, carrying what the retry logic needs"""
+    RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from Retry-After (seconds or HTTP date) or retry-after-ms headers"""
+    if headers is None:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+def api_error(vendor_label: str, error: Exception, response=None) -> VisionAPIError:
+    """Wrap an adapter failure, deciding whether it is worth retrying"""
+    status_code = response.status_code if response is not None else None
+    if isinstance(error, requests.HTTPError):
+        retryable = status_code in VisionAPIError.RETRYABLE_STATUS
+    else:
+        # Dropped connections and timeouts are transient; malformed responses are not
+        retryable = isinstance(error, (requests.ConnectionError, requests.Timeout))
+    return VisionAPIError(
+        f"{vendor_label} API request failed: {str(error)}",
+        status_code=status_code,
+        retry_after=parse_retry_after(response.headers) if response is not None else None,
+        retryable=retryable
+    )
+
+def iter_sse_events(response) -> Iterator[Tuple[Optional[str], dict]]:
+    """Yield (event name, JSON data) for each server-sent event in a streaming response"""
+    event = None
+    data_lines = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == '':
+            # A blank line ends the event
+            if data_lines:
+                data = '\n'.join(data_lines)
+                if data != '[DONE]':
+                    yield event, json.loads(data)
+            event = None
+            data_lines = []
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data_lines.append(line[5:].lstrip())
+    if data_lines and data_lines != ['[DONE]']:
+        yield event, json.loads('\n'.join(data_lines))
+
+def create_session(pool_size: int) -> requests.Session:
+    """Create a keep-alive session whose connection pool can serve pool_size concurrent requests"""
+    session = requests.Session()
+    http_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', http_adapter)
+    session.mount('http://', http_adapter)
+    return session
+
 class VisionAdapter(ABC):
+    vendor = None  # Set by concrete adapters, e.g. 'openai'
+    max_tokens = 1024
+
     def __init__(self, api_key: str):
         self.api_key = api_key
+        
+        # Pooled keep-alive connections, so each receipt doesn't pay a fresh TCP + TLS handshake
+        from src.utils.config import get_http_settings
+        http_settings = get_http_settings()
+        self.session = create_session(http_settings['pool_size'])
+        self.timeout = (http_settings['connect_timeout'], http_settings['read_timeout'])
+        
+        # Output budget, and whether to constrain output to the Receipt JSON schema
+        from src.utils.config import get_output_settings
+        output_settings = get_output_settings()
+        self.max_tokens = output_settings['max_tokens']
+        self.structured_output = output_settings['structured_output']
+        
+        # Token usage across requests, including how much of the prompt was served from the provider's cache
+        self._usage_lock = threading.Lock()
+        self.usage = {'requests': 0, 'input_tokens': 0, 'cached_input_tokens': 0,
+                      'cache_write_tokens': 0, 'output_tokens': 0}
+
+    def record_usage(self, input_tokens: int = 0, cached_input_tokens: int = 0,
+                     cache_write_tokens: int = 0, output_tokens: int = 0):
+        """Add one response's token counts to the running totals (input_tokens includes cached ones)"""
+        with self._usage_lock:
+            self.usage['requests'] += 1
+            self.usage['input_tokens'] += input_tokens
+            self.usage['cached_input_tokens'] += cached_input_tokens
+            self.usage['cache_write_tokens'] += cache_write_tokens
+            self.usage['output_tokens'] += output_tokens
+        from src.utils.config import get_debug_mode
+        if get_debug_mode():
+            print(f"Tokens: {input_tokens} in ({cached_input_tokens} cached, {cache_write_tokens} written to cache), "
+                  f"{output_tokens} out")
+
+    def usage_summary(self) -> str:
+        """Human-readable token totals and prompt cache hit rate"""
+        with self._usage_lock:
+            usage = dict(self.usage)
+        cached_share = usage['cached_input_tokens'] / usage['input_tokens'] if usage['input_tokens'] else 0.0
+        return (f"{usage['requests']} requests, {usage['input_tokens']} input tokens "
+                f"({cached_share:.0%} from prompt cache), {usage['output_tokens']} output tokens")
+
+    def usage_cost(self, usage: Optional[dict] = None) -> Optional[float]:
+        """
+        USD cost of the given token counts (default: this adapter's totals) at the
+        model's model_prices entry in config.json, or None if it has no price.
+        Cache writes are charged at the input price.
+        """
+        from src.utils.config import get_model_prices
+        prices = get_model_prices().get(self.model)
+        if not prices:
+            return None
+        if usage is None:
+            with self._usage_lock:
+                usage = dict(self.usage)
+        input_price = float(prices.get('input', 0))
+        cached_price = float(prices.get('cached_input', input_price))
+        uncached = usage['input_tokens'] - usage['cached_input_tokens']
+        return (uncached * input_price
+                + usage['cached_input_tokens'] * cached_price
+                + usage['output_tokens'] * float(prices.get('output', 0))) / 1_000_000
+
+    @staticmethod
+    def prompt_cache_key(prompt: str) -> str:
+        """Stable identifier for a prompt, so requests sharing it are routed to the same provider cache"""
+        prompt_hash = getattr(prompt, 'hash', None) or hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return "receipt-" + prompt_hash[:32]
 
     @abstractmethod
-    def analyze_receipt(self, image_bytes: bytes, prompt: str) -> str:
+    def _send(self, image_bytes: bytes, prompt: str, media_type: str,
+              fields: Optional[List[str]], max_tokens: int) -> Tuple[str, bool]:
+        """
+        Make one request to the vendor API
+        Args:
+            image_bytes: Raw image bytes
+            prompt: Analysis prompt/instructions
+            media_type: MIME type of the encoded image
+            fields: Receipt fields to request (None for all)
+            max_tokens: Output token budget
+        Returns:
+            (response text, whether it was cut off at max_tokens)
+        """
+        pass
+
+    def _send_stream(self, image_bytes: bytes, prompt: str, media_type: str, fields: Optional[List[str]],
+                     max_tokens: int, on_text: Callable[[str], None]) -> Tuple[str, bool]:
+        """Streaming counterpart of _send; adapters without streaming deliver the whole text at once"""
+        text, truncated = self._send(image_bytes, prompt, media_type, fields, max_tokens)
+        on_text(text)
+        return text, truncated
+
+    def analyze_receipt(self, image_bytes: bytes, prompt: str, media_type: str = "image/jpeg",
+                        fields: Optional[List[str]] = None, max_tokens: Optional[int] = None) -> str:
         """
         Analyze receipt image using the vision API
         Args:
             image_bytes: Raw image bytes
             prompt: Analysis prompt/instructions
+            media_type: MIME type of the encoded image
+            fields: Receipt fields to request (None for all)
+            max_tokens: Output token budget (defaults to the adapter's max_tokens)
         Returns:
             Raw JSON response string from the vision API
         """
-        pass
+        max_tokens = max_tokens or self.max_tokens
+        text, truncated = self._send(image_bytes, prompt, media_type, fields, max_tokens)
+        if truncated:
+            text = self._continue_truncated(image_bytes, prompt, media_type, fields, max_tokens, text)
+        return text
+
+    def analyze_receipt_stream(self, image_bytes: bytes, prompt: str, on_text: Callable[[str], None],
+                               media_type: str = "image/jpeg", fields: Optional[List[str]] = None,
+                               max_tokens: Optional[int] = None) -> str:
+        """
+        Like analyze_receipt, but streams the response, calling on_text with
+        each chunk of text as it arrives. Returns the full response text; if it
+        had to be completed by a continuation request, that part isn't streamed.
+        """
+        max_tokens = max_tokens or self.max_tokens
+        text, truncated = self._send_stream(image_bytes, prompt, media_type, fields, max_tokens, on_text)
+        if truncated:
+            text = self._continue_truncated(image_bytes, prompt, media_type, fields, max_tokens, text)
+        return text
+
+    def _continue_truncated(self, image_bytes: bytes, prompt: str, media_type: str,
+                            fields: Optional[List[str]], max_tokens: int, partial: str) -> str:
+        """
+        Complete a response cut off at max_tokens: keep the fields that finished,
+        and ask again for only the missing ones with twice the budget.
+        """
+        completed = dict(IncrementalJSONFieldParser().feed(partial))
+        missing = [field for field in (fields or RECEIPT_SCHEMA_FIELDS) if field not in completed]
+        print(f"Response truncated at {max_tokens} tokens; requesting {len(missing)} remaining field(s)")
+        if missing:
+            continuation_prompt = (
+                f"{prompt}\n\nA previous answer was cut off. These fields were already extracted:\n"
+                f"{json.dumps(completed)}\n"
+                f"Return JSON with only these remaining fields: {', '.join(missing)}"
+            )
+            text, _ = self._send(image_bytes, continuation_prompt, media_type, missing, max_tokens * 2)
+            try:
+                completed.update(extract_json_object(text))
+            except ValueError:
+                completed.update(IncrementalJSONFieldParser().feed(text))
+        return json.dumps(completed)
+
+    # Asynchronous batch APIs (cheaper, for bulk work that doesn't need an answer right away)
+
+    def build_batch_request(self, custom_id: str, image_bytes: bytes, prompt: str,
+                            media_type: str = "image/jpeg") -> dict:
+        """One entry for submit_batch, identified by custom_id in the results"""
+        raise NotImplementedError(f"{self.vendor} adapter does not support batch jobs")
+
+    def submit_batch(self, requests: List[dict]) -> str:
+        """Submit a batch job of build_batch_request entries, returning the vendor's batch ID"""
+        raise NotImplementedError(f"{self.vendor} adapter does not support batch jobs")
+
+    def get_batch_status(self, batch_id: str) -> Tuple[str, bool]:
+        """The vendor's status string for a batch job, and whether it has finished"""
+        raise NotImplementedError(f"{self.vendor} adapter does not support batch jobs")
+
+    def get_batch_results(self, batch_id: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """Map custom_id -> (response text, None) or (None, error) for a finished batch job"""
+        raise NotImplementedError(f"{self.vendor} adapter does not support batch jobs")
+
+    @staticmethod
+    def _parse_batch_lines(text: str, parse_entry: Callable[[dict], Tuple[Optional[str], Optional[str]]]
+                           ) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        Map custom_id -> parse_entry(entry) for each line of a JSONL results
+        file. An entry that can't be parsed becomes that request's error; a line
+        with no readable custom_id is skipped, leaving its request without a result.
+        """
+        results = {}
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                custom_id = entry['custom_id']
+            except (ValueError, TypeError, KeyError) as e:
+                print(f"Warning: skipping unreadable batch result line {number}: {e!r}")
+                continue
+            try:
+                results[custom_id] = parse_entry(entry)
+            except Exception as e:
+                results[custom_id] = (None, f"malformed batch result: {e!r}")
+        return results
+
+    async def analyze_receipt_async(self, image_bytes: bytes, prompt: str, media_type: str = "image/jpeg",
+                                    estimated_tokens: int = 0, fields: Optional[List[str]] = None) -> str:
+        """
+        Async counterpart of analyze_receipt, held to the vendor's concurrency
+        and requests/tokens-per-minute limits. The pooled blocking request runs
+        in the event loop's default executor.
+        """
+        from src.utils.rate_limiter import get_vendor_limiter
+        async with get_vendor_limiter(self.vendor).limit_async(estimated_tokens):
+            return await asyncio.to_thread(self.analyze_receipt, image_bytes, prompt, media_type, fields)
+
+    def estimate_request_tokens(self, prompt: str, image_tokens: int = 0, max_tokens: Optional[int] = None) -> int:
+        """Rough token cost of one request for rate limiting: prompt (~4 chars/token) + image + output budget"""
+        return len(prompt) // 4 + image_tokens + (max_tokens or self.max_tokens)
 
     def parse_response(self, response: str) -> Receipt:
         """
         Parse the API response into a Receipt object
         Can be overridden by concrete adapters if needed
         """
-        # Clean up markdown code blocks if present
-        if response.startswith('```'):
-            response = response.split('```')[1]
-            if response.startswith('json'):
-                response = response[4:]
-            response = response.strip()
-        
-        # Parse JSON into Receipt object
-        data = json.loads(response)
+        # Tolerates code fences, preamble and trailing commentary around the JSON
+        data = extract_json_object(response)
         return Receipt(
             vendor=data.get('vendor', 'not found'),
             invoice=data.get('invoice', 'not found'),
@@ -1,15 +1,29 @@
 # src/services/vision_service.py
 
-import base64
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional, List
-import requests
+import asyncio
+import math
+from dataclasses import dataclass, fields as dataclass_fields, replace
+from typing import Any, Callable, Dict, Optional, List, Tuple, Union
 import json
-import os
-from .vision_adapter import Receipt
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import CancelledError, FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from .vision_adapter import RECEIPT_SCHEMA_FIELDS, Receipt, VisionAPIError
 from .openai_adapter import OpenAIVisionAdapter
 from .anthropic_adapter import AnthropicVisionAdapter
+from .prompt_cache import CompiledPrompt, PromptCache
+from src.utils.correction_formatter import CorrectionFormatter
+from src.utils.correction_store import CompactionReport, CorrectionStore, corrections_version, split_corrections
+from src.utils.image_encoder import EncodedImage, encode_image
+from src.utils.image_hash import dhash
+from src.utils.json_stream import IncrementalJSONFieldParser
+from src.utils.rate_limiter import get_vendor_limiter
+from src.utils.receipt_validation import validation_issues
+from src.utils.result_cache import ResultCache, get_result_cache
+
+_UNOPENED = object()  # VisionAPIService.result_cache before first use
 
 @dataclass
 class ReceiptItem:
@@ -49,35 +63,101 @@ class VisionAPIService:
         # Initialize the appropriate adapter based on vendor
         self.adapter = self._create_adapter()
         
-        # Initialize corrections
-        self.corrections = ""
-        self.corrections = self._load_corrections()
+        # Retry/backoff settings, and an optional second vendor to hedge slow requests with
+        from src.utils.config import get_retry_settings, get_hedge_settings
+        self.retry_settings = get_retry_settings()
+        self.hedge_settings = get_hedge_settings(self.vendor)
+        self.hedge_adapter = None
+        if self.hedge_settings['enabled']:
+            self.hedge_adapter = self._create_hedge_adapter(self.hedge_settings['vendor'])
+        self.latencies = deque(maxlen=200)  # Recent primary latencies, for the hedge deadline
+        self.hedge_stats = {'fired': 0, 'won': 0}
+        self._stats_lock = threading.Lock()  # Stats are updated from worker threads, hedge threads and asyncio tasks
+        self._hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge") if self.hedge_adapter else None
+        
+        # Optional fast first-pass model; the main model only sees receipts whose fast result fails validation
+        from src.utils.config import get_cascade_settings
+        self.cascade_settings = get_cascade_settings(self.vendor)
+        self.cascade_adapter = None
+        if self.cascade_settings['enabled'] and self.cascade_settings['model'] != self.adapter.model:
+            self.cascade_adapter = self._create_adapter(model=self.cascade_settings['model'])
+        self.cascade_stats = {'accepted': 0, 'escalated': 0}
+        
+        # Responses already paid for; opened on first use (see result_cache)
+        self._result_cache = _UNOPENED
+        
+        # Per-vendor image encoding budget (long edge, bytes, format, quality)
+        from src.utils.config import get_image_encoding
+        self.image_encoding = get_image_encoding(self.vendor)
+        
+        # Compiled prompt, rebuilt only when the template or corrections change
+        self.prompt_cache = PromptCache()
+        self.reload_corrections()
+        
+        # Vendor guess from the image, so prompts carry only that vendor's free-text corrections
+        from src.utils.config import get_scope_corrections, get_duplicate_check_settings
+        from src.utils.duplicate_index import get_duplicate_index
+        from src.utils.vendor_guess import VendorGuesser
+        self.vendor_guesser = None
+        if get_scope_corrections():
+            self.vendor_guesser = VendorGuesser(get_duplicate_index(),
+                                                get_duplicate_check_settings()['max_distance'])
+        self.prompt_sizes = {'full': Counter(), 'sent': Counter()}  # Estimated prompt tokens, bucketed
         
-    def _create_adapter(self):
-        """Create the appropriate adapter based on vendor"""
-        if self.vendor.lower() == "anthropic":
-            return AnthropicVisionAdapter(self.api_key)
-        elif self.vendor.lower() == "openai":
-            return OpenAIVisionAdapter(self.api_key)
-        elif self.vendor.lower() == "gemini":
+    def _create_adapter(self, vendor: str = None, api_key: str = None, model: str = None):
+        """Create the appropriate adapter based on vendor (with its configured model unless one is given)"""
+        vendor = vendor or self.vendor
+        api_key = api_key or self.api_key
+        if vendor.lower() == "anthropic":
+            return AnthropicVisionAdapter(api_key, model)
+        elif vendor.lower() == "openai":
+            return OpenAIVisionAdapter(api_key, model)
+        elif vendor.lower() == "gemini":
             raise NotImplementedError("Gemini adapter not yet implemented")
         else:
-            raise ValueError(f"Unsupported vendor: {self.vendor}")
+            raise ValueError(f"Unsupported vendor: {vendor}")
 
-    def _load_corrections(self) -> str:
-        """Load corrections from corrections.txt as raw text"""
-        corrections_path = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'corrections.txt')
-        corrections = ""
-        
+    def _create_hedge_adapter(self, vendor: str):
+        """Create the adapter used to hedge slow requests, or None if it isn't configured"""
+        from src.utils.config import get_api_key
+        api_key = get_api_key(vendor) if vendor else None
+        if not api_key or vendor == self.vendor.lower():
+            print(f"Warning: hedging disabled, no second vendor with an API key (hedge_vendor: {vendor})")
+            return None
+        return self._create_adapter(vendor, api_key)
+
+    @property
+    def corrections(self) -> str:
+        return self.prompt_cache.corrections
+
+    @corrections.setter
+    def corrections(self, corrections: str):
+        self.prompt_cache.set_corrections(corrections)
+
+    @property
+    def result_cache(self) -> Optional[ResultCache]:
+        """
+        Responses already paid for, keyed on image + prompt + vendor + model
+        (None if disabled). Opened on first use, so constructing a service
+        creates no cache directory.
+        """
+        if self._result_cache is _UNOPENED:
+            self._result_cache = get_result_cache()
+        return self._result_cache
+
+    @result_cache.setter
+    def result_cache(self, cache: Optional[ResultCache]):
+        self._result_cache = cache
+
+    def reload_corrections(self) -> str:
+        """Re-read corrections.txt, replacing any corrections changed in memory, and return them"""
         try:
-            if os.path.exists(corrections_path):
-                with open(corrections_path, 'r') as f:
-                    corrections = f.read()
+            corrections = self.prompt_cache.reload()
                     
             # Print corrections if debug mode is enabled
             from src.utils.config import get_debug_mode
             if get_debug_mode():
-                print("\n=== LOADED CORRECTIONS ===")
+                print(f"\n=== LOADED CORRECTIONS (version {corrections_version(corrections)}) ===")
                 print(corrections)
                 print("=========================\n")
                     
@@ -86,50 +166,591 @@ class VisionAPIService:
             print(f"Warning: Failed to load corrections: {e}")
             return ""
 
-    def _build_prompt(self, previous_corrections: Optional[str] = None) -> str:
-        """Build the prompt for receipt analysis"""
-        prompt_path = os.path.join(os.path.dirname(__file__), '..', 'prompts', 'receipt_analysis.txt')
-        with open(prompt_path, 'r') as f:
-            prompt = f.read()
-
-        if previous_corrections:
-            correction_preamble = '''
-            \n\nAfter determining the values for the fields, please apply the following corrections.  These are very important, and should be applied to all receipts exactly as written:
-            \n'''
-            prompt += correction_preamble + previous_corrections
-            
-        return prompt
+    def _build_prompt(self, previous_corrections: Optional[str] = None, vendor: Optional[str] = None) -> CompiledPrompt:
+        """Build the prompt for receipt analysis (cached until the template or corrections change)"""
+        return self.prompt_cache.get(previous_corrections, vendor)
+
+    @staticmethod
+    def image_hash(encoded: EncodedImage) -> Optional[int]:
+        """
+        Perceptual hash of the encoded image, computed once. Every ingest path
+        indexes receipts by this hash of the image it uploaded, so duplicates
+        and vendor guesses match across the GUI, batch and watch-folder paths.
+        """
+        if encoded.phash is None:
+            try:
+                encoded.phash = dhash(encoded.data)
+            except ValueError:
+                return None
+        return encoded.phash
+
+    def _vendor_hint(self, encoded: EncodedImage, previous_corrections: Optional[str],
+                     locked: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """The receipt's vendor if it is locked or can be guessed cheaply; None when no correction depends on it"""
+        if self.vendor_guesser is None or not self.prompt_cache.vendor_scoped(previous_corrections):
+            return None
+        if locked and locked.get('vendor'):
+            return locked['vendor']
+        vendor, source = self.vendor_guesser.guess(self.image_hash(encoded))
+        from src.utils.config import get_debug_mode
+        if get_debug_mode():
+            print(f"Vendor guess: {vendor} ({source})" if vendor else "Vendor guess: none, sending all corrections")
+        return vendor
+
+    def _remember_vendor(self, encoded: EncodedImage, receipt: Receipt):
+        """Let later captures of this image scope their corrections to the vendor just read"""
+        if self.vendor_guesser is not None and self.prompt_cache.vendor_scoped():
+            self.vendor_guesser.remember(self.image_hash(encoded), receipt.vendor)
+
+    def _record_prompt_size(self, prompt: CompiledPrompt):
+        """Count a prompt in the size histogram, next to the unscoped prompt it replaced"""
+        bucket = 100  # Estimated tokens per histogram bin
+        with self._stats_lock:
+            self.prompt_sizes['full'][prompt.unscoped_length // 4 // bucket * bucket] += 1
+            self.prompt_sizes['sent'][len(prompt) // 4 // bucket * bucket] += 1
+
+    def prompt_size_histogram(self) -> str:
+        """Text histogram of estimated prompt tokens, without and with vendor-scoped corrections"""
+        with self._stats_lock:
+            full, sent = Counter(self.prompt_sizes['full']), Counter(self.prompt_sizes['sent'])
+        if not sent:
+            return "No prompts built"
+        lines = ["Prompt tokens   all corrections   vendor-scoped"]
+        for bucket in sorted(set(full) | set(sent)):
+            lines.append(f"{bucket:>5}-{bucket + 99:<5}   {full[bucket]:>6} {'#' * min(full[bucket], 20):<20}"
+                         f"{sent[bucket]:>6} {'#' * min(sent[bucket], 20)}")
+        mean_full = sum(bucket * count for bucket, count in full.items()) / sum(full.values())
+        mean_sent = sum(bucket * count for bucket, count in sent.items()) / sum(sent.values())
+        lines.append(f"Mean: ~{mean_full:.0f} -> ~{mean_sent:.0f} tokens")
+        return "\n".join(lines)
+
+    def encode_image(self, image, overrides: Optional[dict] = None) -> EncodedImage:
+        """Encode an image array or encoded bytes within this vendor's size budget"""
+        settings = {**self.image_encoding, **(overrides or {})}
+        return encode_image(image, self.vendor, settings)
+
+    def _unlocked_fields(self, locked: Dict[str, str]) -> List[str]:
+        """Fields still to be extracted when the operator has locked some"""
+        return [field for field in (self.prompt_cache.fields or RECEIPT_SCHEMA_FIELDS) if field not in locked]
+
+    def _partial_max_tokens(self, adapter, fields: List[str]) -> int:
+        """Output token budget scaled to the share of fields requested"""
+        total = len(self.prompt_cache.fields or RECEIPT_SCHEMA_FIELDS)
+        return max(64, math.ceil(adapter.max_tokens * len(fields) / total))
+
+    @staticmethod
+    def _merge_locked(receipt: Receipt, locked: Dict[str, str]) -> Receipt:
+        """Receipt with the locked values filled back in"""
+        return replace(receipt, **{field: value for field, value in locked.items() if hasattr(receipt, field)})
+
+    def _prepare_request(self, image_bytes: Union[bytes, EncodedImage], previous_corrections: Optional[str] = None,
+                         fields: Optional[List[str]] = None, locked: Optional[Dict[str, str]] = None):
+        """
+        Encode the image and build the prompt, returning (encoded image, prompt).
+        If fields is given, the prompt asks for only those, with locked values as context.
+        """
+        # Re-encode raw bytes to the vendor's budget unless already done by the caller
+        encoded = image_bytes if isinstance(image_bytes, EncodedImage) else self.encode_image(image_bytes)
+        
+        # Get the prompt for receipt analysis (stored corrections if none provided),
+        # with only the free-text corrections that can apply to the guessed vendor
+        vendor = self._vendor_hint(encoded, previous_corrections, locked)
+        if fields:
+            prompt = self.prompt_cache.get_partial(fields, locked or {}, previous_corrections, vendor)
+        else:
+            prompt = self._build_prompt(previous_corrections, vendor)
+        self._record_prompt_size(prompt)
+        
+        # Print prompt in debug mode
+        from src.utils.config import get_debug_mode
+        if get_debug_mode():
+            print("\n=== PROMPT ===")
+            print(prompt)
+            print("=============\n")
+            print(f"Image: {encoded.summary()}")
+        
+        return encoded, prompt
+
+    def _retry_delay(self, attempt: int, error: VisionAPIError) -> float:
+        """Full-jitter exponential backoff, or the server's Retry-After when it sent one"""
+        base_delay = self.retry_settings['base_delay']
+        if error.retry_after is not None:
+            return error.retry_after + random.uniform(0, base_delay)
+        return random.uniform(0, min(self.retry_settings['max_delay'], base_delay * 2 ** attempt))
+
+    def _parse(self, adapter, result: str, rules: CorrectionStore, known: Optional[Dict[str, str]] = None) -> Receipt:
+        """
+        Parse a raw response, fill in the known (locked) values and apply local
+        correction rules (normally the prompt's), so vendor rules see a locked vendor
+        """
+        receipt = adapter.parse_response(result)
+        if known:
+            receipt = self._merge_locked(receipt, known)
+        receipt, applied = rules.apply(receipt, known or ())
+        if applied:
+            from src.utils.config import get_debug_mode
+            if get_debug_mode():
+                for rule in applied:
+                    print(f"Applied correction: {rule.field} {rule.original_value!r} -> {rule.corrected_value!r}")
+        return receipt
+
+    def _cache_key(self, adapter, encoded: EncodedImage, prompt: CompiledPrompt) -> str:
+        return self.result_cache.make_key(encoded.data, prompt.unscoped_hash, adapter.vendor, adapter.model)
+
+    def _cached_receipt(self, adapter, encoded: EncodedImage, prompt: CompiledPrompt,
+                        first_pass: bool = False) -> Optional[Receipt]:
+        """Receipt from a previously cached response for this exact request, if any"""
+        if self.result_cache is None:
+            return None
+        result = self.result_cache.get(self._cache_key(adapter, encoded, prompt))
+        if result is None:
+            return None
+        try:
+            receipt = self._parse(adapter, result, prompt.rules, prompt.known)
+        except ValueError:
+            return None
+        if not first_pass:
+            self._remember_vendor(encoded, receipt)
+        return receipt
+
+    def _store_cached(self, adapter, encoded: EncodedImage, prompt: CompiledPrompt, result: str):
+        """Cache a response that parsed into a Receipt"""
+        if self.result_cache is None:
+            return
+        try:
+            self.result_cache.put(self._cache_key(adapter, encoded, prompt), result, adapter.vendor, adapter.model)
+        except OSError as e:
+            print(f"Warning: could not write result cache: {e}")
+
+    def _accept_response(self, adapter, encoded: EncodedImage, prompt: CompiledPrompt, result: str,
+                         first_pass: bool = False) -> Receipt:
+        """
+        Parse a new response, cache it and remember the vendor it read. A
+        cascade first pass is cached only if it passes validation, and its
+        vendor is remembered by _check_first_pass once it is accepted.
+        """
+        receipt = self._parse(adapter, result, prompt.rules, prompt.known)
+        if not first_pass:
+            self._remember_vendor(encoded, receipt)
+            self._store_cached(adapter, encoded, prompt, result)
+        elif not validation_issues(receipt, self.cascade_settings['max_not_found']):
+            self._store_cached(adapter, encoded, prompt, result)
+        return receipt
+
+    def _call_adapter(self, adapter, encoded: EncodedImage, prompt: CompiledPrompt,
+                      fields: Optional[List[str]] = None, max_tokens: Optional[int] = None,
+                      first_pass: bool = False, cancelled: Optional[threading.Event] = None) -> Receipt:
+        """
+        Send one request to an adapter, retrying transient failures, and parse
+        the result. Once cancelled is set, raises CancelledError instead of
+        sending or retrying (a request already sent runs to completion).
+        """
+        estimated_tokens = adapter.estimate_request_tokens(prompt, encoded.estimated_tokens, max_tokens)
+        attempts = self.retry_settings['attempts']
+        for attempt in range(attempts):
+            try:
+                # Use the adapter to analyze the image, within the vendor's rate limits
+                with get_vendor_limiter(adapter.vendor).limit(estimated_tokens):
+                    if cancelled is not None and cancelled.is_set():
+                        raise CancelledError()
+                    result = adapter.analyze_receipt(encoded.data, prompt, media_type=encoded.media_type,
+                                                     fields=fields, max_tokens=max_tokens)
+                return self._accept_response(adapter, encoded, prompt, result, first_pass)
+            except VisionAPIError as e:
+                if not e.retryable or attempt == attempts - 1:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                print(f"{e} - retrying in {delay:.1f}s ({attempt + 1}/{attempts - 1})")
+                if cancelled is None:
+                    time.sleep(delay)
+                elif cancelled.wait(delay):
+                    raise CancelledError() from e
+
+    async def _call_adapter_async(self, adapter, encoded: EncodedImage, prompt: CompiledPrompt,
+                                  first_pass: bool = False) -> Receipt:
+        """Async counterpart of _call_adapter"""
+        estimated_tokens = adapter.estimate_request_tokens(prompt, encoded.estimated_tokens)
+        attempts = self.retry_settings['attempts']
+        for attempt in range(attempts):
+            try:
+                result = await adapter.analyze_receipt_async(
+                    encoded.data, prompt, media_type=encoded.media_type, estimated_tokens=estimated_tokens
+                )
+                return self._accept_response(adapter, encoded, prompt, result, first_pass)
+            except VisionAPIError as e:
+                if not e.retryable or attempt == attempts - 1:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                print(f"{e} - retrying in {delay:.1f}s ({attempt + 1}/{attempts - 1})")
+                await asyncio.sleep(delay)
+
+    def _count(self, stats: Dict[str, int], key: str):
+        with self._stats_lock:
+            stats[key] += 1
+
+    def _hedge_deadline(self) -> float:
+        """Seconds to wait on the primary vendor before hedging: the p95 of recent latencies"""
+        with self._stats_lock:
+            samples = sorted(self.latencies)
+        if len(samples) < 20:
+            return self.hedge_settings['default_deadline']
+        return max(self.hedge_settings['min_deadline'], samples[int(0.95 * (len(samples) - 1))])
+
+    def _record_latency(self, started: float):
+        with self._stats_lock:
+            self.latencies.append(time.perf_counter() - started)
 
-    def analyze_receipt(self, image_bytes: bytes, previous_corrections: Optional[str] = None) -> Receipt:
-        """Analyze a receipt image using the Vision API"""
+    def _timed_primary_call(self, encoded: EncodedImage, prompt: CompiledPrompt,
+                            cancelled: Optional[threading.Event] = None) -> Receipt:
+        started = time.perf_counter()
+        receipt = self._call_adapter(self.adapter, encoded, prompt, cancelled=cancelled)
+        self._record_latency(started)
+        return receipt
+
+    async def _timed_primary_call_async(self, encoded: EncodedImage, prompt: CompiledPrompt) -> Receipt:
+        started = time.perf_counter()
+        receipt = await self._call_adapter_async(self.adapter, encoded, prompt)
+        self._record_latency(started)
+        return receipt
+
+    def _analyze_hedged(self, encoded: EncodedImage, prompt: CompiledPrompt) -> Receipt:
+        """
+        Send to the primary vendor; if it hasn't answered by the hedge deadline (or failed),
+        send the same request to the hedge vendor and return whichever valid Receipt arrives first.
+        The loser is cancelled: if it is still waiting for a rate-limit slot or to retry, it
+        gives up instead of sending.
+        """
+        cancelled = threading.Event()
+        primary = self._hedge_executor.submit(self._timed_primary_call, encoded, prompt, cancelled)
+        errors = []
         try:
-            # Use stored corrections if none provided
-            if previous_corrections is None:
-                previous_corrections = self.corrections
+            try:
+                return primary.result(timeout=self._hedge_deadline())
+            except FutureTimeout:
+                pending = {primary}
+            except Exception as e:
+                errors.append(e)
+                pending = set()
+
+            self._count(self.hedge_stats, 'fired')
+            hedge = self._hedge_executor.submit(self._call_adapter, self.hedge_adapter, encoded, prompt,
+                                                cancelled=cancelled)
+            pending.add(hedge)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        receipt = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    if future is hedge:
+                        self._count(self.hedge_stats, 'won')
+                    return receipt
+            raise errors[0]
+        finally:
+            cancelled.set()
+
+    async def _analyze_hedged_async(self, encoded: EncodedImage, prompt: CompiledPrompt) -> Receipt:
+        """Async counterpart of _analyze_hedged"""
+        primary = asyncio.create_task(self._timed_primary_call_async(encoded, prompt))
+        errors = []
+        done, pending = await asyncio.wait({primary}, timeout=self._hedge_deadline())
+        if done:
+            try:
+                return primary.result()
+            except Exception as e:
+                errors.append(e)
+        
+        self._count(self.hedge_stats, 'fired')
+        hedge = asyncio.create_task(self._call_adapter_async(self.hedge_adapter, encoded, prompt))
+        pending.add(hedge)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    receipt = task.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                if task is hedge:
+                    self._count(self.hedge_stats, 'won')
+                return receipt
+        raise errors[0]
+
+    def _check_first_pass(self, encoded: EncodedImage, receipt: Optional[Receipt],
+                          error: Optional[Exception] = None) -> Optional[Receipt]:
+        """The fast model's receipt if it passes local validation, else None so the caller escalates"""
+        if error is not None:
+            issues = [f"{self.cascade_adapter.model} failed: {error}"]
+        else:
+            issues = validation_issues(receipt, self.cascade_settings['max_not_found'])
+        if not issues:
+            self._count(self.cascade_stats, 'accepted')
+            self._remember_vendor(encoded, receipt)
+            return receipt
+        self._count(self.cascade_stats, 'escalated')
+        from src.utils.config import get_debug_mode
+        if get_debug_mode():
+            print(f"Escalating to {self.adapter.model}: {'; '.join(issues)}")
+        return None
+
+    def _first_pass(self, encoded: EncodedImage, prompt: CompiledPrompt) -> Optional[Receipt]:
+        """Analyze with the fast cascade model; None means escalate to the main model"""
+        try:
+            receipt = (self._cached_receipt(self.cascade_adapter, encoded, prompt, first_pass=True)
+                       or self._call_adapter(self.cascade_adapter, encoded, prompt, first_pass=True))
+        except Exception as e:
+            return self._check_first_pass(encoded, None, e)
+        return self._check_first_pass(encoded, receipt)
+
+    async def _first_pass_async(self, encoded: EncodedImage, prompt: CompiledPrompt) -> Optional[Receipt]:
+        """Async counterpart of _first_pass"""
+        try:
+            receipt = await asyncio.to_thread(self._cached_receipt, self.cascade_adapter, encoded, prompt, True)
+            if receipt is None:
+                receipt = await self._call_adapter_async(self.cascade_adapter, encoded, prompt, first_pass=True)
+        except Exception as e:
+            return self._check_first_pass(encoded, None, e)
+        return self._check_first_pass(encoded, receipt)
+
+    def _first_pass_streaming(self, encoded: EncodedImage, prompt: CompiledPrompt,
+                              on_field: Callable[[str, Any], None]) -> Optional[Receipt]:
+        """Streaming counterpart of _first_pass; if it escalates, the main model's fields stream over these"""
+        try:
+            receipt = self._cached_receipt(self.cascade_adapter, encoded, prompt, first_pass=True)
+            if receipt is None:
+                receipt = self._call_adapter_streaming(self.cascade_adapter, encoded, prompt, on_field,
+                                                       first_pass=True)
+        except Exception as e:
+            return self._check_first_pass(encoded, None, e)
+        return self._check_first_pass(encoded, receipt)
+
+    def analyze_receipt(self, image_bytes: Union[bytes, EncodedImage], previous_corrections: Optional[str] = None,
+                        locked: Optional[Dict[str, str]] = None) -> Receipt:
+        """
+        Analyze a receipt image (raw bytes, or an already encoded image) using the Vision API.
+        
+        locked maps fields the operator has already confirmed to their values: only
+        the other fields are requested, with a proportionally smaller output budget,
+        and the locked values are copied into the returned Receipt.
+        """
+        try:
+            if locked:
+                return self._analyze_partial(image_bytes, locked, previous_corrections)
+            encoded, prompt = self._prepare_request(image_bytes, previous_corrections)
+            cached = self._cached_receipt(self.adapter, encoded, prompt)
+            if cached is not None:
+                return cached
+            if self.cascade_adapter:
+                receipt = self._first_pass(encoded, prompt)
+                if receipt is not None:
+                    return receipt
+            if self.hedge_adapter:
+                return self._analyze_hedged(encoded, prompt)
+            return self._call_adapter(self.adapter, encoded, prompt)
             
-            # Get the prompt for receipt analysis
-            prompt = self._build_prompt(previous_corrections)
+        except Exception as e:
+            raise Exception(f"Receipt analysis failed: {str(e)}")
+
+    def _analyze_partial(self, image_bytes: Union[bytes, EncodedImage], locked: Dict[str, str],
+                         previous_corrections: Optional[str] = None,
+                         on_field: Optional[Callable[[str, Any], None]] = None) -> Receipt:
+        """Request only the unlocked fields (streamed if on_field is given); hedging does not apply"""
+        fields = self._unlocked_fields(locked)
+        if not fields:
+            return self._merge_locked(Receipt(), locked)
+        encoded, prompt = self._prepare_request(image_bytes, previous_corrections, fields, locked)
+        max_tokens = self._partial_max_tokens(self.adapter, fields)
+        receipt = self._cached_receipt(self.adapter, encoded, prompt)
+        if receipt is not None:
+            if on_field:
+                for field in fields:
+                    on_field(field, getattr(receipt, field))
+        elif on_field:
+            receipt = self._call_adapter_streaming(self.adapter, encoded, prompt, on_field, fields, max_tokens)
+        else:
+            receipt = self._call_adapter(self.adapter, encoded, prompt, fields, max_tokens)
+        return receipt
+
+    def _call_adapter_streaming(self, adapter, encoded: EncodedImage, prompt: CompiledPrompt,
+                                on_field: Callable[[str, Any], None],
+                                fields: Optional[List[str]] = None, max_tokens: Optional[int] = None,
+                                first_pass: bool = False) -> Receipt:
+        """Stream one request, reporting Receipt fields as they complete; retries only before any text arrives"""
+        estimated_tokens = adapter.estimate_request_tokens(prompt, encoded.estimated_tokens, max_tokens)
+        receipt_fields = {f.name for f in dataclass_fields(Receipt)}
+        attempts = self.retry_settings['attempts']
+        for attempt in range(attempts):
+            parser = IncrementalJSONFieldParser()
+            received = []
             
-            # Print prompt in debug mode
-            from src.utils.config import get_debug_mode
-            if get_debug_mode():
-                print("\n=== PROMPT ===")
-                print(prompt)
-                print("=============\n")
+            def on_text(text: str):
+                received.append(text)
+                for field, value in parser.feed(text):
+                    if field in receipt_fields:
+                        on_field(field, value)
             
-            # Use the adapter to analyze the image
-            result = self.adapter.analyze_receipt(image_bytes, prompt)
+            try:
+                with get_vendor_limiter(adapter.vendor).limit(estimated_tokens):
+                    result = adapter.analyze_receipt_stream(encoded.data, prompt, on_text, media_type=encoded.media_type,
+                                                            fields=fields, max_tokens=max_tokens)
+                return self._accept_response(adapter, encoded, prompt, result, first_pass)
+            except VisionAPIError as e:
+                if received or not e.retryable or attempt == attempts - 1:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                print(f"{e} - retrying in {delay:.1f}s ({attempt + 1}/{attempts - 1})")
+                time.sleep(delay)
+
+    def analyze_receipt_streaming(self, image_bytes: Union[bytes, EncodedImage], on_field: Callable[[str, Any], None],
+                                  previous_corrections: Optional[str] = None,
+                                  locked: Optional[Dict[str, str]] = None) -> Receipt:
+        """
+        Like analyze_receipt, but streams the response and calls on_field(field, value)
+        for each Receipt field as soon as its value is complete, so a UI can fill the
+        form while the rest arrives. on_field runs on the calling thread. Hedging
+        does not apply to streamed requests.
+        """
+        try:
+            if locked:
+                return self._analyze_partial(image_bytes, locked, previous_corrections, on_field)
+            encoded, prompt = self._prepare_request(image_bytes, previous_corrections)
+            cached = self._cached_receipt(self.adapter, encoded, prompt)
+            if cached is not None:
+                for field in dataclass_fields(Receipt):
+                    on_field(field.name, getattr(cached, field.name))
+                return cached
+            if self.cascade_adapter:
+                receipt = self._first_pass_streaming(encoded, prompt, on_field)
+                if receipt is not None:
+                    return receipt
+            return self._call_adapter_streaming(self.adapter, encoded, prompt, on_field)
             
-            # Parse the response into a Receipt object
-            return self.adapter.parse_response(result)
+        except Exception as e:
+            raise Exception(f"Receipt analysis failed: {str(e)}")
+
+    async def analyze_receipt_async(self, image_bytes: Union[bytes, EncodedImage],
+                                    previous_corrections: Optional[str] = None) -> Receipt:
+        """Async counterpart of analyze_receipt, so many receipts can be in flight at once"""
+        try:
+            # Encoding is CPU work; keep it off the event loop
+            encoded, prompt = await asyncio.to_thread(self._prepare_request, image_bytes, previous_corrections)
+            cached = await asyncio.to_thread(self._cached_receipt, self.adapter, encoded, prompt)
+            if cached is not None:
+                return cached
+            if self.cascade_adapter:
+                receipt = await self._first_pass_async(encoded, prompt)
+                if receipt is not None:
+                    return receipt
+            if self.hedge_adapter:
+                return await self._analyze_hedged_async(encoded, prompt)
+            return await self._call_adapter_async(self.adapter, encoded, prompt)
             
         except Exception as e:
             raise Exception(f"Receipt analysis failed: {str(e)}")
 
+    def submit_batch(self, images: Dict[str, Union[bytes, EncodedImage]], max_batch_bytes: int = 100_000_000) -> dict:
+        """
+        Submit images to the vendor's asynchronous batch API, keyed by caller-chosen IDs.
+        
+        Images whose response is already in the result cache are not sent. Requests
+        are split into several vendor batches if they exceed max_batch_bytes.
+        Returns a JSON-serializable job: {'batch_ids', 'cache_keys', 'cached', 'rules'},
+        where cached maps IDs to raw responses found in the cache and rules are
+        the local correction rules to apply when the results are collected. The
+        rules come from the unscoped prompt; vendor scoping only changes which
+        free-text corrections each image's prompt carries.
+        """
+        rules = self._build_prompt().rules
+        job = {'batch_ids': [], 'cache_keys': {}, 'cached': {},
+               'rules': [CorrectionFormatter.format_rule(rule) for rule in rules.rules]}
+        chunk, chunk_bytes = [], 0
+        for custom_id, image in images.items():
+            encoded, prompt = self._prepare_request(image)
+            if self.result_cache is not None:
+                key = self._cache_key(self.adapter, encoded, prompt)
+                job['cache_keys'][custom_id] = key
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    job['cached'][custom_id] = cached
+                    continue
+            request = self.adapter.build_batch_request(custom_id, encoded.data, prompt, encoded.media_type)
+            request_bytes = len(json.dumps(request))
+            if chunk and chunk_bytes + request_bytes > max_batch_bytes:
+                job['batch_ids'].append(self.adapter.submit_batch(chunk))
+                chunk, chunk_bytes = [], 0
+            chunk.append(request)
+            chunk_bytes += request_bytes
+        if chunk:
+            job['batch_ids'].append(self.adapter.submit_batch(chunk))
+        return job
+
+    def batch_status(self, job: dict) -> Tuple[List[str], bool]:
+        """Vendor status of each batch in a job, and whether they have all finished"""
+        statuses = [self.adapter.get_batch_status(batch_id) for batch_id in job['batch_ids']]
+        return [status for status, _ in statuses], all(done for _, done in statuses)
+
+    def collect_batch(self, job: dict) -> Dict[str, Union[Receipt, Exception]]:
+        """Map each ID in a finished job to its Receipt (or the error), caching successful responses"""
+        raw_results = {custom_id: (text, None) for custom_id, text in job['cached'].items()}
+        for batch_id in job['batch_ids']:
+            raw_results.update(self.adapter.get_batch_results(batch_id))
+        
+        # Apply the rules the job was submitted with, even if corrections have changed since
+        current_rules = self._build_prompt().rules
+        if 'rules' in job:
+            rules = split_corrections('\n'.join(job['rules']))[0]
+            if rules.rules != current_rules.rules:
+                print("Corrections changed since this job was submitted; applying the rules it was submitted with")
+        else:
+            rules = current_rules
+            print("Warning: this job was submitted without its correction rules; applying the current ones")
+        results = {}
+        for custom_id, (text, error) in raw_results.items():
+            if error is not None:
+                results[custom_id] = Exception(f"Receipt analysis failed: {error}")
+                continue
+            try:
+                results[custom_id] = self._parse(self.adapter, text, rules)
+            except ValueError as e:
+                results[custom_id] = Exception(f"Receipt analysis failed: {e}")
+                continue
+            key = job['cache_keys'].get(custom_id)
+            if key and self.result_cache is not None and custom_id not in job['cached']:
+                try:
+                    self.result_cache.put(key, text, self.adapter.vendor, self.adapter.model)
+                except OSError as e:
+                    print(f"Warning: could not write result cache: {e}")
+        return results
+
     def analyze_image_raw(self, image_bytes: bytes, prompt: str) -> str:
         """Analyze an image with a custom prompt and return raw response"""
-        return self.adapter.analyze_receipt(image_bytes, prompt)
+        encoded = self.encode_image(image_bytes)
+        return self.adapter.analyze_receipt(encoded.data, prompt, media_type=encoded.media_type)
+
+    def add_correction(self, correction: str) -> bool:
+        """Add a new correction to memory; False if an identical one is already there"""
+        return self.prompt_cache.add_correction(correction)
+
+    def save_correction(self, correction: str) -> bool:
+        """Add a new correction to corrections.txt, and so to future prompts; False if already saved"""
+        return self.prompt_cache.save_correction(correction)
+
+    def compact_corrections(self) -> CompactionReport:
+        """Deduplicate, merge and sort corrections.txt in place"""
+        return self.prompt_cache.compact()
+
+_shared_services = {}
+_shared_services_lock = threading.Lock()
 
-    def add_correction(self, correction: str):
-        """Add a new correction to memory"""
-        self.corrections += "\n" + correction
\ No newline at end of file
+def get_vision_service(vendor: str = None) -> VisionAPIService:
+    """Get a process-wide VisionAPIService for a vendor, so callers share its pooled connections"""
+    from src.utils.config import get_vendor
+    vendor = (vendor or get_vendor()).lower()
+    with _shared_services_lock:
+        if vendor not in _shared_services:
+            _shared_services[vendor] = VisionAPIService(vendor=vendor)
+        return _shared_services[vendor]
@@ -0,0 +1,75 @@
+from typing import Optional
+import numpy as np
+from .image_quality import downscale_gray, laplacian_variance, mean_abs_diff
+
+class AutoCaptureDetector:
+    """
+    Decides when a steady, in-focus receipt should be captured automatically.
+
+    Fed every camera frame, it scores frame-to-frame motion and sharpness on a
+    downscaled grayscale copy. It fires once the scene has been still and sharp
+    for `stable_frames` consecutive frames, and only if the scene differs from
+    the last capture and something has moved since then (i.e. the paper was
+    swapped). The sharpness threshold also keeps an empty desk from triggering.
+    """
+
+    def __init__(self, stable_frames: int = 8, motion_threshold: float = 3.0,
+                 sharpness_threshold: float = 80.0, change_threshold: float = 10.0,
+                 analysis_width: int = 320):
+        self.stable_frames = stable_frames
+        self.motion_threshold = motion_threshold
+        self.sharpness_threshold = sharpness_threshold
+        self.change_threshold = change_threshold
+        self.analysis_width = analysis_width
+
+        # Latest scores, exposed for debug display
+        self.motion = 0.0
+        self.sharpness = 0.0
+        self.reset()
+
+    def reset(self):
+        """Forget all frame history, e.g. when auto-capture is switched on"""
+        self._previous: Optional[np.ndarray] = None
+        self._last_captured: Optional[np.ndarray] = None
+        self._stable_count = 0
+        self._armed = True
+
+    def update(self, frame: np.ndarray) -> bool:
+        """Score a new BGR frame; return True if it should be captured"""
+        gray = downscale_gray(frame, self.analysis_width)
+
+        # First frame, or the view was rotated: nothing to compare against yet
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            self._stable_count = 0
+            return False
+
+        self.motion = mean_abs_diff(gray, previous)
+
+        if self.motion > self.motion_threshold:
+            # Something is moving; once it settles we may capture again
+            self._stable_count = 0
+            self._armed = True
+            return False
+
+        self.sharpness = laplacian_variance(gray)
+        if not self._armed or self.sharpness < self.sharpness_threshold:
+            self._stable_count = 0
+            return False
+
+        self._stable_count += 1
+        if self._stable_count < self.stable_frames:
+            return False
+
+        # Still showing the receipt we captured last time
+        last_captured = self._last_captured
+        if (last_captured is not None
+                and last_captured.shape == gray.shape
+                and mean_abs_diff(gray, last_captured) < self.change_threshold):
+            self._armed = False
+            return False
+
+        self._last_captured = gray
+        self._stable_count = 0
+        self._armed = False
+        return True
@@ -1,7 +1,9 @@
 # src/utils/config.py
 import json
 import os
-from typing import Optional
+import threading
+from contextlib import contextmanager
+from typing import Any, Optional
 
 DEFAULT_CONFIG_PATH = "config.json"
 DEFAULT_CONFIG = {
@@ -11,16 +13,122 @@ DEFAULT_CONFIG = {
     "debug_mode": False
 }
 
-def load_config():
-    """Load configuration from config.json"""
-    config_path = os.path.join(os.path.dirname(__file__), '..', '..', 'config.json')
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'config.json')
+
+class Config:
+    """
+    An immutable snapshot of config.json with typed accessors.
+
+    Typed getters fall back to the default (with a warning) when a value is
+    missing or has the wrong type, instead of failing deep inside a caller.
+    """
+
+    def __init__(self, data: dict, prefix: str = ''):
+        self.data = data
+        self.prefix = prefix  # Path of a nested section, for warnings
+        self._warned = set()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def _typed(self, key: str, default, convert):
+        value = self.data.get(key, default)
+        try:
+            return convert(value)
+        except (TypeError, ValueError):
+            if key not in self._warned:
+                self._warned.add(key)
+                print(f"Warning: invalid config value {self.prefix}{key}={value!r}, using {default!r}")
+            return default
+
+    def get_str(self, key: str, default: str = '') -> str:
+        return self._typed(key, default, str)
+
+    def get_int(self, key: str, default: int, minimum: Optional[int] = None) -> int:
+        value = self._typed(key, default, int)
+        return value if minimum is None else max(minimum, value)
+
+    def get_float(self, key: str, default: float, minimum: Optional[float] = None) -> float:
+        value = self._typed(key, default, float)
+        return value if minimum is None else max(minimum, value)
+
+    def get_bool(self, key: str, default: bool) -> bool:
+        value = self.data.get(key, default)
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        return bool(value)
+
+    def get_section(self, key: str) -> dict:
+        value = self.data.get(key)
+        return value if isinstance(value, dict) else {}
+
+    def section(self, *keys: str) -> 'Config':
+        """A nested object with the same typed accessors; empty if missing"""
+        data = self.data
+        for key in keys:
+            data = data.get(key) if isinstance(data, dict) else None
+        return Config(data if isinstance(data, dict) else {}, self.prefix + ''.join(f"{key}." for key in keys))
+
+_config_lock = threading.Lock()
+_config: Optional[Config] = None
+_config_stamp = None  # (mtime_ns, size) of the file the snapshot was read from
+_pinned: Optional[Config] = None
+_pin_depth = 0
+
+def _read_config_file() -> dict:
     try:
-        with open(config_path, 'r') as f:
+        with open(CONFIG_PATH, 'r') as f:
             return json.load(f)
     except Exception as e:
         print(f"Error loading config: {e}")
         return {}
 
+def get_config() -> Config:
+    """
+    Get the process-wide config snapshot.
+
+    config.json is parsed once and re-read only when its mtime or size
+    changes, so getters are cheap on hot paths. While pinned (see
+    pin_config), the pinned snapshot is returned regardless of edits.
+    """
+    global _config, _config_stamp
+    if _pinned is not None:
+        return _pinned
+    try:
+        stat = os.stat(CONFIG_PATH)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        stamp = None
+    if _config is not None and stamp == _config_stamp:
+        return _config
+    with _config_lock:
+        if _config is None or stamp != _config_stamp:
+            _config = Config(_read_config_file())
+            _config_stamp = stamp
+        return _config
+
+@contextmanager
+def pin_config():
+    """Freeze the current config for the duration, so a mid-run edit can't change a batch halfway through"""
+    global _pinned, _pin_depth
+    with _config_lock:
+        snapshot = _pinned
+    snapshot = snapshot or get_config()
+    with _config_lock:
+        _pinned = snapshot
+        _pin_depth += 1
+    try:
+        yield snapshot
+    finally:
+        with _config_lock:
+            _pin_depth -= 1
+            if _pin_depth == 0:
+                _pinned = None
+
+def load_config() -> dict:
+    """Load configuration from config.json (cached; treat the result as read-only)"""
+    return get_config().data
+
 def save_config(config: dict, config_path: str = DEFAULT_CONFIG_PATH) -> None:
     """Save configuration to JSON file"""
     try:
@@ -31,12 +139,12 @@ def save_config(config: dict, config_path: str = DEFAULT_CONFIG_PATH) -> None:
 
 def get_vendor() -> str:
     """Get the vendor from config"""
-    config = load_config()
-    return config.get('use_vendor', 'openai').lower()  # Default to OpenAI if not specified
+    config = get_config()
+    return config.get_str('use_vendor', 'openai').lower()  # Default to OpenAI if not specified
 
 def get_api_key(vendor: str) -> str:
     """Get API key for specified vendor"""
-    config = load_config()
+    config = get_config()
     key_mapping = {
         'openai': 'openai_api_key',
         'anthropic': 'anthropic_api_key',
@@ -49,7 +157,7 @@ def get_api_key(vendor: str) -> str:
 
 def get_model(vendor: str) -> str:
     """Get model name for specified vendor"""
-    config = load_config()
+    config = get_config()
     defaults = {
         'openai': 'gpt-4o-mini',
         'anthropic': 'claude-3-5-sonnet-20241022',
@@ -57,7 +165,170 @@ def get_model(vendor: str) -> str:
     key = f'{vendor.lower()}_model'
     return config.get(key, defaults.get(vendor.lower(), ''))
 
+def get_api_base(vendor: str) -> str:
+    """Get the API base URL for a vendor (overridable to point at a proxy or a local stand-in)"""
+    config = get_config()
+    defaults = {
+        'openai': 'https://api.openai.com',
+        'anthropic': 'https://api.anthropic.com',
+    }
+    return config.get_str(f'{vendor.lower()}_api_base', defaults.get(vendor.lower(), '')).rstrip('/')
+
 def get_debug_mode() -> bool:
     """Get debug mode setting"""
-    config = load_config()
-    return config.get('debug_mode', False)
\ No newline at end of file
+    config = get_config()
+    return config.get_bool('debug_mode', False)
+
+def get_analysis_workers() -> int:
+    """Get number of background workers used to analyze captures"""
+    config = get_config()
+    return config.get_int('analysis_workers', 2, minimum=1)
+
+def get_preview_fps() -> float:
+    """Get the maximum camera preview refresh rate"""
+    config = get_config()
+    return config.get_float('preview_fps', 15, minimum=1.0)
+
+def get_auto_capture_settings() -> dict:
+    """Get auto-capture settings, filling in defaults for missing keys"""
+    config = get_config()
+    return {
+        'enabled': config.get_bool('auto_capture', False),
+        'stable_frames': config.get_int('auto_capture_stable_frames', 8),
+        'motion_threshold': config.get_float('auto_capture_motion_threshold', 3.0),
+        'sharpness_threshold': config.get_float('auto_capture_sharpness_threshold', 80.0),
+        'change_threshold': config.get_float('auto_capture_change_threshold', 10.0),
+    }
+
+def get_preprocess_settings() -> dict:
+    """Get receipt crop/binarize settings for the capture path"""
+    config = get_config()
+    return {
+        'crop': config.get_bool('receipt_crop', True),
+        'binarize': config.get_bool('receipt_binarize', False),
+    }
+
+def get_image_encoding(vendor: str) -> dict:
+    """Get image encoding overrides (max_long_edge, max_bytes, format, quality, grayscale) for a vendor"""
+    config = get_config()
+    return dict(config.get_section('image_encoding').get(vendor.lower(), {}))
+
+def get_quality_gate_settings() -> dict:
+    """Get the pre-flight quality gate mode ('off', 'tag' or 'block') and threshold overrides"""
+    config = get_config()
+    return {
+        'mode': config.get_str('quality_gate', 'tag').lower(),
+        'thresholds': config.get_section('quality_thresholds'),
+    }
+
+def get_batch_workers() -> int:
+    """Get number of concurrent API calls for headless batch ingest"""
+    config = get_config()
+    return config.get_int('batch_workers', 4, minimum=1)
+
+def get_watch_settings() -> dict:
+    """Get watch-folder polling and settle intervals in seconds"""
+    config = get_config()
+    return {
+        'poll_seconds': config.get_float('watch_poll_seconds', 2.0),
+        'settle_seconds': config.get_float('watch_settle_seconds', 2.0),
+        'rescan_seconds': config.get_float('watch_rescan_seconds', 30.0),
+    }
+
+def get_http_settings() -> dict:
+    """Get HTTP connection pool size and connect/read timeouts (seconds) for the vision APIs"""
+    config = get_config()
+    return {
+        'pool_size': config.get_int('http_pool_size', 10, minimum=1),
+        'connect_timeout': config.get_float('http_connect_timeout', 10),
+        'read_timeout': config.get_float('http_read_timeout', 120),
+    }
+
+def get_output_settings() -> dict:
+    """Get the response token budget and whether to request schema-constrained JSON output"""
+    config = get_config()
+    return {
+        'max_tokens': config.get_int('max_output_tokens', 1024, minimum=64),
+        'structured_output': config.get_bool('structured_output', True),
+    }
+
+def get_cascade_settings(vendor: str) -> dict:
+    """Get the fast first-pass model for a vendor and how many missing fields it may leave before escalating"""
+    config = get_config()
+    model = config.get_section('cascade_models').get(vendor.lower())
+    return {
+        'enabled': config.get_bool('cascade', False) and bool(model),
+        'model': model,
+        'max_not_found': config.get_int('cascade_max_not_found', 2, minimum=0),
+    }
+
+def get_model_prices() -> dict:
+    """Get USD prices per million tokens ({'input', 'cached_input', 'output'}) by model name"""
+    config = get_config()
+    return config.get_section('model_prices')
+
+def get_rate_limits(vendor: str) -> dict:
+    """Get concurrency and requests/tokens-per-minute limits for a vendor (0 disables a rate limit)"""
+    limits = get_config().section('rate_limits', vendor.lower())
+    return {
+        'max_concurrency': limits.get_int('max_concurrency', 8, minimum=1),
+        'requests_per_minute': limits.get_float('requests_per_minute', 0.0, minimum=0.0),
+        'tokens_per_minute': limits.get_float('tokens_per_minute', 0.0, minimum=0.0),
+    }
+
+def get_retry_settings() -> dict:
+    """Get retry attempts and backoff delays (seconds) for vision API calls"""
+    config = get_config()
+    return {
+        'attempts': config.get_int('retry_attempts', 3, minimum=1),
+        'base_delay': config.get_float('retry_base_delay', 1.0),
+        'max_delay': config.get_float('retry_max_delay', 30.0),
+    }
+
+def get_hedge_settings(primary_vendor: str) -> dict:
+    """Get hedged-request settings; the hedge vendor defaults to the other supported vendor"""
+    config = get_config()
+    other_vendor = 'anthropic' if primary_vendor.lower() == 'openai' else 'openai'
+    return {
+        'enabled': config.get_bool('hedge_requests', False),
+        'vendor': config.get_str('hedge_vendor', other_vendor).lower(),
+        'default_deadline': config.get_float('hedge_default_deadline', 15.0),
+        'min_deadline': config.get_float('hedge_min_deadline', 3.0),
+    }
+
+def get_result_cache_settings() -> dict:
+    """Get settings for the on-disk cache of vision API responses"""
+    config = get_config()
+    return {
+        'enabled': config.get_bool('result_cache', True),
+        'dir': config.get_str('result_cache_dir', './output/cache'),
+        'max_bytes': int(config.get_float('result_cache_max_mb', 100) * 1_000_000),
+        'max_age_days': config.get_float('result_cache_max_age_days', 30),
+    }
+
+def get_duplicate_check_settings() -> dict:
+    """Get settings for the commit-time duplicate receipt check"""
+    config = get_config()
+    return {
+        'enabled': config.get_bool('duplicate_check', True),
+        'db': config.get_str('duplicate_index_db', './output/receipt_index.sqlite'),
+        'max_distance': config.get_int('duplicate_max_distance', 6, minimum=0),
+    }
+
+def get_stream_responses() -> bool:
+    """Get whether the GUI streams responses to fill fields as they arrive"""
+    config = get_config()
+    return config.get_bool('stream_responses', True)
+
+def get_scope_corrections() -> bool:
+    """Get whether prompts carry only the free-text corrections for the receipt's guessed vendor"""
+    config = get_config()
+    return config.get_bool('scope_corrections', True)
+
+def get_batch_api_settings() -> dict:
+    """Get polling interval (seconds) and per-job size limit for vendor batch-API jobs"""
+    config = get_config()
+    return {
+        'poll_seconds': config.get_float('batch_api_poll_seconds', 60.0, minimum=1.0),
+        'max_batch_bytes': int(config.get_float('batch_api_max_mb', 100) * 1_000_000),
+    }
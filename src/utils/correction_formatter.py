@@ -1,6 +1,14 @@
+import re
 from dataclasses import dataclass
 from typing import Optional
 
+# The rule forms format_rule writes, plus the same without a vendor condition (applies to every vendor).
+# Values can't contain quotes, so a line with any further condition stays free text for the model
+RULE_PATTERN = re.compile(
+    r'^(?:- )?When (?:vendor is "(?P<vendor>[^"]*)" and )?(?P<field>\w+) is "(?P<original>[^"]*)", '
+    r'change (?P=field) to "(?P<corrected>[^"]*)"\Z'
+)
+
 @dataclass
 class CorrectionRule:
     field: str
@@ -14,6 +22,9 @@ class CorrectionFormatter:
         """Format a correction rule into a standardized string format"""
         if rule.field == 'vendor':
             correction = f'When vendor is "{rule.original_value}", change vendor to "{rule.corrected_value}"'
+        elif not rule.vendor_context:
+            correction = (f'When {rule.field} is "{rule.original_value}", '
+                        f'change {rule.field} to "{rule.corrected_value}"')
         else:
             correction = (f'When vendor is "{rule.vendor_context}" and {rule.field} is '
                         f'"{rule.original_value}", change {rule.field} to "{rule.corrected_value}"')
@@ -22,7 +33,17 @@ class CorrectionFormatter:
         return f"- {correction}"
 
     @staticmethod
-    def parse_rule(rule_text: str) -> CorrectionRule:
-        """Parse a correction rule string back into a CorrectionRule object"""
-        # Add parsing logic here if needed
-        pass 
\ No newline at end of file
+    def parse_rule(rule_text: str) -> Optional[CorrectionRule]:
+        """
+        Parse a correction rule string back into a CorrectionRule object.
+        Returns None for free-text rules that don't follow the standard form.
+        """
+        match = RULE_PATTERN.match(rule_text.strip())
+        if not match:
+            return None
+        return CorrectionRule(
+            field=match.group('field'),
+            original_value=match.group('original'),
+            corrected_value=match.group('corrected'),
+            vendor_context=match.group('vendor') or None
+        ) 
\ No newline at end of file
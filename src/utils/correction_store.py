@@ -0,0 +1,346 @@
+import hashlib
+import re
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.utils.correction_formatter import CorrectionFormatter, CorrectionRule
+from src.utils.datastore import RECEIPT_FIELDS
+
+# A vendor condition in a free-text rule: 'vendor is "X"', 'vendor includes "X"' or 'vendor contains "X"'
+VENDOR_CONDITION = re.compile(r'\bvendor (is|includes|contains) "([^"]+)"', re.IGNORECASE)
+
+# Comment lines compact_corrections writes, which it drops again when re-compacting
+VERSION_COMMENT = '# corrections version: '
+CONFLICT_COMMENT = '# conflict: '
+
+def normalize_value(value) -> str:
+    """Case- and whitespace-insensitive form of a field value, for matching rules"""
+    return ' '.join(str(value if value is not None else 'not found').split()).casefold()
+
+class CorrectionStore:
+    """
+    Correction rules that can be applied without the model, indexed by
+    (vendor, field, original value). A rule with no vendor context applies to
+    every vendor. Applying the store to a Receipt is one dict lookup per field.
+
+    Vendor rules run first, so field rules match on the corrected vendor (the
+    vendor the operator saw when entering the correction); the vendor as
+    extracted is tried too.
+    """
+
+    def __init__(self, rules: Optional[List[CorrectionRule]] = None):
+        self._rules: Dict[Tuple[Optional[str], str, str], CorrectionRule] = {}
+        for rule in rules or []:
+            self.add(rule)
+
+    @staticmethod
+    def key(vendor: Optional[str], field: str, value) -> Tuple[Optional[str], str, str]:
+        return (normalize_value(vendor) if vendor else None, field, normalize_value(value))
+
+    def add(self, rule: CorrectionRule):
+        """Index a rule; a later rule for the same vendor, field and value replaces an earlier one"""
+        vendor = None if rule.field == 'vendor' else rule.vendor_context
+        self._rules[self.key(vendor, rule.field, rule.original_value)] = rule
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    @property
+    def rules(self) -> List[CorrectionRule]:
+        return list(self._rules.values())
+
+    def lookup(self, vendors: List[Optional[str]], field: str, value) -> Optional[CorrectionRule]:
+        """The rule for this field value under the first matching vendor, else a vendor-independent one"""
+        for vendor in vendors:
+            if vendor:
+                rule = self._rules.get(self.key(vendor, field, value))
+                if rule:
+                    return rule
+        return self._rules.get(self.key(None, field, value))
+
+    def vendor_aliases(self, vendor: str) -> List[str]:
+        """
+        The vendor plus the names vendor rules rename it to or from, since it may
+        have been read before or after correction (the extracted or committed name)
+        """
+        aliases = [vendor]
+        rule = self.lookup([], 'vendor', vendor)
+        if rule:
+            aliases.append(rule.corrected_value)
+        name = normalize_value(vendor)
+        aliases.extend(rule.original_value for rule in self._rules.values()
+                       if rule.field == 'vendor' and normalize_value(rule.corrected_value) == name)
+        return aliases
+
+    def apply(self, receipt, locked: Iterable[str] = ()) -> Tuple[object, List[CorrectionRule]]:
+        """
+        Return the receipt with matching rules applied, and the rules that
+        fired. Locked fields (values the operator confirmed) are never changed,
+        but a locked vendor still selects the vendor's rules.
+        """
+        if not self._rules:
+            return receipt, []
+        applied = []
+        changes = {}
+        extracted_vendor = receipt.vendor
+        rule = None if 'vendor' in locked else self.lookup([], 'vendor', extracted_vendor)
+        if rule:
+            changes['vendor'] = rule.corrected_value
+            applied.append(rule)
+        vendors = [changes.get('vendor', extracted_vendor), extracted_vendor]
+        for field_name, value in vars(receipt).items():
+            if field_name == 'vendor' or field_name in locked:
+                continue
+            rule = self.lookup(vendors, field_name, value)
+            if rule:
+                changes[field_name] = rule.corrected_value
+                applied.append(rule)
+        return (replace(receipt, **changes) if changes else receipt), applied
+
+@lru_cache(maxsize=8)
+def split_corrections(corrections: str) -> Tuple[CorrectionStore, str]:
+    """
+    Separate the corrections text into rules applied locally (the standard
+    forms CorrectionFormatter writes) and the remaining free-text lines, which
+    still have to go to the model as prompt text. Comment lines (#) are
+    dropped. The result is shared; treat the store as read-only.
+    """
+    store = CorrectionStore()
+    remaining = []
+    for line in corrections.splitlines():
+        if line.lstrip().startswith('#'):
+            continue
+        rule = CorrectionFormatter.parse_rule(line) if line.strip() else None
+        if rule and rule.field in RECEIPT_FIELDS:
+            store.add(rule)
+        else:
+            remaining.append(line)
+    return store, '\n'.join(remaining).strip('\n')
+
+class ScopedCorrections:
+    """
+    Free-text corrections indexed by the vendor they are conditioned on, so a
+    prompt can carry only the lines that could apply to one vendor plus the
+    lines with no vendor condition. "vendor is" conditions are looked up by
+    exact (normalized) vendor; "includes"/"contains" by substring.
+    """
+
+    def __init__(self, text: str):
+        self.lines = text.splitlines()
+        self._global: List[int] = []
+        self._exact: Dict[str, List[int]] = {}
+        self._contains: List[Tuple[str, int]] = []
+        for index, line in enumerate(self.lines):
+            conditions = VENDOR_CONDITION.findall(line)
+            if not conditions:
+                self._global.append(index)
+            for mode, vendor in conditions:
+                if mode.lower() == 'is':
+                    self._exact.setdefault(normalize_value(vendor), []).append(index)
+                else:
+                    self._contains.append((normalize_value(vendor), index))
+
+    @property
+    def scoped(self) -> bool:
+        """Whether any line is conditioned on a vendor (otherwise every vendor gets every line)"""
+        return len(self._global) < len(self.lines)
+
+    def select(self, *vendors: Optional[str]) -> str:
+        """
+        The lines that could apply to any of these names for one vendor (as
+        extracted and as corrected), in file order; all lines if it is unknown
+        """
+        vendors = [normalize_value(vendor) for vendor in vendors if vendor is not None]
+        vendors = [vendor for vendor in vendors if vendor not in ('', 'not found')]
+        if not vendors:
+            return '\n'.join(self.lines)
+        indexes = set(self._global)
+        for vendor in vendors:
+            indexes.update(self._exact.get(vendor, []))
+            indexes.update(index for fragment, index in self._contains if fragment in vendor)
+        return '\n'.join(self.lines[index] for index in sorted(indexes))
+
+@lru_cache(maxsize=8)
+def scoped_corrections(text: str) -> ScopedCorrections:
+    """Shared, read-only vendor index of free-text corrections"""
+    return ScopedCorrections(text)
+
+def corrections_version(corrections: str) -> str:
+    """
+    Short hash of the corrections that affect results: the rule and free-text
+    lines in order, ignoring comments, blank lines and spacing. Caches can key
+    on it; compact_corrections writes it at the top of the file.
+    """
+    lines = [' '.join(line.split()) for line in corrections.splitlines()
+             if line.strip() and not line.lstrip().startswith('#')]
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()[:16]
+
+def _rule_key(rule: CorrectionRule) -> Tuple[Optional[str], str, str]:
+    return CorrectionStore.key(None if rule.field == 'vendor' else rule.vendor_context,
+                               rule.field, rule.original_value)
+
+def _parse_local_rule(line: str) -> Optional[CorrectionRule]:
+    """The rule in a line if split_corrections would apply it locally"""
+    rule = CorrectionFormatter.parse_rule(line) if line.strip() else None
+    return rule if rule and rule.field in RECEIPT_FIELDS else None
+
+def _free_text_key(line: str) -> str:
+    return normalize_value(re.sub(r'^-\s*', '', line.strip()))
+
+def has_correction(corrections: str, correction: str) -> bool:
+    """Whether the corrections already have this effect: the same rule in force, or the same free text"""
+    store, free_text = split_corrections(corrections)
+    rule = _parse_local_rule(correction)
+    if rule:
+        return any(_rule_key(existing) == _rule_key(rule) and existing.corrected_value == rule.corrected_value
+                   for existing in store.rules)
+    key = _free_text_key(correction)
+    return any(_free_text_key(line) == key for line in free_text.splitlines())
+
+@dataclass
+class CompactionReport:
+    """What compact_corrections did to a corrections file"""
+    version: str
+    lines_before: int
+    lines_after: int
+    duplicates: int = 0  # Repeated rules or free-text lines dropped
+    no_ops: int = 0  # Rules that changed a value to itself
+    merged: int = 0  # Rules pointed straight at the end of a chain (A -> B, B -> C gives A -> C)
+    conflicts: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (f"{self.lines_before} -> {self.lines_after} corrections ({self.duplicates} duplicates, "
+                f"{self.no_ops} no-ops removed, {self.merged} merged, {len(self.conflicts)} conflicts), "
+                f"version {self.version}")
+
+def _rule_sort_key(rule: CorrectionRule):
+    # Vendor renames first, then rules for any vendor, then rules for one vendor
+    if rule.field == 'vendor':
+        group, vendor = 0, ''
+    elif not rule.vendor_context:
+        group, vendor = 1, ''
+    else:
+        group, vendor = 2, normalize_value(rule.vendor_context)
+    return group, vendor, rule.field, normalize_value(rule.original_value)
+
+def _describe(rule: CorrectionRule) -> str:
+    scope = f'vendor "{rule.vendor_context}", ' if rule.vendor_context and rule.field != 'vendor' else ''
+    return f'{scope}{rule.field} "{rule.original_value}"'
+
+def compact_corrections(corrections: str) -> Tuple[str, CompactionReport]:
+    """
+    Rewrite corrections text so each rule appears once:
+
+    - repeated rules and free-text lines (ignoring case and spacing) are dropped
+    - rules changing a value to itself are dropped
+    - rules for the same vendor, field and value with different corrections
+      are all kept, in their original order (the last one applies), and
+      reported in a conflict comment until the operator deletes all but one
+    - chains within one vendor and field are merged (A -> B, B -> C becomes
+      A -> C, B -> C), since rules are applied in a single pass; a vendor
+      chain is left alone if a field rule is scoped to a vendor in its middle,
+      since that rule matches only on the intermediate name
+
+    Rules are written in the standard form, sorted by vendor, field and value,
+    followed by the free-text lines unchanged and in file order, since those
+    are sent to the model as written. The comment block at the top of the file
+    (up to the first blank line) is kept, under a line giving the
+    corrections_version of the result. Any other comment moves with the line
+    below it, and comments after the last line stay at the end. Compacting the
+    result again gives the same text.
+    """
+    header: List[str] = []
+    comments: Dict[object, List[str]] = {}  # Rule or free-text key -> comment lines above it
+    pending: List[str] = []
+    in_header, seen_comment = True, False
+    groups: Dict[Tuple[Optional[str], str, str], List[CorrectionRule]] = {}
+    free_text: Dict[str, str] = {}
+    lines_before = 0
+    report = CompactionReport(version='', lines_before=0, lines_after=0)
+
+    for line in corrections.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            in_header = in_header and not seen_comment
+            continue
+        if stripped.startswith('#'):
+            seen_comment = True
+            if not stripped.startswith((VERSION_COMMENT.strip(), CONFLICT_COMMENT.strip())):
+                (header if in_header else pending).append(stripped)
+            continue
+        in_header = False
+        lines_before += 1
+        rule = _parse_local_rule(stripped)
+        if rule is None:
+            key = _free_text_key(stripped)
+            if key in free_text:
+                report.duplicates += 1
+            else:
+                free_text[key] = line
+            comments.setdefault(key, []).extend(pending)
+            pending = []
+            continue
+        if rule.original_value == rule.corrected_value:
+            report.no_ops += 1
+            continue  # Its comments go with the next line
+        comments.setdefault(_rule_key(rule), []).extend(pending)
+        pending = []
+        group = groups.setdefault(_rule_key(rule), [])
+        repeated = [index for index, existing in enumerate(group) if existing.corrected_value == rule.corrected_value]
+        if repeated:
+            # Keep the earlier text, but at the later position so the same correction still applies
+            report.duplicates += 1
+            rule = group.pop(repeated[0])
+        group.append(rule)
+
+    # Merge chains through keys with a single rule; conflicting ones are left for the operator
+    single = {key: group[0] for key, group in groups.items() if len(group) == 1}
+    scoped_vendors = {key[0] for key in groups if key[1] != 'vendor' and key[0]}
+    cycles = []
+    for key, rule in single.items():
+        vendor, field_name, _ = key
+        chain = [key]
+        target = rule
+        cycle = False
+        while True:
+            next_key = CorrectionStore.key(vendor, field_name, target.corrected_value)
+            if next_key == chain[-1]:
+                break  # A case-only fix ("ACME" -> "Acme") matches its own value
+            if next_key in chain:
+                cycle = True
+                break
+            if next_key not in single:
+                break
+            chain.append(next_key)
+            target = single[next_key]
+        if cycle:
+            cycles.append(rule)
+        elif field_name == 'vendor' and any(name in scoped_vendors for _, _, name in chain[1:]):
+            continue  # Merging would stop the rules scoped to the intermediate vendor matching
+        elif target.corrected_value != rule.corrected_value:
+            groups[key] = [replace(rule, corrected_value=target.corrected_value)]
+            report.merged += 1
+
+    body = []
+    cycle_keys = {_rule_key(rule) for rule in cycles}
+    for key, group in sorted(groups.items(), key=lambda item: _rule_sort_key(item[1][-1])):
+        body.extend(comments.get(key, []))
+        if len(group) > 1:
+            values = ', '.join(f'"{rule.corrected_value}"' for rule in group)
+            report.conflicts.append(f'{_describe(group[-1])} is changed to {values}; '
+                                    f'the last applies, delete the others')
+        elif _rule_key(group[0]) in cycle_keys:
+            report.conflicts.append(f'{_describe(group[0])} leads into a cycle of corrections; left as is')
+        body.extend(CorrectionFormatter.format_rule(rule) for rule in group)
+    free_lines = []
+    for key, line in free_text.items():
+        free_lines.extend(comments.get(key, []))
+        free_lines.append(line)
+    version = corrections_version('\n'.join(body + free_lines))
+    report.version = version
+    report.lines_before = lines_before
+    report.lines_after = sum(len(group) for group in groups.values()) + len(free_text)
+
+    sections = [[VERSION_COMMENT + version] + [CONFLICT_COMMENT + conflict for conflict in report.conflicts]
+                + header, body, free_lines, pending]
+    return '\n\n'.join('\n'.join(section) for section in sections if section) + '\n', report
@@ -0,0 +1,62 @@
+# src/utils/datastore.py
+import csv
+import os
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+RECEIPTS_CSV = './output/receipts.csv'
+
+# Columns written to receipts.csv, in order
+RECEIPT_FIELDS = [
+    'vendor', 'invoice', 'bill_date', 'paid_date',
+    'payment_method', 'total_amount', 'item_type', 'item',
+    'project', 'expense_type'
+]
+
+def is_missing(value) -> bool:
+    """Whether an extracted value is empty or one of the placeholders the model writes for a missing field"""
+    return value is None or str(value).strip().lower() in ('', 'not found', 'none', 'n/a')
+
+# Date formats seen on receipts, tried in order when parsing a date field
+DATE_FORMATS = [
+    '%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%m-%d-%Y', '%m-%d-%y', '%Y/%m/%d',
+    '%b %d, %Y', '%B %d, %Y', '%d %b %Y', '%d %B %Y', '%b %d %Y', '%B %d %Y',
+]
+
+def parse_date(value) -> Optional[date]:
+    """The date, if it parses with a known receipt format"""
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+def build_row(receipt, overrides: Optional[Dict[str, str]] = None,
+              fields: List[str] = RECEIPT_FIELDS) -> dict:
+    """Build a CSV row from a receipt, using overrides where present"""
+    overrides = overrides or {}
+    row = {}
+    for field in fields:
+        override_value = (overrides.get(field) or '').strip()
+        if override_value:  # Use override if present
+            row[field] = override_value
+        else:  # Otherwise use extracted value
+            row[field] = getattr(receipt, field)
+    return row
+
+def append_rows(rows: Iterable[dict], csv_file: str = RECEIPTS_CSV,
+                fields: List[str] = RECEIPT_FIELDS) -> None:
+    """Append rows to the receipts CSV, writing the header if the file is new"""
+    os.makedirs(os.path.dirname(csv_file) or '.', exist_ok=True)
+    file_exists = os.path.isfile(csv_file) and os.path.getsize(csv_file) > 0
+
+    with open(csv_file, mode='a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+
+        # Write header if file is new
+        if not file_exists:
+            writer.writeheader()
+
+        writer.writerows(rows)
@@ -0,0 +1,199 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional
+from src.utils.datastore import is_missing, parse_date
+from src.utils.image_hash import hamming_distance
+
+DUPLICATE_INDEX_DB = './output/receipt_index.sqlite'
+
+def normalize_vendor(value) -> Optional[str]:
+    """Lowercase alphanumeric words, so 'Home Depot #123' and 'HOME DEPOT 123' match"""
+    if is_missing(value):
+        return None
+    return ' '.join(re.findall(r'[a-z0-9]+', str(value).lower())) or None
+
+def normalize_amount(value) -> Optional[str]:
+    """Amount to two decimal places, ignoring currency symbols and thousands separators"""
+    if is_missing(value):
+        return None
+    cleaned = re.sub(r'[^0-9.\-]', '', str(value))
+    try:
+        return str(Decimal(cleaned).quantize(Decimal('0.01')))
+    except InvalidOperation:
+        return str(value).strip().lower()
+
+def normalize_date(value) -> Optional[str]:
+    """ISO date if the value parses with a known receipt format, else the lowercased text"""
+    if is_missing(value):
+        return None
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed else str(value).strip().lower()
+
+@dataclass
+class DuplicateMatch:
+    """A previously committed capture that looks like the one being committed"""
+    capture_id: int
+    reason: str  # 'image', 'fields' or 'image+fields'
+    distance: Optional[int]
+    vendor: str
+    total_amount: str
+    paid_date: str
+    committed_at: str
+
+    def summary(self) -> str:
+        similarity = f", image distance {self.distance}" if self.distance is not None else ""
+        return (f"{self.vendor} / {self.total_amount} / {self.paid_date} "
+                f"committed {self.committed_at} (matched on {self.reason}{similarity})")
+
+class DuplicateIndex:
+    """
+    Persistent index of committed receipts for duplicate detection.
+
+    Stores each commit's 64-bit perceptual hash and its normalized
+    (vendor, total_amount, paid_date) in SQLite, so lookups never load
+    receipts.csv. Near-identical images are found by multi-index hashing:
+    the hash is split into four indexed 16-bit bands. Two hashes within
+    max_distance bits must be within max_distance // 4 bits on at least one
+    band, so a lookup probes each band's index with the few values that
+    close to the query, then checks the full Hamming distance of the
+    handful of candidates.
+
+    The database is opened (and created) on first use, so a process that
+    never commits or looks up a receipt leaves no file behind.
+    """
+    BAND_COUNT = 4
+    BAND_BITS = 16
+
+    def __init__(self, db_path: str = DUPLICATE_INDEX_DB, max_distance: int = 6):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _bands(self, phash: int) -> List[int]:
+        """Split a 64-bit hash into its 16-bit bands"""
+        mask = (1 << self.BAND_BITS) - 1
+        return [(phash >> (band * self.BAND_BITS)) & mask for band in range(self.BAND_COUNT)]
+
+    def _probe_values(self, value: int) -> List[int]:
+        """All band values within max_distance // BAND_COUNT bits of value"""
+        values = [value]
+        for _ in range(self.max_distance // self.BAND_COUNT):
+            values = list({v ^ (1 << bit) for v in values for bit in range(self.BAND_BITS)} | set(values))
+        return values
+
+    def _connection(self) -> sqlite3.Connection:
+        """The database connection, opened on first use; caller holds the lock"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._create_schema(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        with conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS captures (
+                    id INTEGER PRIMARY KEY,
+                    phash INTEGER,
+                    vendor_key TEXT,
+                    amount_key TEXT,
+                    date_key TEXT,
+                    vendor TEXT,
+                    total_amount TEXT,
+                    paid_date TEXT,
+                    committed_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS captures_fields ON captures (vendor_key, amount_key, date_key);
+                CREATE TABLE IF NOT EXISTS hash_bands (
+                    band INTEGER,
+                    value INTEGER,
+                    capture_id INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS hash_bands_lookup ON hash_bands (band, value);
+            ''')
+
+    @staticmethod
+    def _signed(phash: int) -> int:
+        """SQLite integers are signed 64-bit"""
+        return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+    def find(self, phash: Optional[int], vendor, total_amount, paid_date) -> List[DuplicateMatch]:
+        """Return committed receipts matching this image (within max_distance bits) or these fields"""
+        keys = (normalize_vendor(vendor), normalize_amount(total_amount), normalize_date(paid_date))
+        matches = {}
+        with self._lock:
+            conn = self._connection()
+            if phash is not None:
+                for band, value in enumerate(self._bands(phash)):
+                    probes = self._probe_values(value)
+                    for row in conn.execute(
+                            "SELECT c.id, c.phash, c.vendor, c.total_amount, c.paid_date, c.committed_at "
+                            "FROM hash_bands b JOIN captures c ON c.id = b.capture_id "
+                            f"WHERE b.band = ? AND b.value IN ({', '.join('?' * len(probes))})",
+                            (band, *probes)):
+                        distance = hamming_distance(row[1] & 0xFFFFFFFFFFFFFFFF, phash)
+                        if row[0] not in matches and distance <= self.max_distance:
+                            matches[row[0]] = DuplicateMatch(row[0], 'image', distance, *row[2:])
+            if None not in keys:
+                for row in conn.execute(
+                        "SELECT id, vendor, total_amount, paid_date, committed_at FROM captures "
+                        "WHERE vendor_key = ? AND amount_key = ? AND date_key = ?", keys):
+                    if row[0] in matches:
+                        matches[row[0]].reason = 'image+fields'
+                    else:
+                        matches[row[0]] = DuplicateMatch(row[0], 'fields', None, *row[1:])
+        return list(matches.values())
+
+    def add(self, phash: Optional[int], vendor, total_amount, paid_date) -> int:
+        """Record a committed receipt"""
+        with self._lock, self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO captures (phash, vendor_key, amount_key, date_key, vendor, total_amount, paid_date, committed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (None if phash is None else self._signed(phash),
+                 normalize_vendor(vendor), normalize_amount(total_amount), normalize_date(paid_date),
+                 vendor, total_amount, paid_date, time.strftime('%Y-%m-%d %H:%M'))
+            )
+            if phash is not None:
+                conn.executemany(
+                    "INSERT INTO hash_bands (band, value, capture_id) VALUES (?, ?, ?)",
+                    [(band, value, cursor.lastrowid) for band, value in enumerate(self._bands(phash))]
+                )
+            return cursor.lastrowid
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def record_headless_commit(index: Optional[DuplicateIndex], phash: Optional[int], row: dict, name: str):
+    """Record a row committed without an operator, printing a warning if it looks like a duplicate"""
+    if index is None:
+        return
+    fields = (row.get('vendor'), row.get('total_amount'), row.get('paid_date'))
+    for match in index.find(phash, *fields):
+        print(f"{name}: WARNING possible duplicate of {match.summary()}")
+    index.add(phash, *fields)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_duplicate_index() -> Optional[DuplicateIndex]:
+    """Return the process-wide duplicate index, or None if disabled in config"""
+    from src.utils.config import get_duplicate_check_settings
+    settings = get_duplicate_check_settings()
+    if not settings['enabled']:
+        return None
+    with _indexes_lock:
+        if settings['db'] not in _indexes:
+            _indexes[settings['db']] = DuplicateIndex(settings['db'], settings['max_distance'])
+        return _indexes[settings['db']]
@@ -0,0 +1,69 @@
+import threading
+from typing import Callable, Optional, Tuple, Union
+import cv2
+import numpy as np
+
+class FrameBuffer:
+    """
+    Thread-safe single-slot buffer holding the latest camera frame.
+
+    The producer stores the raw BGR frame and bumps a sequence number; consumers
+    read without removing it and can compare sequence numbers to tell whether
+    they have already seen a frame. Converted (and optionally resized) views are
+    made on demand and cached for the current frame. Frames handed out are
+    shared, so consumers must treat them as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame: Optional[np.ndarray] = None
+        self._sequence = 0
+        self._converted = {}
+
+    def put(self, frame: np.ndarray):
+        """Replace the buffered frame with a new raw BGR frame"""
+        with self._lock:
+            self._frame = frame
+            self._sequence += 1
+            self._converted = {}
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the latest frame (0 until the first frame arrives)"""
+        with self._lock:
+            return self._sequence
+
+    def get(self) -> Tuple[int, Optional[np.ndarray]]:
+        """Return (sequence, raw BGR frame) without consuming it"""
+        with self._lock:
+            return self._sequence, self._frame
+
+    def get_converted(self, conversion_code: int,
+                      size: Union[None, Tuple[int, int], Callable[[int, int], Tuple[int, int]]] = None
+                      ) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Return (sequence, frame converted with a cv2.COLOR_BGR2* code), converting
+        at most once per frame. With a (width, height) size the frame is resized
+        first, so only that many pixels are converted. size can also be a
+        function from the frame's (width, height) to the size wanted, for
+        callers that scale relative to the frame.
+        """
+        with self._lock:
+            sequence, frame, converted_views = self._sequence, self._frame, self._converted
+        if frame is None:
+            return sequence, None
+        if callable(size):
+            size = size(frame.shape[1], frame.shape[0])
+        key = (conversion_code, size)
+        cached = converted_views.get(key)
+        if cached is not None:
+            return sequence, cached
+
+        if size is not None and size != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        converted = cv2.cvtColor(frame, conversion_code)
+        with self._lock:
+            # Only cache if no newer frame arrived while converting
+            if self._sequence == sequence:
+                self._converted[key] = converted
+        return sequence, converted
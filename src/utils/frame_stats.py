@@ -0,0 +1,37 @@
+import time
+
+class FrameStats:
+    """Rolling frames-per-second and CPU-time-per-frame counter for one thread"""
+
+    def __init__(self, window_seconds: float = 1.0):
+        self.window_seconds = window_seconds
+        self.fps = 0.0
+        self.cpu_ms_per_frame = 0.0
+        self._frames = 0
+        self._cpu_time = 0.0
+        self._frame_start = None
+        self._window_start = time.perf_counter()
+
+    def begin_frame(self):
+        """Mark the start of work on a frame"""
+        self._frame_start = time.thread_time()
+
+    def end_frame(self):
+        """Mark the end of work on a frame and roll the window if it has elapsed"""
+        if self._frame_start is None:
+            return
+        self._cpu_time += time.thread_time() - self._frame_start
+        self._frame_start = None
+        self._frames += 1
+
+        elapsed = time.perf_counter() - self._window_start
+        if elapsed >= self.window_seconds:
+            self.fps = self._frames / elapsed
+            self.cpu_ms_per_frame = 1000 * self._cpu_time / self._frames
+            self._frames = 0
+            self._cpu_time = 0.0
+            self._window_start = time.perf_counter()
+
+    def summary(self) -> str:
+        """Format the latest window as a short human-readable string"""
+        return f"{self.fps:.1f} fps, {self.cpu_ms_per_frame:.1f} ms CPU/frame"
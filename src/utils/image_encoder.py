@@ -0,0 +1,123 @@
+import math
+from dataclasses import dataclass
+from typing import Optional, Union
+import cv2
+import numpy as np
+
+FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+}
+
+DEFAULT_ENCODING = {
+    'max_long_edge': 1568,
+    'max_bytes': 500_000,
+    'format': 'jpeg',
+    'quality': 85,
+    'min_quality': 40,
+    'grayscale': False,
+}
+
+@dataclass
+class EncodedImage:
+    data: bytes
+    media_type: str
+    width: int
+    height: int
+    quality: int
+    estimated_tokens: int
+    phash: Optional[int] = None  # Perceptual hash, filled in on first use
+
+    def summary(self) -> str:
+        """Short description of the encoding for logs and debug output"""
+        return (f"{self.width}x{self.height} {self.media_type} q{self.quality}, "
+                f"{len(self.data)} bytes, ~{self.estimated_tokens} image tokens")
+
+def estimate_image_tokens(vendor: str, width: int, height: int) -> int:
+    """Estimate the input tokens a vendor will bill for an image of this size"""
+    if vendor.lower() == 'anthropic':
+        # Scaled to fit a 1568px long edge and ~1.15 MP, then ~750 pixels per token
+        scale = min(1.0, 1568 / max(width, height), math.sqrt(1_150_000 / (width * height)))
+        return math.ceil((width * scale) * (height * scale) / 750)
+
+    # OpenAI high detail: fit in 2048x2048, shortest side to 768, then 170 per 512px tile
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return 85 + 170 * tiles
+
+def _encode(image: np.ndarray, image_format: str, quality: int) -> bytes:
+    extension, quality_flag, _ = FORMATS[image_format]
+    ok, buffer = cv2.imencode(extension, image, [quality_flag, quality])
+    if not ok:
+        raise ValueError(f"Failed to encode image as {image_format}")
+    return buffer.tobytes()
+
+def _encode_within_budget(image: np.ndarray, image_format: str, quality: int,
+                          min_quality: int, max_bytes: int) -> Optional[tuple]:
+    """Return (data, quality) at the highest quality that fits max_bytes, or None"""
+    data = _encode(image, image_format, quality)
+    if len(data) <= max_bytes:
+        return data, quality
+
+    # Binary search the quality range for the largest encoding that still fits
+    best = None
+    low, high = min_quality, quality - 1
+    while low <= high:
+        middle = (low + high) // 2
+        data = _encode(image, image_format, middle)
+        if len(data) <= max_bytes:
+            best = (data, middle)
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+def encode_image(image: Union[bytes, np.ndarray], vendor: str, settings: Optional[dict] = None) -> EncodedImage:
+    """
+    Encode an image (BGR/grayscale array or already-encoded bytes) for upload.
+
+    Downscales to the configured long edge, optionally converts to grayscale,
+    and picks the highest quality that fits the byte budget, shrinking the
+    image further if even the minimum quality is too large.
+    """
+    settings = {**DEFAULT_ENCODING, **(settings or {})}
+    image_format = settings['format'].lower()
+    if image_format not in FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+
+    if isinstance(image, (bytes, bytearray)):
+        image = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image bytes")
+
+    if settings['grayscale'] and image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    long_edge = max(image.shape[:2])
+    if long_edge > settings['max_long_edge']:
+        scale = settings['max_long_edge'] / long_edge
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    while True:
+        result = _encode_within_budget(image, image_format, settings['quality'],
+                                       settings['min_quality'], settings['max_bytes'])
+        if result is not None or min(image.shape[:2]) < 64:
+            break
+        image = cv2.resize(image, None, fx=0.8, fy=0.8, interpolation=cv2.INTER_AREA)
+
+    if result is None:
+        raise ValueError(f"Could not encode image within {settings['max_bytes']} bytes")
+
+    data, quality = result
+    height, width = image.shape[:2]
+    return EncodedImage(
+        data=data,
+        media_type=FORMATS[image_format][2],
+        width=width,
+        height=height,
+        quality=quality,
+        estimated_tokens=estimate_image_tokens(vendor, width, height)
+    )
@@ -0,0 +1,29 @@
+import hashlib
+from typing import Union
+import cv2
+import numpy as np
+
+def sha256_hex(data: bytes) -> str:
+    """Content hash of raw (encoded) image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def dhash(image: Union[bytes, np.ndarray], hash_size: int = 8) -> int:
+    """
+    64-bit difference hash: sign of horizontal gradients on a tiny grayscale thumbnail.
+
+    Robust to re-encoding, small exposure changes and resizing, so two camera
+    frames of the same receipt usually land within a few bits of each other.
+    Accepts an encoded image (JPEG/PNG/WebP bytes) or a BGR/grayscale array.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError("Could not decode image for hashing")
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    """Number of differing bits between two perceptual hashes"""
+    return bin(hash_a ^ hash_b).count('1')
@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from typing import List
+import cv2
+import numpy as np
+
+DEFAULT_QUALITY_THRESHOLDS = {
+    'min_sharpness': 60.0,
+    'max_glare_fraction': 0.05,
+    'min_brightness': 60.0,
+    'min_fill_fraction': 0.15,
+}
+
+@dataclass
+class QualityReport:
+    sharpness: float
+    glare_fraction: float
+    brightness: float
+    fill_fraction: float
+    issues: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    def summary(self) -> str:
+        """Comma-separated list of issues, or 'ok'"""
+        return ", ".join(self.issues) if self.issues else "ok"
+
+def downscale_gray(frame: np.ndarray, width: int = 320) -> np.ndarray:
+    """
+    Convert a BGR frame to grayscale and downscale it to roughly the given width.
+
+    Scales by a whole-number factor (cropping a few edge pixels if needed),
+    which lets INTER_AREA take its fast path.
+    """
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    factor = max(1, round(gray.shape[1] / width))
+    if factor == 1:
+        return gray
+    height, frame_width = gray.shape[0] // factor, gray.shape[1] // factor
+    gray = gray[:height * factor, :frame_width * factor]
+    return cv2.resize(gray, (frame_width, height), interpolation=cv2.INTER_AREA)
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """Sharpness score: variance of the Laplacian (higher is sharper)"""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+def mean_abs_diff(gray_a: np.ndarray, gray_b: np.ndarray) -> float:
+    """Mean absolute per-pixel difference between two same-sized grayscale images"""
+    return float(cv2.absdiff(gray_a, gray_b).mean())
+
+def assess_capture(frame: np.ndarray, thresholds: dict = None, analysis_width: int = 320) -> QualityReport:
+    """
+    Fast pre-flight check of a captured BGR frame before it is sent for analysis.
+
+    Scores sharpness, exposure, glare (near-saturated pixels) and how much of
+    the frame the detected receipt fills, all on a small grayscale copy.
+    """
+    # Imported here to avoid a circular import (receipt_detector uses this module)
+    from .receipt_detector import find_receipt_quad
+
+    thresholds = {**DEFAULT_QUALITY_THRESHOLDS, **(thresholds or {})}
+    gray = downscale_gray(frame, analysis_width)
+
+    sharpness = laplacian_variance(gray)
+    brightness = float(gray.mean())
+    glare_fraction = float(np.count_nonzero(gray >= 250)) / gray.size
+
+    quad = find_receipt_quad(gray, analysis_width=analysis_width, min_area_fraction=0.02)
+    fill_fraction = 0.0
+    if quad is not None:
+        fill_fraction = float(cv2.contourArea(quad)) / gray.size
+
+    issues = []
+    if sharpness < thresholds['min_sharpness']:
+        issues.append(f"blurry (sharpness {sharpness:.0f})")
+    if brightness < thresholds['min_brightness']:
+        issues.append(f"too dark (brightness {brightness:.0f})")
+    if glare_fraction > thresholds['max_glare_fraction']:
+        issues.append(f"glare ({glare_fraction:.0%} washed out)")
+    if fill_fraction < thresholds['min_fill_fraction']:
+        issues.append("receipt not found" if quad is None else f"receipt too small ({fill_fraction:.0%} of frame)")
+
+    return QualityReport(
+        sharpness=sharpness,
+        glare_fraction=glare_fraction,
+        brightness=brightness,
+        fill_fraction=fill_fraction,
+        issues=issues
+    )
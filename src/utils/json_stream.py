@@ -0,0 +1,161 @@
+import json
+from typing import Any, List, Tuple
+
+class IncrementalJSONFieldParser:
+    """
+    Parses a streamed JSON object and reports each top-level field once its value is complete.
+
+    Text before the opening brace (a code fence, a sentence of preamble) is
+    skipped. Strings are complete at their closing quote; numbers, true/false/null
+    at the following comma, brace or whitespace; nested objects and arrays at
+    their matching close. Feed chunks as they arrive:
+
+        parser = IncrementalJSONFieldParser()
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.done = False  # True once the top-level object has closed
+        self._started = False
+        self._state = 'key_or_end'  # key_or_end, key, key_string, colon, value, string, scalar, nested, comma_or_end
+        self._buffer = []  # Raw text of the key or value being read
+        self._key = None
+        self._escape = False
+        self._in_string = False  # Inside a string nested in an object/array value
+        self._depth = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk of text, returning the (key, value) pairs completed by it"""
+        completed = []
+        for char in chunk:
+            if self.done:
+                break
+            if not self._started:
+                self._started = char == '{'
+                continue
+            self._consume(char, completed)
+        return completed
+
+    def _finish_value(self, completed: list):
+        raw = ''.join(self._buffer)
+        self._buffer = []
+        try:
+            completed.append((self._key, json.loads(raw)))
+        except ValueError:
+            pass  # Malformed value; the full-response parser will deal with it
+        self._state = 'comma_or_end'
+
+    def _consume(self, char: str, completed: list):
+        state = self._state
+        if state in ('key_or_end', 'key'):
+            if char == '"':
+                self._state = 'key_string'
+                self._buffer = ['"']
+            elif char == '}':
+                self.done = True
+        elif state == 'key_string':
+            self._buffer.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._key = json.loads(''.join(self._buffer))
+                self._buffer = []
+                self._state = 'colon'
+        elif state == 'colon':
+            if char == ':':
+                self._state = 'value'
+        elif state == 'value':
+            if char.isspace():
+                return
+            self._buffer = [char]
+            if char == '"':
+                self._state = 'string'
+            elif char in '{[':
+                self._state = 'nested'
+                self._depth = 1
+            else:
+                self._state = 'scalar'
+        elif state == 'string':
+            self._buffer.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._finish_value(completed)
+        elif state == 'scalar':
+            if char in ',}' or char.isspace():
+                self._finish_value(completed)
+                self._consume(char, completed)
+            else:
+                self._buffer.append(char)
+        elif state == 'nested':
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(completed)
+        elif state == 'comma_or_end':
+            if char == ',':
+                self._state = 'key'
+            elif char == '}':
+                self.done = True
+
+def extract_json_object(text: str) -> dict:
+    """
+    Parse the first balanced JSON object in text, ignoring any preamble,
+    code fences or trailing commentary around it. Raises ValueError if there
+    is no object or it never closes (a truncated response).
+    """
+    text = text.strip()
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data
+    except ValueError:
+        pass
+
+    start = text.find('{')
+    while start != -1:
+        depth = 0
+        in_string = False
+        escape = False
+        for index in range(start, len(text)):
+            char = text[index]
+            if in_string:
+                if escape:
+                    escape = False
+                elif char == '\\':
+                    escape = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    try:
+                        return json.loads(text[start:index + 1])
+                    except ValueError:
+                        break  # Balanced but not JSON (e.g. braces in prose); try the next one
+        else:
+            raise ValueError("Response JSON is incomplete (truncated output?)")
+        start = text.find('{', start + 1)
+    raise ValueError("No JSON object found in response")
@@ -0,0 +1,125 @@
+# src/utils/rate_limiter.py
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+
+    Callers reserve tokens up front and are told how long to wait, so the
+    same bucket can pace threads (time.sleep) and coroutines (asyncio.sleep).
+    The balance may go negative, which queues later callers behind earlier ones.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take amount tokens and return the seconds to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+    def acquire(self, amount: float = 1.0):
+        """Block the calling thread until amount tokens are available"""
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1.0):
+        """Wait without blocking the event loop until amount tokens are available"""
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class VendorLimiter:
+    """
+    Concurrency cap plus requests-per-minute and tokens-per-minute buckets for
+    one vendor. Threads and coroutines on any event loop share the same
+    max_concurrency slots.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._thread_slots = threading.BoundedSemaphore(max_concurrency)
+        # Per event loop, caps how many coroutines wait for a slot in a worker thread
+        self._async_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _async_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # A semaphore that has waited refers to its loop, so weak keys alone don't free closed loops
+            for closed in [known for known in self._async_slots.keys() if known.is_closed()]:
+                del self._async_slots[closed]
+            if loop not in self._async_slots:
+                self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+            return self._async_slots[loop]
+
+    @contextmanager
+    def limit(self, estimated_tokens: int = 0):
+        """Hold a concurrency slot and pace against the rate limits (threads)"""
+        with self._thread_slots:
+            if self.requests:
+                self.requests.acquire()
+            if self.tokens and estimated_tokens:
+                self.tokens.acquire(estimated_tokens)
+            yield
+
+    async def _acquire_thread_slot(self):
+        """Take one of the shared slots without blocking the event loop"""
+        if self._thread_slots.acquire(blocking=False):
+            return
+        acquire = asyncio.ensure_future(asyncio.to_thread(self._thread_slots.acquire))
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # The worker thread still takes the slot; give it back when it does
+            acquire.add_done_callback(lambda _: self._thread_slots.release())
+            raise
+
+    @asynccontextmanager
+    async def limit_async(self, estimated_tokens: int = 0):
+        """Hold a concurrency slot and pace against the rate limits (coroutines)"""
+        async with self._async_semaphore():
+            await self._acquire_thread_slot()
+            try:
+                if self.requests:
+                    await self.requests.acquire_async()
+                if self.tokens and estimated_tokens:
+                    await self.tokens.acquire_async(estimated_tokens)
+                yield
+            finally:
+                self._thread_slots.release()
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_vendor_limiter(vendor: str) -> VendorLimiter:
+    """Get the process-wide limiter for a vendor, configured from rate_limits in config.json"""
+    from src.utils.config import get_rate_limits
+    vendor = vendor.lower()
+    with _limiters_lock:
+        if vendor not in _limiters:
+            limits = get_rate_limits(vendor)
+            _limiters[vendor] = VendorLimiter(
+                max_concurrency=limits['max_concurrency'],
+                requests_per_minute=limits['requests_per_minute'],
+                tokens_per_minute=limits['tokens_per_minute']
+            )
+        return _limiters[vendor]
@@ -0,0 +1,88 @@
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+from .image_quality import downscale_gray
+
+def order_quad(points: np.ndarray) -> np.ndarray:
+    """Order four corner points as top-left, top-right, bottom-right, bottom-left"""
+    points = points.reshape(4, 2).astype(np.float32)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()  # y - x
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)],
+    ], dtype=np.float32)
+
+def find_receipt_quad(frame: np.ndarray, analysis_width: int = 480,
+                      min_area_fraction: float = 0.1) -> Optional[np.ndarray]:
+    """
+    Find the outline of a receipt in a BGR frame.
+
+    Works on a downscaled grayscale copy, assuming the paper is brighter than
+    the surface it lies on. Returns the ordered corner points in full-frame
+    coordinates, or None if no plausible receipt was found.
+    """
+    gray = downscale_gray(frame, analysis_width)
+    scale = gray.shape[1] / frame.shape[1]
+
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    contour = max(contours, key=cv2.contourArea)
+
+    # Reject specks and "receipts" that are really the whole frame
+    frame_area = mask.shape[0] * mask.shape[1]
+    area = cv2.contourArea(contour)
+    if area < min_area_fraction * frame_area or area > 0.98 * frame_area:
+        return None
+
+    approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+    if len(approx) == 4 and cv2.isContourConvex(approx):
+        quad = approx.reshape(4, 2)
+    else:
+        # Torn or curled edges: fall back to the minimum-area rectangle
+        quad = cv2.boxPoints(cv2.minAreaRect(contour))
+
+    return order_quad(quad.astype(np.float32) / scale)
+
+def warp_quad(frame: np.ndarray, quad: np.ndarray) -> np.ndarray:
+    """Warp the region inside an ordered quad to a flat, axis-aligned image"""
+    top_left, top_right, bottom_right, bottom_left = quad
+    width = int(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left)))
+    height = int(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right)))
+    destination = np.array([
+        [0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]
+    ], dtype=np.float32)
+    transform = cv2.getPerspectiveTransform(quad, destination)
+    return cv2.warpPerspective(frame, transform, (width, height))
+
+def binarize(image: np.ndarray) -> np.ndarray:
+    """Convert an image to black-and-white text using an adaptive threshold"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 31, 15)
+
+def draw_quad(frame: np.ndarray, quad: np.ndarray, color=(0, 255, 0), thickness: int = 2):
+    """Draw a quad outline onto a frame in place"""
+    cv2.polylines(frame, [quad.astype(np.int32)], True, color, thickness)
+
+def preprocess_receipt(frame: np.ndarray, crop: bool = True,
+                       binarize_output: bool = False) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Prepare a captured BGR frame for upload.
+
+    Detects the receipt, warps it flat and crops to it, optionally binarizing
+    the result. Falls back to the full frame when detection fails.
+    Returns (image, quad) where quad is None if no receipt was found.
+    """
+    quad = find_receipt_quad(frame) if crop else None
+    image = warp_quad(frame, quad) if quad is not None else frame
+    if binarize_output:
+        image = binarize(image)
+    return image, quad
@@ -0,0 +1,91 @@
+import re
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional
+from src.utils.datastore import RECEIPT_FIELDS, is_missing, parse_date
+
+# A plain amount, optionally with a currency sign, thousands separators and cents
+AMOUNT_PATTERN = re.compile(r'^-?\$?\s*(\d{1,3}(,\d{3})+|\d+)(\.\d{1,2})?$')
+
+# Placeholder values from the "Required format" example in receipt_analysis.txt; a
+# model that copies them hasn't read the receipt, so they count as low confidence
+EXAMPLE_VALUES = {
+    'vendor': 'store name',
+    'total_amount': '123.45',
+    'item_type': 'general item',
+    'item': 'specific item',
+    'expense_type': 'expense type',
+}
+
+# Fields holding handwritten numbers that a misread total is easily taken from
+NUMBER_FIELDS = ('payment_method', 'project', 'invoice')
+
+def parse_amount(value) -> Optional[Decimal]:
+    """The amount as a Decimal, or None if it isn't a well-formed amount"""
+    text = str(value).strip()
+    if not AMOUNT_PATTERN.match(text):
+        return None
+    try:
+        return Decimal(re.sub(r'[^0-9.\-]', '', text))
+    except InvalidOperation:
+        return None
+
+def validation_issues(receipt, max_not_found: int) -> List[str]:
+    """
+    Local sanity checks on an extracted receipt, returning the problems found
+    (empty if it looks trustworthy): vendor present, total a positive
+    well-formed amount that isn't just another field's number, dates parseable
+    and not in the future, paid date not long before the bill date, no values
+    copied from the prompt's example, and no more than max_not_found missing
+    fields.
+
+    The schema has no subtotal, tax or line items to add the total up from, so
+    total consistency is checked against the other numeric fields only. The
+    adapters get no token log-probabilities, so example values copied into the
+    answer are the confidence signal.
+    """
+    issues = []
+    if is_missing(receipt.vendor):
+        issues.append("vendor missing")
+
+    if is_missing(receipt.total_amount):
+        issues.append("total_amount missing")
+    else:
+        amount = parse_amount(receipt.total_amount)
+        if amount is None:
+            issues.append(f"total_amount malformed: {receipt.total_amount!r}")
+        elif amount <= 0:
+            issues.append(f"total_amount not positive: {receipt.total_amount!r}")
+        else:
+            # A check number or project code read as the total
+            for field in NUMBER_FIELDS:
+                value = getattr(receipt, field, None)
+                if not is_missing(value) and parse_amount(value) == amount:
+                    issues.append(f"total_amount same as {field}: {receipt.total_amount!r}")
+
+    tomorrow = date.today() + timedelta(days=1)
+    dates = {}
+    for field in ('bill_date', 'paid_date'):
+        value = getattr(receipt, field)
+        if is_missing(value):
+            continue
+        parsed = parse_date(value)
+        if parsed is None:
+            issues.append(f"{field} unparseable: {value!r}")
+        elif parsed > tomorrow:
+            issues.append(f"{field} in the future: {value!r}")
+        else:
+            dates[field] = parsed
+    # Bills are paid on or after the bill date; a big gap the other way is usually a misread year
+    if len(dates) == 2 and dates['paid_date'] < dates['bill_date'] - timedelta(days=31):
+        issues.append("paid_date well before bill_date")
+
+    copied = [field for field, example in EXAMPLE_VALUES.items()
+              if str(getattr(receipt, field, '')).strip().casefold() == example]
+    if copied:
+        issues.append(f"example values copied: {', '.join(copied)}")
+
+    not_found = sum(1 for field in RECEIPT_FIELDS if is_missing(getattr(receipt, field, None)))
+    if not_found > max_not_found:
+        issues.append(f"{not_found} fields not found")
+    return issues
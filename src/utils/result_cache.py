@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+from src.utils.image_hash import sha256_hex
+
+class ResultCache:
+    """
+    Disk-backed, content-addressed cache of raw vision API responses.
+
+    Entries are keyed on the encoded image, the prompt, the vendor and the
+    model, so any change to the template or corrections misses the cache. The
+    prompt is keyed with all its free-text corrections, even when only the
+    guessed vendor's were sent, so a guess doesn't change the key. The image is keyed on its exact bytes: a perceptual hash can't tell apart two
+    receipts printed from the same template, and would return the other's data.
+
+    Each entry is a small JSON file under cache_dir. An in-memory index of
+    (size, last use) lets eviction run without rescanning the directory:
+    entries older than max_age_seconds are dropped, and the least recently
+    used entries go once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 100_000_000,
+                 max_age_seconds: float = 30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._index = {}  # key -> [size, last_used]
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                self._index[entry.name[:-5]] = [stat.st_size, stat.st_mtime]
+                self._total_bytes += stat.st_size
+        with self._lock:
+            self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def make_key(self, image_data: bytes, prompt_hash: str, vendor: str, model: str) -> str:
+        """Cache key for one request, given the stable hash of its prompt (CompiledPrompt.unscoped_hash)"""
+        image_key = f"sha256:{sha256_hex(image_data)}"
+        material = json.dumps([image_key, prompt_hash, vendor, model])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached raw response for key, or None"""
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None or time.time() - meta[1] > self.max_age_seconds:
+                if meta is not None:
+                    self._remove(key)
+                self.stats['misses'] += 1
+                return None
+            meta[1] = time.time()
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                response = json.load(f)['response']
+            os.utime(self._path(key))  # Keep last use across restarts
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._remove(key)
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return response
+
+    def put(self, key: str, response: str, vendor: str = None, model: str = None):
+        """Store a raw response, evicting old entries if the cache is over budget"""
+        entry = json.dumps({'response': response, 'vendor': vendor, 'model': model, 'created': time.time()})
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(entry)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            previous = self._index.get(key)
+            if previous is not None:
+                self._total_bytes -= previous[0]
+            self._index[key] = [size, time.time()]
+            self._total_bytes += size
+            self.stats['stores'] += 1
+            self._evict()
+
+    def _remove(self, key: str):
+        """Drop one entry; caller holds the lock"""
+        size, _ = self._index.pop(key)
+        self._total_bytes -= size
+        self.stats['evictions'] += 1
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes; caller holds the lock"""
+        cutoff = time.time() - self.max_age_seconds
+        for key in [key for key, (_, last_used) in self._index.items() if last_used < cutoff]:
+            self._remove(key)
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda key: self._index[key][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+
+    def summary(self) -> str:
+        """Human-readable hit/miss counters"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_rate = self.stats['hits'] / lookups if lookups else 0.0
+        return (f"{self.stats['hits']} hits, {self.stats['misses']} misses ({hit_rate:.0%}), "
+                f"{len(self._index)} entries, {self._total_bytes / 1e6:.1f} MB")
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Return the process-wide result cache, or None if disabled in config"""
+    from src.utils.config import get_result_cache_settings
+    settings = get_result_cache_settings()
+    if not settings['enabled']:
+        return None
+    with _caches_lock:
+        cache = _caches.get(settings['dir'])
+        if cache is None:
+            cache = ResultCache(
+                settings['dir'],
+                max_bytes=settings['max_bytes'],
+                max_age_seconds=settings['max_age_days'] * 24 * 3600
+            )
+            _caches[settings['dir']] = cache
+        return cache
@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from src.utils.datastore import is_missing
+from src.utils.image_hash import hamming_distance
+
+class VendorGuesser:
+    """
+    Quick guess at a receipt's vendor before it is analyzed, from its
+    perceptual hash: first recent analyses of a near-identical image (a
+    re-capture, or the cascade's fast pass), then receipts committed to the
+    duplicate index. Costs a hash and at most one indexed lookup, no API call.
+    """
+
+    def __init__(self, duplicate_index=None, max_distance: int = 6, max_recent: int = 256):
+        self.duplicate_index = duplicate_index
+        self.max_distance = max_distance
+        self.max_recent = max_recent
+        self._recent: "OrderedDict[int, str]" = OrderedDict()  # phash -> vendor, oldest first
+        self._lock = threading.Lock()
+
+    def remember(self, phash: Optional[int], vendor: Optional[str]):
+        """Record the vendor read from an image"""
+        if phash is None or is_missing(vendor):
+            return
+        with self._lock:
+            self._recent[phash] = vendor
+            self._recent.move_to_end(phash)
+            if len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def guess(self, phash: Optional[int]) -> Tuple[Optional[str], Optional[str]]:
+        """(vendor, source) for the closest known image within max_distance bits, or (None, None)"""
+        if phash is None:
+            return None, None
+        with self._lock:
+            recent = [(hamming_distance(phash, known), vendor) for known, vendor in self._recent.items()]
+        close = [match for match in recent if match[0] <= self.max_distance]
+        if close:
+            return min(close, key=lambda match: match[0])[1], 'recent capture'
+
+        if self.duplicate_index is not None:
+            matches = [match for match in self.duplicate_index.find(phash, None, None, None)
+                       if not is_missing(match.vendor)]
+            if matches:
+                return min(matches, key=lambda match: match.distance).vendor, 'committed receipt'
+        return None, None
@@ -0,0 +1,132 @@
+"""Run an offline batch job end to end against a local stand-in for the OpenAI and Anthropic batch APIs."""
+import sys
+sys.path.append('.')
+import io
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from src.batch.batch_jobs import wait_for_batch
+from src.services.vision_service import VisionAPIService
+
+RECEIPT = {"vendor": "Stand-in Cafe", "total_amount": "12.50", "paid_date": "2024-03-01"}
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Mimics just enough of both vendors' batch endpoints: batches are accepted,
+    report in progress on the first status poll and finished on the next, and
+    answer every request with RECEIPT.
+    """
+    protocol_version = "HTTP/1.1"
+    ids = itertools.count(1)
+    files = {}  # file ID -> JSONL lines
+    batches = {}  # batch ID -> {'vendor', 'custom_ids', 'polls'}
+    lock = threading.Lock()
+
+    def _reply(self, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self.ids)}"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.lock:
+            if self.path == '/v1/files':
+                # Multipart upload: the JSONL is the only part whose lines start with '{'
+                lines = [line for line in body.decode().splitlines() if line.startswith('{')]
+                file_id = self._new_id('file')
+                self.files[file_id] = lines
+                self._reply({"id": file_id})
+            elif self.path == '/v1/batches':
+                request = json.loads(body)
+                custom_ids = [json.loads(line)['custom_id'] for line in self.files[request['input_file_id']]]
+                batch_id = self._new_id('batch')
+                self.batches[batch_id] = {'vendor': 'openai', 'custom_ids': custom_ids, 'polls': 0}
+                self._reply({"id": batch_id, "status": "validating"})
+            elif self.path == '/v1/messages/batches':
+                custom_ids = [request['custom_id'] for request in json.loads(body)['requests']]
+                batch_id = self._new_id('msgbatch')
+                self.batches[batch_id] = {'vendor': 'anthropic', 'custom_ids': custom_ids, 'polls': 0}
+                self._reply({"id": batch_id, "processing_status": "in_progress"})
+            else:
+                self.send_error(404)
+
+    def do_GET(self):
+        with self.lock:
+            parts = self.path.strip('/').split('/')
+            if parts[:2] == ['v1', 'batches']:
+                batch = self.batches[parts[2]]
+                batch['polls'] += 1
+                done = batch['polls'] > 1
+                output_file_id = None
+                if done:
+                    output_file_id = f"out_{parts[2]}"
+                    self.files[output_file_id] = [self._openai_result(custom_id) for custom_id in batch['custom_ids']]
+                self._reply({"id": parts[2], "status": "completed" if done else "in_progress",
+                             "output_file_id": output_file_id})
+            elif parts[:2] == ['v1', 'files']:
+                self._reply("\n".join(self.files[parts[2]]) + "\n", "application/jsonl")
+            elif parts[:3] == ['v1', 'messages', 'batches'] and parts[-1] == 'results':
+                batch = self.batches[parts[3]]
+                self._reply("\n".join(self._anthropic_result(custom_id) for custom_id in batch['custom_ids']),
+                            "application/jsonl")
+            elif parts[:3] == ['v1', 'messages', 'batches']:
+                batch = self.batches[parts[3]]
+                batch['polls'] += 1
+                done = batch['polls'] > 1
+                host = f"http://{self.headers['Host']}"
+                self._reply({"id": parts[3], "processing_status": "ended" if done else "in_progress",
+                             "results_url": f"{host}/v1/messages/batches/{parts[3]}/results" if done else None})
+            else:
+                self.send_error(404)
+
+    @staticmethod
+    def _openai_result(custom_id: str) -> str:
+        body = {"status": "completed", "usage": {"input_tokens": 900, "output_tokens": 60},
+                "output": [{"type": "message", "content": [{"type": "output_text", "text": json.dumps(RECEIPT)}]}]}
+        return json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}, "error": None})
+
+    @staticmethod
+    def _anthropic_result(custom_id: str) -> str:
+        message = {"stop_reason": "tool_use", "usage": {"input_tokens": 900, "output_tokens": 60},
+                   "content": [{"type": "tool_use", "name": "record_receipt", "input": RECEIPT}]}
+        return json.dumps({"custom_id": custom_id, "result": {"type": "succeeded", "message": message}})
+
+    def log_message(self, format, *args):
+        pass
+
+def make_image(shade: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 600), (shade, shade, shade)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def run_standin(images: int = 5, max_batch_bytes: int = 5000):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    for vendor in ('openai', 'anthropic'):
+        service = VisionAPIService("stand-in-key", vendor)
+        service.result_cache = None  # Every run should reach the stand-in
+        service.adapter.api_base = api_base
+        service.adapter.api_url = f"{api_base}{'/v1/responses' if vendor == 'openai' else '/v1/messages'}"
+
+        # A small max_batch_bytes forces the job to be split across several vendor batches
+        job = service.submit_batch({f"{index:05d}": make_image(index * 40) for index in range(images)},
+                                   max_batch_bytes=max_batch_bytes)
+        wait_for_batch(service, job, poll_seconds=0.1)
+        results = service.collect_batch(job)
+        ok = sum(1 for result in results.values() if not isinstance(result, Exception))
+        print(f"{vendor}: {len(job['batch_ids'])} vendor batches, {ok}/{images} receipts, "
+              f"tokens {service.adapter.usage_summary()}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    run_standin()
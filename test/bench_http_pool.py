@@ -0,0 +1,73 @@
+"""Measure per-call latency of fresh connections vs the adapter's pooled session against a local stand-in server."""
+import sys
+sys.path.append('.')
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from src.services.openai_adapter import OpenAIVisionAdapter
+
+RESPONSE = json.dumps({
+    "output": [{"type": "message", "content": [{"type": "output_text", "text": '{"vendor": "Stand-in"}'}]}]
+}).encode()
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers every POST like the OpenAI Responses API, with keep-alive"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+    handshake_seconds = 0.0
+
+    def setup(self):
+        # Runs once per TCP connection: stands in for the TCP + TLS handshake round trips
+        time.sleep(self.handshake_seconds)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+def time_calls(adapter, image_bytes: bytes, calls: int) -> list:
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        adapter.analyze_receipt(image_bytes, "Extract the receipt fields.")
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def bench_http_pool(calls: int = 50, handshake_ms: float = 30.0, image_kb: int = 300):
+    StandInHandler.handshake_seconds = handshake_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    adapter = OpenAIVisionAdapter("stand-in-key")
+    adapter.api_url = f"http://127.0.0.1:{server.server_address[1]}/v1/responses"
+    image_bytes = b"\xff" * (image_kb * 1024)
+
+    # Old behaviour: module-level requests.post opens a new connection per call
+    pooled_session = adapter.session
+    adapter.session = requests
+    fresh = time_calls(adapter, image_bytes, calls)
+
+    adapter.session = pooled_session
+    time_calls(adapter, image_bytes, 1)  # Warm the pool
+    pooled = time_calls(adapter, image_bytes, calls)
+    server.shutdown()
+
+    print(f"{calls} calls, {image_kb} KB image, simulated handshake {handshake_ms:.0f} ms")
+    for name, latencies in (("fresh connection", fresh), ("pooled session", pooled)):
+        print(f"  {name:17s} median {statistics.median(latencies):7.1f} ms   "
+              f"p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1]:7.1f} ms")
+    print(f"  saving per call: {statistics.median(fresh) - statistics.median(pooled):.1f} ms")
+
+if __name__ == "__main__":
+    handshake_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    bench_http_pool(handshake_ms=handshake_ms)
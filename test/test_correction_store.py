@@ -0,0 +1,91 @@
+import sys
+sys.path.append('.')
+from src.utils.correction_store import ScopedCorrections, compact_corrections, split_corrections
+
+CORRECTIONS = '''# corrections.txt
+- When vendor includes "Spotify", change item_type to "Subscription"
+- When vendor is "Shell" and payment_method is "1234", change payment_method to "VISA"
+- When payment_method is "1234", change payment_method to "Card"
+When paid_date is "not found", change paid_date to use bill_date
+- When vendor is "shell" and payment_method is "1234", change payment_method to "MC"
+- When payment_method is "Card", change payment_method to "VISA"
+- When payment_method is "A", change payment_method to "B"
+- When payment_method is "B", change payment_method to "A"
+- when vendor includes "spotify",  change item_type to "Subscription"
+- When total_amount is "5", change total_amount to "5"
+'''
+
+def test_compaction_is_idempotent():
+    compacted, report = compact_corrections(CORRECTIONS)
+    assert compact_corrections(compacted)[0] == compacted
+    assert len(report.conflicts) == 3  # Shell payment method, and both rules of the A/B cycle
+
+def test_conflicting_rules_are_kept_in_order():
+    compacted, _ = compact_corrections(CORRECTIONS)
+    assert '"VISA"' in compacted and '"MC"' in compacted
+    rules = split_corrections(compacted)[0]
+    assert rules.lookup(['Shell'], 'payment_method', '1234').corrected_value == "MC"
+
+def test_free_text_kept_unchanged_in_order():
+    compacted, report = compact_corrections(CORRECTIONS)
+    free_text = split_corrections(compacted)[1].splitlines()
+    assert free_text[-2:] == ['- When vendor includes "Spotify", change item_type to "Subscription"',
+                              'When paid_date is "not found", change paid_date to use bill_date']
+    assert report.duplicates == 1 and report.no_ops == 1 and report.merged == 1
+
+def test_comments_are_kept_with_the_line_below():
+    corrections = ('# corrections.txt\n\n# Fuel card\n' + CORRECTIONS.splitlines()[2] + '\n'
+                   + '# Ask the model\nWhen paid_date is "not found", change paid_date to use bill_date\n# end\n')
+    compacted, _ = compact_corrections(corrections)
+    lines = compacted.splitlines()
+    assert lines[1] == '# corrections.txt'
+    assert lines[lines.index('# Fuel card') + 1] == CORRECTIONS.splitlines()[2]
+    assert lines[lines.index('# Ask the model') + 1].startswith('When paid_date')
+    assert lines[-1] == '# end'
+    assert compact_corrections(compacted)[0] == compacted
+
+def test_vendor_chain_kept_when_a_rule_is_scoped_to_its_middle():
+    chain = ('- When vendor is "A Co", change vendor to "B Co"\n'
+             '- When vendor is "B Co", change vendor to "C Co"\n')
+    scoped = '- When vendor is "B Co" and item is "x", change item to "y"\n'
+    assert compact_corrections(chain)[1].merged == 1
+    compacted, report = compact_corrections(chain + scoped)
+    assert report.merged == 0
+    from src.services.vision_adapter import Receipt
+    receipt, _ = split_corrections(compacted)[0].apply(Receipt(vendor='A Co', item='x'))
+    assert receipt.item == 'y'
+
+def test_vendor_rules_apply_before_field_rules():
+    from src.services.vision_adapter import Receipt
+    rules, _ = split_corrections('- When vendor is "SHELL OIL 5521", change vendor to "Shell"\n'
+                                 '- When vendor is "Shell" and payment_method is "1234", change payment_method to "VISA"\n'
+                                 '- When vendor is "SHELL OIL 5521" and item is "Fuel", change item to "Gas"\n')
+    receipt, applied = rules.apply(Receipt(vendor='Shell Oil 5521', payment_method='1234', item='fuel'))
+    assert (receipt.vendor, receipt.payment_method, receipt.item) == ('Shell', 'VISA', 'Gas')
+    assert [rule.field for rule in applied] == ['vendor', 'payment_method', 'item']
+
+def test_lines_with_extra_conditions_stay_free_text():
+    line = '- When payment_method is "1234", change payment_method to "VISA" if vendor is "X"'
+    rules, free_text = split_corrections(line + '\n- When item is "a", change item to "b" \n')
+    assert free_text == line
+    assert [(rule.original_value, rule.corrected_value) for rule in rules.rules] == [('a', 'b')]
+
+def test_scoped_selection_matches_any_vendor_name():
+    rules, free_text = split_corrections(CORRECTIONS + '- When vendor is "Spotify USA Inc", change vendor to "Spotify"\n'
+                                         + '- When vendor is "Spotify USA Inc", change item to "Premium"\n')
+    scoped = ScopedCorrections(free_text)
+    assert rules.vendor_aliases('spotify') == ['spotify', 'Spotify USA Inc']
+    assert 'change item to "Premium"' not in scoped.select('Spotify')
+    assert 'change item to "Premium"' in scoped.select(*rules.vendor_aliases('Spotify'))
+    assert scoped.select('not found') == scoped.select() == free_text
+
+if __name__ == "__main__":
+    test_compaction_is_idempotent()
+    test_conflicting_rules_are_kept_in_order()
+    test_free_text_kept_unchanged_in_order()
+    test_comments_are_kept_with_the_line_below()
+    test_vendor_chain_kept_when_a_rule_is_scoped_to_its_middle()
+    test_vendor_rules_apply_before_field_rules()
+    test_lines_with_extra_conditions_stay_free_text()
+    test_scoped_selection_matches_any_vendor_name()
+    print("ok")
@@ -0,0 +1,28 @@
+import sys
+sys.path.append('.')
+from src.utils.duplicate_index import DuplicateIndex
+
+PHASH = 0x8F3C_0000_FFFF_1234
+
+def flip(phash: int, bits) -> int:
+    for bit in bits:
+        phash ^= 1 << bit
+    return phash
+
+def test_probes_find_hashes_within_max_distance(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'index.sqlite'), max_distance=6)
+    capture_id = index.add(PHASH, 'Shell', '45.10', '03/05/2025')
+    # Three bands two bits off each; only the untouched band's probe can find it
+    near = flip(PHASH, [0, 1, 16, 17, 32, 33])
+    assert [(match.capture_id, match.distance) for match in index.find(near, None, None, None)] == [(capture_id, 6)]
+    # Every band differs, two of them by a single bit
+    assert index.find(flip(PHASH, [1, 2, 20, 40, 41, 63]), None, None, None)[0].distance == 6
+    assert index.find(flip(PHASH, [0, 1, 16, 17, 32, 33, 48]), None, None, None) == []
+
+def test_fields_match_after_normalization(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'index.sqlite'))
+    index.add(PHASH, 'SHELL #5521', '$1,045.10', '03/05/2025')
+    matches = index.find(flip(PHASH, [0]), 'Shell 5521', '1045.1', '2025-03-05')
+    assert [(match.reason, match.distance) for match in matches] == [('image+fields', 1)]
+    assert [match.reason for match in index.find(None, 'shell 5521', '1045.10', 'Mar 5, 2025')] == ['fields']
+    assert index.find(None, 'Shell 5521', '1045.10', '03/06/2025') == []
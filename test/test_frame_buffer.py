@@ -0,0 +1,34 @@
+import sys
+import cv2
+import numpy as np
+sys.path.append('.')
+from src.utils.frame_buffer import FrameBuffer
+
+def test_converted_view_is_cached_per_frame():
+    buffer = FrameBuffer()
+    assert buffer.get_converted(cv2.COLOR_BGR2RGB) == (0, None)
+    frame = np.zeros((40, 60, 3), np.uint8)
+    frame[..., 0] = 255  # Blue in BGR
+    buffer.put(frame)
+    sequence, rgb = buffer.get_converted(cv2.COLOR_BGR2RGB, (30, 20))
+    assert sequence == buffer.sequence == 1
+    assert rgb.shape == (20, 30, 3) and rgb[0, 0].tolist() == [0, 0, 255]
+    assert buffer.get_converted(cv2.COLOR_BGR2RGB, (30, 20))[1] is rgb
+    assert buffer.get()[1] is frame  # The raw frame is left as it was
+
+    buffer.put(frame.copy())
+    sequence, converted = buffer.get_converted(cv2.COLOR_BGR2RGB, (30, 20))
+    assert sequence == 2 and converted is not rgb
+
+def test_size_can_be_computed_from_the_frame():
+    buffer = FrameBuffer()
+    buffer.put(np.zeros((40, 60, 3), np.uint8))
+    half = lambda width, height: (width // 2, height // 2)
+    sequence, rgb = buffer.get_converted(cv2.COLOR_BGR2RGB, half)
+    assert sequence == 1 and rgb.shape == (20, 30, 3)
+    assert buffer.get_converted(cv2.COLOR_BGR2RGB, (30, 20))[1] is rgb
+
+if __name__ == "__main__":
+    test_converted_view_is_cached_per_frame()
+    test_size_can_be_computed_from_the_frame()
+    print("ok")
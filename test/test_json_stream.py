@@ -0,0 +1,31 @@
+import sys
+sys.path.append('.')
+from src.utils.json_stream import IncrementalJSONFieldParser, extract_json_object
+
+RESPONSE = '''Here is the receipt:
+```json
+{"vendor": "Joe's \\"Diner\\"", "total_amount": 42.5, "items": [{"name": "a, b"}], "paid": true,
+ "invoice": "not found"}
+```'''
+
+def test_fields_complete_one_character_at_a_time():
+    parser = IncrementalJSONFieldParser()
+    completed = []
+    for index, char in enumerate(RESPONSE):
+        for field, value in parser.feed(char):
+            completed.append((field, value, index))
+    assert [(field, value) for field, value, _ in completed] == [
+        ('vendor', 'Joe\'s "Diner"'), ('total_amount', 42.5), ('items', [{'name': 'a, b'}]),
+        ('paid', True), ('invoice', 'not found')]
+    # A string is reported at its closing quote, before the rest of the object arrives
+    assert completed[0][2] == RESPONSE.index('",')
+    assert parser.done
+
+def test_matches_the_full_response_parser():
+    parser = IncrementalJSONFieldParser()
+    assert dict(parser.feed(RESPONSE)) == extract_json_object(RESPONSE)
+
+if __name__ == "__main__":
+    test_fields_complete_one_character_at_a_time()
+    test_matches_the_full_response_parser()
+    print("ok")
@@ -0,0 +1,46 @@
+import sys
+sys.path.append('.')
+from src.services.prompt_cache import PromptCache, TEMPLATE_PATH
+
+CORRECTIONS = '''- When vendor is "Shell" and payment_method is "1234", change payment_method to "VISA"
+- When vendor is "Spotify", the item_type is always "Subscription"
+- Dates are always in the current decade
+'''
+
+def make_cache(tmp_path) -> PromptCache:
+    corrections_path = tmp_path / 'corrections.txt'
+    corrections_path.write_text(CORRECTIONS)
+    return PromptCache(TEMPLATE_PATH, str(corrections_path))
+
+def test_partial_prompt_asks_for_unlocked_fields_only(tmp_path):
+    prompt = make_cache(tmp_path).get_partial(['total_amount', 'paid_date'], {'vendor': 'Shell'})
+    assert '- total_amount:' in prompt and '- paid_date:' in prompt
+    assert '- item_type:' not in prompt and '"item_type":' not in prompt
+    assert '- vendor: "Shell"' in prompt  # Locked value given as context
+    assert prompt.known == {'vendor': 'Shell'}
+    assert len(prompt.rules) == 1  # The standard-form rule is applied locally, not sent
+
+def test_partial_prompt_scopes_corrections_to_the_locked_vendor(tmp_path):
+    cache = make_cache(tmp_path)
+    prompt = cache.get_partial(['item_type'], {'vendor': 'Shell'})
+    assert 'current decade' in prompt and 'Spotify' not in prompt
+    assert 'Spotify' in cache.get_partial(['item_type'], {'vendor': 'Spotify'})
+    assert 'Spotify' in cache.get_partial(['item_type'], {})
+
+def test_partial_prompt_hash_depends_on_locked_values(tmp_path):
+    cache = make_cache(tmp_path)
+    first = cache.get_partial(['item'], {'vendor': 'Shell', 'total_amount': '10.00'})
+    assert first.hash == cache.get_partial(['item'], {'vendor': 'Shell', 'total_amount': '10.00'}).hash
+    assert first.hash != cache.get_partial(['item'], {'vendor': 'Shell', 'total_amount': '12.00'}).hash
+
+def test_partial_prompt_is_built_once(tmp_path):
+    cache = make_cache(tmp_path)
+    first = cache.get_partial(['item', 'project'], {'vendor': 'Shell'})
+    assert cache.get_partial(['item', 'project'], {'vendor': 'Shell'}) is first
+    assert cache.get_partial(['item'], {'vendor': 'Shell'}) is not first
+
+def test_partial_and_full_prompts_request_the_same_fields(tmp_path):
+    from src.services.vision_adapter import RECEIPT_SCHEMA_FIELDS
+    cache = make_cache(tmp_path)
+    assert sorted(cache.fields) == sorted(RECEIPT_SCHEMA_FIELDS)
+    assert '- upper_right' not in cache.get_partial(RECEIPT_SCHEMA_FIELDS, {})
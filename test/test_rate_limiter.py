@@ -0,0 +1,54 @@
+import asyncio
+import sys
+import threading
+import time
+sys.path.append('.')
+from src.utils.rate_limiter import TokenBucket, VendorLimiter
+
+def test_bucket_queues_callers_past_its_capacity():
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    assert bucket.reserve() == 0.0 and bucket.reserve() == 0.0
+    assert 0.9 < bucket.reserve() <= 1.0
+    assert 1.9 < bucket.reserve() <= 2.0  # Each caller waits behind the one before
+
+def test_threads_and_coroutines_share_the_concurrency_cap():
+    limiter = VendorLimiter(max_concurrency=2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def enter():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+
+    def leave():
+        with lock:
+            active[0] -= 1
+
+    def in_thread():
+        with limiter.limit():
+            enter()
+            time.sleep(0.05)
+            leave()
+
+    async def in_coroutine():
+        async with limiter.limit_async():
+            enter()
+            await asyncio.sleep(0.05)
+            leave()
+
+    async def run_coroutines():
+        await asyncio.gather(*(in_coroutine() for _ in range(4)))
+
+    threads = [threading.Thread(target=in_thread) for _ in range(4)]
+    threads.append(threading.Thread(target=asyncio.run, args=(run_coroutines(),)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+if __name__ == "__main__":
+    test_bucket_queues_callers_past_its_capacity()
+    test_threads_and_coroutines_share_the_concurrency_cap()
+    print("ok")
@@ -0,0 +1,33 @@
+import sys
+sys.path.append('.')
+from src.services.vision_adapter import Receipt
+from src.utils.receipt_validation import validation_issues
+
+def make_receipt(**values) -> Receipt:
+    fields = dict(vendor='Shell', invoice='88231', bill_date='03/02/2025', paid_date='03/05/2025',
+                  payment_method='2624', total_amount='45.10', item_type='Fuel', item='Unleaded gas',
+                  project='2716', expense_type='Tour Support')
+    return Receipt(**{**fields, **values})
+
+def test_clean_receipt_passes():
+    assert validation_issues(make_receipt(), 2) == []
+
+def test_missing_bill_date_only_counts_towards_not_found():
+    assert validation_issues(make_receipt(bill_date='not found'), 2) == []
+    assert validation_issues(make_receipt(bill_date='not found', item='not found', invoice='not found'), 2) == \
+        ["3 fields not found"]
+
+def test_total_read_from_another_number():
+    assert validation_issues(make_receipt(total_amount='2624.00'), 2) == \
+        ["total_amount same as payment_method: '2624.00'"]
+
+def test_example_values_are_low_confidence():
+    assert validation_issues(make_receipt(vendor='Store Name', item='Specific Item'), 2) == \
+        ["example values copied: vendor, item"]
+
+if __name__ == "__main__":
+    test_clean_receipt_passes()
+    test_missing_bill_date_only_counts_towards_not_found()
+    test_total_read_from_another_number()
+    test_example_values_are_low_confidence()
+    print("ok")
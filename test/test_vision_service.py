@@ -0,0 +1,133 @@
+import json
+import sys
+import numpy as np
+sys.path.append('.')
+from src.services.prompt_cache import PromptCache, TEMPLATE_PATH
+from src.services.vision_service import VisionAPIService
+
+# A blank page; the adapter's response is fixed, so the image content doesn't matter
+BLANK = np.full((400, 300, 3), 255, np.uint8)
+
+RULES = '- When vendor is "Shell" and payment_method is "1234", change payment_method to "VISA"\n'
+
+def make_service(tmp_path, monkeypatch, corrections: str, response: dict) -> VisionAPIService:
+    """A service with its own corrections file, no result cache, and an adapter that returns response"""
+    monkeypatch.chdir(tmp_path)  # The duplicate index and result cache live under ./output
+    corrections_path = tmp_path / 'corrections.txt'
+    corrections_path.write_text(corrections)
+    service = VisionAPIService(api_key='test', vendor='openai')
+    service.prompt_cache = PromptCache(TEMPLATE_PATH, str(corrections_path))
+    service.result_cache = None
+    service.adapter.analyze_receipt = lambda *args, **kwargs: json.dumps(response)
+    return service
+
+def test_vendor_rules_apply_to_full_analysis(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, RULES, {'vendor': 'Shell', 'payment_method': '1234'})
+    receipt = service.analyze_receipt(service.encode_image(BLANK))
+    assert receipt.payment_method == 'VISA'
+
+def test_vendor_rules_apply_with_vendor_locked(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, RULES, {'payment_method': '1234'})
+    receipt = service.analyze_receipt(service.encode_image(BLANK), locked={'vendor': 'Shell'})
+    assert receipt.vendor == 'Shell'
+    assert receipt.payment_method == 'VISA'
+
+def test_locked_fields_are_not_corrected(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, RULES, {'vendor': 'Shell'})
+    receipt = service.analyze_receipt(service.encode_image(BLANK), locked={'payment_method': '1234'})
+    assert receipt.payment_method == '1234'
+
+def test_scoped_corrections_follow_a_vendor_rename(tmp_path, monkeypatch):
+    free_text = '- When vendor is "Spotify USA Inc", change item_type to "Subscription"'
+    corrections = '- When vendor is "Spotify USA Inc", change vendor to "Spotify"\n' + free_text + '\n'
+    service = make_service(tmp_path, monkeypatch, corrections, {'vendor': 'Spotify USA Inc'})
+    prompts = []
+    service.adapter.analyze_receipt = lambda data, prompt, **kwargs: prompts.append(prompt) or '{"vendor": "Spotify USA Inc"}'
+    encoded = service.encode_image(BLANK)
+    assert service.analyze_receipt(encoded).vendor == 'Spotify'
+    service.analyze_receipt(encoded)  # The vendor is now guessed as "Spotify", the corrected name
+    assert len(prompts) == 2
+    assert all(free_text in prompt for prompt in prompts)
+
+def test_escalation_reuses_the_first_prompt(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, RULES, {'vendor': 'Shell', 'payment_method': '1234'})
+    service.cascade_adapter = service._create_adapter(model='fast-model')
+    prompts = []
+    service.cascade_adapter.analyze_receipt = lambda data, prompt, **kwargs: prompts.append(prompt) or '{}'
+    service.adapter.analyze_receipt = lambda data, prompt, **kwargs: prompts.append(prompt) or '{"vendor": "Shell"}'
+    assert service.analyze_receipt(service.encode_image(BLANK)).vendor == 'Shell'
+    assert service.cascade_stats == {'accepted': 0, 'escalated': 1}
+    assert prompts[0] is prompts[1]
+    assert sum(service.prompt_sizes['sent'].values()) == 1
+
+def test_result_cache_hit_does_not_depend_on_the_vendor_guess(tmp_path, monkeypatch):
+    from src.utils.result_cache import ResultCache
+    corrections = RULES + '- When vendor is "Spotify", the item_type is always "Subscription"\n'
+    service = make_service(tmp_path, monkeypatch, corrections, {'vendor': 'Shell', 'payment_method': '1234'})
+    service.result_cache = ResultCache(str(tmp_path / 'cache'))
+    prompts = []
+    service.adapter.analyze_receipt = lambda data, prompt, **kwargs: prompts.append(prompt) or '{"vendor": "Shell"}'
+    encoded = service.encode_image(BLANK)
+    service.analyze_receipt(encoded)  # No guess yet: every correction is sent
+    assert service._build_prompt(vendor='Shell') != prompts[0]  # A guess would now scope the prompt...
+    assert service.analyze_receipt(encoded).vendor == 'Shell'  # ...but the cached response is still found
+    assert len(prompts) == 1 and service.result_cache.stats['hits'] == 1
+
+def test_batch_jobs_carry_the_unscoped_rules(tmp_path, monkeypatch):
+    corrections = RULES + '- When vendor is "Spotify", the item_type is always "Subscription"\n'
+    service = make_service(tmp_path, monkeypatch, corrections, {})
+    service.vendor_guesser.guess = lambda phash: ('Spotify', 'recent capture')
+    service.adapter.build_batch_request = lambda custom_id, data, prompt, media_type: {'custom_id': custom_id}
+    service.adapter.submit_batch = lambda requests: 'batch-1'
+    service.adapter.get_batch_results = lambda batch_id: {'a': ('{"vendor": "Shell", "payment_method": "1234"}', None)}
+    job = service.submit_batch({'a': service.encode_image(BLANK)})
+    assert job['rules'] == [RULES.strip()]
+    assert service.collect_batch(job)['a'].payment_method == 'VISA'
+
+def test_hedge_winner_cancels_the_primary_retry(tmp_path, monkeypatch):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from src.services.vision_adapter import VisionAPIError
+    service = make_service(tmp_path, monkeypatch, '', {'vendor': 'Shell'})
+    service.hedge_adapter = service._create_adapter(model='hedge-model')
+    service.hedge_adapter.analyze_receipt = lambda *args, **kwargs: '{"vendor": "Shell"}'
+    service.hedge_settings = dict(service.hedge_settings, default_deadline=0.05)
+    service._hedge_executor = ThreadPoolExecutor(max_workers=2)
+    calls = []
+    def overloaded(*args, **kwargs):
+        calls.append('primary')
+        raise VisionAPIError("overloaded", status_code=529, retry_after=30, retryable=True)
+    service.adapter.analyze_receipt = overloaded
+    started = time.perf_counter()
+    assert service.analyze_receipt(service.encode_image(BLANK)).vendor == 'Shell'
+    service._hedge_executor.shutdown(wait=True)  # The primary gives up its 30 second retry wait
+    assert time.perf_counter() - started < 5
+    assert calls == ['primary'] and service.hedge_stats == {'fired': 1, 'won': 1}
+
+def test_malformed_batch_entry_fails_only_its_request(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    good = {'custom_id': 'a', 'response': {'status_code': 200, 'body': {
+        'output': [{'type': 'message', 'content': [{'type': 'output_text', 'text': '{"vendor": "Shell"}'}]}]}}}
+    lines = [json.dumps(good), json.dumps({'custom_id': 'b', 'response': {'status_code': 200, 'body': None}}),
+             '{"custom_id": "c", "resp']
+    pages = {'batches': {'output_file_id': 'file-1'}, 'files': '\n'.join(lines)}
+    def get(url, **kwargs):
+        page = pages['files' if '/files/' in url else 'batches']
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: page, text=page)
+    service = make_service(tmp_path, monkeypatch, '', {})
+    service.adapter.session = SimpleNamespace(get=get)
+    results = service.adapter.get_batch_results('batch-1')
+    assert json.loads(results['a'][0]) == {'vendor': 'Shell'}
+    assert results['b'][0] is None and 'malformed' in results['b'][1]
+    assert 'c' not in results
+
+def test_constructing_a_service_creates_no_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    VisionAPIService(api_key='test', vendor='openai')
+    assert list(tmp_path.iterdir()) == []
+
+def test_reload_corrections_replaces_in_memory_changes(tmp_path, monkeypatch):
+    service = make_service(tmp_path, monkeypatch, RULES, {})
+    service.corrections = ''
+    assert service.reload_corrections() == RULES
+    assert service._build_prompt().rules.rules